@@ -1,17 +1,20 @@
 import os
 import logging
-from tempfile import mkdtemp
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify, session, flash, redirect, url_for
-from werkzeug.utils import secure_filename
+from flask import Flask, Request, Response, render_template, request, jsonify, session, flash, redirect, url_for, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_bcrypt import Bcrypt
+import time
+import queue
+import threading
+import contextvars
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 import stripe
 import json
 from reportlab.lib import colors
@@ -21,19 +24,31 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 import io
 import base64
+from contextlib import nullcontext, closing
 from datetime import datetime
-from models import db, User, CVUpload, AnalysisResult
+from models import db, User, CVUpload, AnalysisResult, AnalysisJob, init_schema
 from forms import LoginForm, RegistrationForm, UserProfileForm, ChangePasswordForm
-from utils.pdf_extraction import extract_text_from_pdf
+from utils.pdf_extraction import extract_text_from_pdf, upload_stream_factory, hashed_upload, is_pdf, pdf_text_cache, engine_timings
 from utils.openrouter_api import (
     optimize_cv, generate_recruiter_feedback,
     generate_cover_letter, analyze_job_url,
     ats_optimization_check, generate_interview_questions,
     analyze_cv_strengths, analyze_cv_score,
     analyze_keywords_match, check_grammar_and_style,
-    optimize_for_position, generate_interview_tips
+    optimize_for_position, generate_interview_tips,
+    stream_tokens_to, estimate_job_analysis_cost
 )
-from utils.rate_limiter import rate_limit
+from utils.llm_cache import llm_cache
+from utils.single_flight import single_flight
+from utils.llm_profiles import reasoning_stats, model_tier
+from utils.model_router import model_router
+from utils.token_budget import token_budget
+from utils.job_page_cache import job_page_cache
+from utils.job_batch import ingest_job_urls, prepare_urls, JOB_BATCH_MAX_URLS
+from utils.job_postings import get_or_create_job_posting, analyze_job_posting_cached, cached_job_posting_analysis
+from utils.json_extractor import extract_json, JSONExtractor
+from utils.job_queue import job_queue
+from utils.rate_limiter import rate_limit, rate_limiter, request_identifier, anonymous_cost_limiter
 from utils.encryption import encryption
 from utils.security_middleware import security_middleware
 from utils.notifications import notification_system
@@ -80,6 +95,10 @@ app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
 
 # Initialize extensions
 db.init_app(app)
+
+# Tabele i nowe kolumny przy imporcie - gunicorn (app:app) nie wykonuje bloku __main__
+with app.app_context():
+    init_schema()
 bcrypt = Bcrypt(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -98,11 +117,27 @@ def load_user(user_id):
 stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
 
 # Configuration for file uploads
-UPLOAD_FOLDER = mkdtemp()
 ALLOWED_EXTENSIONS = {'pdf'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+class UploadRequest(Request):
+    """Przesyłane pliki trafiają do bufora liczącego SHA-256 w locie (w pamięci, duże - do anonimowego pliku tymczasowego)"""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return upload_stream_factory(total_content_length, content_type, filename, content_length)
+
+app.request_class = UploadRequest
+
+# Analizy AI w tle (python worker.py) zamiast w wątku żądania - domyślnie wyłączone,
+# klient może też poprosić o to pojedynczo przez "async": true
+AI_ASYNC_JOBS = os.environ.get('AI_ASYNC_JOBS', 'false').lower() in ('1', 'true', 'yes')
+
+# Wspólna, ograniczona pula wątków dla /process-cv/batch (analizy czekają głównie na OpenRouter)
+AI_BATCH_CONCURRENCY = int(os.environ.get('AI_BATCH_CONCURRENCY', 5))
+batch_executor = ThreadPoolExecutor(max_workers=AI_BATCH_CONCURRENCY, thread_name_prefix='ai-batch')
+
+# Jak często strumień /process-cv wysyła zdarzenie 'partial' z częściowo sparsowanym JSON
+STREAM_PARTIAL_INTERVAL = float(os.environ.get('STREAM_PARTIAL_INTERVAL', 0.5))
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -124,32 +159,19 @@ def add_watermark_to_cv(cv_text):
 def parse_ai_json_response(ai_result):
     """
     Parse JSON response from AI, handling various formats
+
+    Zwraca pole optimized_cv, a gdy odpowiedź nie zawiera poprawnego JSON - tekst bez zmian.
     """
-    import json
-    try:
-        logger.debug(f"AI result before parsing: {ai_result[:200]}...")
-
-        # Clean AI result - remove markdown formatting if present
-        clean_result = ai_result
-        if '```json' in clean_result:
-            json_start = clean_result.find('```json') + 7
-            json_end = clean_result.find('```', json_start)
-            if json_end != -1:
-                clean_result = clean_result[json_start:json_end].strip()
-        elif '{' in clean_result and '}' in clean_result:
-            json_start = clean_result.find('{')
-            json_end = clean_result.rfind('}') + 1
-            clean_result = clean_result[json_start:json_end]
-
-        parsed_result = json.loads(clean_result)
-        optimized_cv = parsed_result.get('optimized_cv', ai_result)
-        logger.debug(f"Successfully parsed AI response, extracted optimized_cv")
-        return optimized_cv
-
-    except (json.JSONDecodeError, TypeError) as e:
-        logger.warning(f"Failed to parse AI response as JSON: {e}")
+    logger.debug(f"AI result before parsing: {str(ai_result)[:200]}...")
+    parsed_result = extract_json(ai_result)
+    if not isinstance(parsed_result, dict):
+        logger.warning("Failed to parse AI response as JSON")
         return ai_result
 
+    optimized_cv = parsed_result.get('optimized_cv', ai_result)
+    logger.debug(f"Successfully parsed AI response, extracted optimized_cv")
+    return optimized_cv
+
 @app.route('/')
 def index():
     # Enhanced index with user statistics
@@ -463,13 +485,22 @@ def payment_success():
 @app.route('/compare-cv-versions')
 def compare_cv_versions():
     original_cv = session.get('original_cv_text', 'Brak oryginalnego CV')
-    optimized_cv = session.get('last_optimized_cv', 'Brak zoptymalizowanego CV')
+    last_optimized_cv = session.get('last_optimized_cv')
+
+    # Wyniki z trybu strumieniowego nie trafiają do sesji - weź ostatni zapisany w bazie
+    if not last_optimized_cv and session.get('cv_upload_id'):
+        latest = AnalysisResult.query.filter(
+            AnalysisResult.cv_upload_id == session['cv_upload_id'],
+            AnalysisResult.analysis_type.in_(['optimize', 'position_optimization'])
+        ).order_by(AnalysisResult.created_at.desc()).first()
+        if latest:
+            last_optimized_cv = latest.get_result_json().get('result')
 
     return jsonify({
         'success': True,
         'original': original_cv,
-        'optimized': optimized_cv,
-        'has_both_versions': bool(session.get('original_cv_text') and session.get('last_optimized_cv'))
+        'optimized': last_optimized_cv or 'Brak zoptymalizowanego CV',
+        'has_both_versions': bool(session.get('original_cv_text') and last_optimized_cv)
     })
 
 @app.route('/upload-cv', methods=['POST'])
@@ -490,28 +521,28 @@ def upload_cv():
         original_filename = file.filename if file and file.filename else 'wklejone_cv.txt'
 
         if file and file.filename and file.filename != '' and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            unique_filename = f"{uuid.uuid4()}_{filename}"
-            file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-
-            # Save the file
-            file.save(file_path)
-
-            try:
-                # Extract text from PDF
-                cv_text = extract_text_from_pdf(file_path)
-                # Remove the file after extraction
-                os.remove(file_path)
-            except Exception as e:
-                logger.error(f"Error processing PDF: {str(e)}")
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                return jsonify({
-                    'success': False,
-                    'message': f"Błąd podczas przetwarzania PDF: {str(e)}"
-                }), 500
+            # Plik jest już zbuforowany i zahashowany podczas odbierania - bez zapisu do UPLOAD_FOLDER;
+            # bufor (i ewentualny plik tymczasowy) jest zamykany na każdej ścieżce wyjścia
+            with hashed_upload(file.stream) as upload:
+                if not is_pdf(upload.head):
+                    return jsonify({
+                        'success': False,
+                        'message': 'Przesłany plik nie jest prawidłowym dokumentem PDF'
+                    }), 400
+                logger.debug(f"CV upload {upload.sha256[:12]}: {upload.size} B{' (spooled)' if upload.spooled else ''}")
+
+                try:
+                    # Extract text from PDF
+                    cv_text = extract_text_from_pdf(upload, upload.sha256)
+                except Exception as e:
+                    logger.error(f"Error processing PDF: {str(e)}")
+                    return jsonify({
+                        'success': False,
+                        'message': f"Błąd podczas przetwarzania PDF: {str(e)}"
+                    }), 500
 
         elif file and file.filename != '':
+            file.stream.close()
             return jsonify({
                 'success': False,
                 'message': 'Nieprawidłowy format pliku. Obsługiwane formaty: PDF'
@@ -543,13 +574,15 @@ def upload_cv():
                 'info'
             )
 
-        # Zapisz CV w bazie danych
+        # Zapisz CV w bazie danych (opis stanowiska raz, w JobPosting)
+        job_posting = get_or_create_job_posting(request.form.get('job_description', ''))
         cv_upload = CVUpload(
             user_id=current_user.id,
             filename=original_filename,
             original_text=cv_text,
             job_title=request.form.get('job_title', ''),
-            job_description=request.form.get('job_description', '')
+            job_description=None if job_posting else request.form.get('job_description', ''),
+            job_posting_id=job_posting.id if job_posting else None
         )
         db.session.add(cv_upload)
         db.session.commit()
@@ -756,58 +789,16 @@ def generate_ai_cv():
                 'premium_required': True
             }), 403
         
-        # Generate AI content based on basic info
-        from utils.openrouter_api import generate_complete_cv_content
-        
-        ai_cv_content = generate_complete_cv_content(
-            target_position=basic_info['targetPosition'],
-            experience_level=basic_info['experience_level'],
-            industry=basic_info['industry'],
-            brief_background=basic_info['brief_background'],
-            language='pl'
-        )
-        
-        # Parse AI response
-        import json
-        try:
-            cv_content = json.loads(ai_cv_content)
-        except json.JSONDecodeError:
-            # Fallback parsing
-            cv_content = parse_ai_json_response(ai_cv_content)
-        
-        # Combine basic info with AI-generated content
-        complete_cv_data = {
-            'firstName': basic_info['firstName'],
-            'lastName': basic_info['lastName'],
-            'email': basic_info['email'],
-            'phone': basic_info['phone'],
-            'city': basic_info['city'],
-            'jobTitle': cv_content.get('professional_title', basic_info['targetPosition']),
-            'summary': cv_content.get('professional_summary', ''),
-            'experiences': cv_content.get('experience_suggestions', []),
-            'education': cv_content.get('education_suggestions', []),
-            'skills': cv_content.get('skills_list', ''),
-            'template_style': basic_info['template_style']
-        }
-        
-        # Generate PDF with selected template
-        from utils.cv_templates import generate_cv_with_template
-        
-        pdf_buffer = generate_cv_with_template(complete_cv_data, basic_info['template_style'])
-        
-        # Encode as base64
-        pdf_base64 = base64.b64encode(pdf_buffer.getvalue()).decode()
-        
+        if wants_async_job(data):
+            job = job_queue.enqueue('generate_ai_cv', {'basic_info': basic_info}, user_id=current_user.id)
+            return job_accepted_response(job)
+
+        generated = execute_ai_cv_generation({'basic_info': basic_info})
+
         # Store in session for potential edits
-        session['ai_generated_cv'] = complete_cv_data
-        
-        return jsonify({
-            'success': True,
-            'cv_data': complete_cv_data,
-            'pdf_data': pdf_base64,
-            'filename': f"AI_CV_{basic_info['firstName']}_{basic_info['lastName']}.pdf",
-            'message': 'CV zostało wygenerowane przez AI z profesjonalnym szablonem!'
-        })
+        session['ai_generated_cv'] = generated['cv_data']
+
+        return jsonify(generated)
         
     except Exception as e:
         logger.error(f"Error generating AI CV: {str(e)}")
@@ -816,6 +807,58 @@ def generate_ai_cv():
             'message': f'Błąd podczas generowania CV: {str(e)}'
         }), 500
 
+@job_queue.handler('generate_ai_cv')
+def execute_ai_cv_generation(params):
+    """Generuje treść CV przez AI i renderuje PDF z wybranym szablonem"""
+    basic_info = params['basic_info']
+
+    # Generate AI content based on basic info
+    from utils.openrouter_api import generate_complete_cv_content
+    
+    # Funkcja tylko dla Premium
+    with model_tier('premium'):
+        ai_cv_content = generate_complete_cv_content(
+            target_position=basic_info['targetPosition'],
+            experience_level=basic_info['experience_level'],
+            industry=basic_info['industry'],
+            brief_background=basic_info['brief_background'],
+            language='pl'
+        )
+    
+    # Parse AI response (brakujące pola uzupełniają wartości domyślne poniżej)
+    cv_content = extract_json(ai_cv_content, allow_partial=True) or {}
+    
+    # Combine basic info with AI-generated content
+    complete_cv_data = {
+        'firstName': basic_info['firstName'],
+        'lastName': basic_info['lastName'],
+        'email': basic_info['email'],
+        'phone': basic_info['phone'],
+        'city': basic_info['city'],
+        'jobTitle': cv_content.get('professional_title', basic_info['targetPosition']),
+        'summary': cv_content.get('professional_summary', ''),
+        'experiences': cv_content.get('experience_suggestions', []),
+        'education': cv_content.get('education_suggestions', []),
+        'skills': cv_content.get('skills_list', ''),
+        'template_style': basic_info['template_style']
+    }
+    
+    # Generate PDF with selected template
+    from utils.cv_templates import generate_cv_with_template
+    
+    pdf_buffer = generate_cv_with_template(complete_cv_data, basic_info['template_style'])
+    
+    # Encode as base64
+    pdf_base64 = base64.b64encode(pdf_buffer.getvalue()).decode()
+    
+    return {
+        'success': True,
+        'cv_data': complete_cv_data,
+        'pdf_data': pdf_base64,
+        'filename': f"AI_CV_{basic_info['firstName']}_{basic_info['lastName']}.pdf",
+        'message': 'CV zostało wygenerowane przez AI z profesjonalnym szablonem!'
+    }
+
 @app.route('/api/create-ai-cv-payment', methods=['POST'])
 @login_required
 def create_ai_cv_payment():
@@ -965,6 +1008,171 @@ def generate_cv_pdf_file(cv_data):
     return buffer
 
 
+options_handlers = {
+    'optimize': optimize_cv,
+    'feedback': generate_recruiter_feedback,
+    'cover_letter': generate_cover_letter,
+    'ats_check': ats_optimization_check,
+    'interview_questions': generate_interview_questions,
+    'cv_score': analyze_cv_score,
+    'keyword_analysis': analyze_keywords_match,
+    'grammar_check': check_grammar_and_style,
+    'position_optimization': optimize_for_position,
+    'interview_tips': generate_interview_tips,
+    'advanced_position_optimization': 'advanced_position_optimization'
+}
+
+def user_tier(payment_verified=False, is_premium_active=False, is_developer=False):
+    """Poziom dostępu (free / paid / premium) używany do wyboru modeli AI"""
+    if is_premium_active or is_developer:
+        return 'premium'
+    if payment_verified:
+        return 'paid'
+    return 'free'
+
+def run_cv_option(selected_option, cv_text, job_description, language, job_title='Specjalista',
+                  company_name='', is_developer=False, payment_verified=False, is_premium_active=False):
+    """
+    Uruchamia wybraną analizę AI dla CV i zwraca gotowy wynik.
+    Nie korzysta z sesji ani z kontekstu żądania, więc może działać poza wątkiem żądania.
+    Modele dobierane są według zadania i poziomu dostępu (utils.llm_profiles), a płacący
+    użytkownicy dostają hedging zapytań (zapasowy model, gdy główny odpowiada wolniej niż p95).
+    """
+    tier = user_tier(payment_verified, is_premium_active, is_developer)
+    with model_tier(tier), model_router.hedging(payment_verified or is_premium_active):
+        return _dispatch_cv_option(selected_option, cv_text, job_description, language, job_title,
+                                   company_name, is_developer, payment_verified, is_premium_active)
+
+def _dispatch_cv_option(selected_option, cv_text, job_description, language, job_title,
+                        company_name, is_developer, payment_verified, is_premium_active):
+    # Obsługa funkcji według poziomów dostępu
+    if selected_option == 'optimize':
+        # Funkcja za 9,99 PLN lub Premium
+        if not is_developer and not payment_verified and not is_premium_active:
+            ai_result = optimize_cv(cv_text, job_description, language, is_premium=False, payment_verified=False)
+            result = parse_ai_json_response(ai_result)
+            result = add_watermark_to_cv(result)
+        else:
+            # Pełne CV dla płacących lub Premium
+            ai_result = optimize_cv(cv_text, job_description, language, is_premium=is_premium_active, payment_verified=True)
+            result = parse_ai_json_response(ai_result)
+
+    elif selected_option == 'ats_optimization_check':
+        # Funkcja za 9,99 PLN lub Premium
+        result = options_handlers[selected_option](cv_text, job_description, language)
+
+    elif selected_option == 'grammar_check':
+        # Sprawdzenie gramatyki nie korzysta z opisu stanowiska
+        result = check_grammar_and_style(cv_text, language)
+
+    elif selected_option == 'position_optimization':
+        # Funkcja tylko Premium
+        ai_result = optimize_for_position(cv_text, job_title, job_description, language)
+        result = parse_ai_json_response(ai_result)
+
+    elif selected_option == 'advanced_position_optimization':
+        # NOWA ZAAWANSOWANA FUNKCJA - tylko Premium
+        from utils.openrouter_api import optimize_cv_for_specific_position
+
+        ai_result = optimize_cv_for_specific_position(
+            cv_text, 
+            job_title, 
+            job_description, 
+            company_name, 
+            language, 
+            is_premium=is_premium_active, 
+            payment_verified=payment_verified
+        )
+        result = parse_ai_json_response(ai_result)
+
+    else:
+        # Pozostałe funkcje
+        result = options_handlers[selected_option](cv_text, job_description, language)
+
+    return result
+
+def save_analysis_result(cv_upload_id, analysis_type, result_data):
+    """
+    Zapisuje wynik analizy w bazie danych (błąd zapisu nie blokuje odpowiedzi)
+
+    Opis stanowiska trafia do współdzielonego JobPosting, a wynik przechowuje tylko odwołanie do niego.
+    """
+    if not cv_upload_id:
+        return
+    try:
+        result_data = dict(result_data)
+        job_posting = get_or_create_job_posting(result_data.get('job_description'), result_data.get('job_url'))
+        if job_posting:
+            result_data.pop('job_description')
+        analysis_result = AnalysisResult(
+            cv_upload_id=cv_upload_id,
+            analysis_type=analysis_type,
+            result_data=json.dumps(result_data, ensure_ascii=False),
+            job_posting_id=job_posting.id if job_posting else None
+        )
+        db.session.add(analysis_result)
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Error saving analysis result: {str(e)}")
+        db.session.rollback()
+
+def check_option_access(selected_option, is_developer, payment_verified, is_premium_active):
+    """Zwraca treść odpowiedzi 403, jeśli użytkownik nie ma dostępu do wybranej funkcji, w przeciwnym razie None"""
+    # Definicja funkcji według poziomów dostępu - zgodnie ze screenem
+    basic_paid_functions = ['optimize', 'ats_optimization_check', 'grammar_check']  # Za 9,99 PLN - 3 funkcje podstawowe
+    premium_functions = ['recruiter_feedback', 'cover_letter', 'cv_score', 'interview_tips', 'keyword_analysis', 'position_optimization', 'advanced_position_optimization']  # Premium 29,99 PLN/miesiąc - wszystkie funkcje ze screena + nowa zaawansowana
+    cv_builder_functions = ['cv_builder']  # STWÓRZ CV SAMEMU - oddzielna płatna usługa
+    free_functions = []  # Tylko podgląd ze znakiem wodnym dla bezpłatnych
+
+    # Sprawdź dostęp do funkcji według poziomów płatności
+    if selected_option in premium_functions:
+        # Funkcje tylko dla Premium (29,99 PLN/miesiąc)
+        if not is_developer and not is_premium_active:
+            return {
+                'success': False,
+                'message': 'Ta funkcja jest dostępna tylko dla użytkowników Premium. Wykup subskrypcję za 29,99 PLN/miesiąc.',
+                'premium_required': True
+            }
+
+    elif selected_option in basic_paid_functions:
+        # Funkcje za 9,99 PLN lub Premium
+        if not is_developer and not payment_verified and not is_premium_active:
+            return {
+                'success': False,
+                'message': 'Ta funkcja wymaga płatności. Zapłać 9,99 PLN za jednorazowe CV lub 29,99 PLN za Premium.',
+                'payment_required': True
+            }
+
+    elif selected_option in cv_builder_functions:
+        # STWÓRZ CV SAMEMU - oddzielna płatna usługa
+        cv_builder_paid = session.get('cv_builder_paid', False)
+        if not is_developer and not cv_builder_paid:
+            return {
+                'success': False,
+                'message': 'Funkcja STWÓRZ CV SAMEMU wymaga oddzielnej płatności.',
+                'cv_builder_payment_required': True
+            }
+
+    return None
+
+def wants_async_job(data):
+    """Czy żądanie ma trafić do kolejki zadań zamiast być wykonane od razu"""
+    return bool(data.get('async', AI_ASYNC_JOBS))
+
+def job_accepted_response(job):
+    """Odpowiedź 202 z identyfikatorem zadania i adresami do sprawdzania wyniku"""
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('job_status', job_id=job.id),
+        'result_url': url_for('job_result', job_id=job.id)
+    }), 202
+
+def sse_event(event, data):
+    """Formatuje pojedyncze zdarzenie Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @app.route('/process-cv', methods=['POST'])
 @login_required
 @rate_limit('cv_process')
@@ -987,6 +1195,7 @@ def process_cv():
     selected_option = data.get('selected_option', '')
     roles = data.get('roles', [])
     language = data.get('language', 'pl')  # Default to Polish
+    stream = bool(data.get('stream'))
 
     if not cv_text:
         return jsonify({
@@ -994,6 +1203,55 @@ def process_cv():
             'message': 'No CV text found. Please upload a CV first.'
         }), 400
 
+    if selected_option not in options_handlers:
+        return jsonify({
+            'success': False,
+            'message': 'Invalid option selected.'
+        }), 400
+
+    # Sprawdź status płatności i dostępu
+    payment_verified = session.get('payment_verified', False)  # 9,99 PLN - jednorazowe CV
+    is_developer = current_user.username == 'developer'
+    is_premium_active = current_user.is_premium_active()  # 29,99 PLN - Premium
+
+    logger.info(f"Processing CV with language: {language}, option: {selected_option}")
+
+    # Sprawdź dostęp do funkcji według poziomów płatności
+    access_error = check_option_access(selected_option, is_developer, payment_verified, is_premium_active)
+    if access_error:
+        return jsonify(access_error), 403
+
+    option_kwargs = {
+        'job_title': data.get('job_title', 'Specjalista'),
+        'company_name': data.get('company_name', ''),
+        'is_developer': is_developer,
+        'payment_verified': payment_verified,
+        'is_premium_active': is_premium_active
+    }
+    force_refresh = bool(data.get('force_refresh'))
+    cv_upload_id = session.get('cv_upload_id')
+
+    if wants_async_job(data) and not stream:
+        job = job_queue.enqueue('process_cv', {
+            'selected_option': selected_option,
+            'cv_text': cv_text,
+            'job_url': job_url,
+            'job_description': data.get('job_description'),
+            'language': language,
+            'option_kwargs': option_kwargs,
+            'force_refresh': force_refresh,
+            'cv_upload_id': cv_upload_id
+        }, user_id=current_user.id)
+        return job_accepted_response(job)
+
+    if stream:
+        # Wynik nie trafi do ciasteczka sesji po rozpoczęciu strumienia -
+        # porównanie wersji odczyta go wtedy z bazy danych
+        if selected_option in ['optimize', 'position_optimization']:
+            session.pop('last_optimized_cv', None)
+        return stream_cv_option(selected_option, cv_text, job_url, data.get('job_description'),
+                                language, option_kwargs, force_refresh, cv_upload_id)
+
     # Process Job URL if provided
     extracted_job_description = ''
     if job_url:
@@ -1008,144 +1266,22 @@ def process_cv():
 
     try:
         job_description = data.get('job_description', extracted_job_description)
-        result = None
-
-        options_handlers = {
-            'optimize': optimize_cv,
-            'feedback': generate_recruiter_feedback,
-            'cover_letter': generate_cover_letter,
-            'ats_check': ats_optimization_check,
-            'interview_questions': generate_interview_questions,
-            'cv_score': analyze_cv_score,
-            'keyword_analysis': analyze_keywords_match,
-            'grammar_check': check_grammar_and_style,
-            'position_optimization': optimize_for_position,
-            'interview_tips': generate_interview_tips,
-            'advanced_position_optimization': 'advanced_position_optimization'
-        }
-
-        if selected_option not in options_handlers:
-            return jsonify({
-                'success': False,
-                'message': 'Invalid option selected.'
-            }), 400
-
-        # Sprawdź status płatności i dostępu
-        payment_verified = session.get('payment_verified', False)  # 9,99 PLN - jednorazowe CV
-        is_developer = current_user.username == 'developer'
-        is_premium_active = current_user.is_premium_active()  # 29,99 PLN - Premium
-
-        # Definicja funkcji według poziomów dostępu - zgodnie ze screenem
-        basic_paid_functions = ['optimize', 'ats_optimization_check', 'grammar_check']  # Za 9,99 PLN - 3 funkcje podstawowe
-        premium_functions = ['recruiter_feedback', 'cover_letter', 'cv_score', 'interview_tips', 'keyword_analysis', 'position_optimization', 'advanced_position_optimization']  # Premium 29,99 PLN/miesiąc - wszystkie funkcje ze screena + nowa zaawansowana
-        cv_builder_functions = ['cv_builder']  # STWÓRZ CV SAMEMU - oddzielna płatna usługa
-        free_functions = []  # Tylko podgląd ze znakiem wodnym dla bezpłatnych
 
-        logger.info(f"Processing CV with language: {language}, option: {selected_option}")
-
-        # Sprawdź dostęp do funkcji według poziomów płatności
-        if selected_option in premium_functions:
-            # Funkcje tylko dla Premium (29,99 PLN/miesiąc)
-            if not is_developer and not is_premium_active:
-                return jsonify({
-                    'success': False,
-                    'message': 'Ta funkcja jest dostępna tylko dla użytkowników Premium. Wykup subskrypcję za 29,99 PLN/miesiąc.',
-                    'premium_required': True
-                }), 403
-
-        elif selected_option in basic_paid_functions:
-            # Funkcje za 9,99 PLN lub Premium
-            if not is_developer and not payment_verified and not is_premium_active:
-                return jsonify({
-                    'success': False,
-                    'message': 'Ta funkcja wymaga płatności. Zapłać 9,99 PLN za jednorazowe CV lub 29,99 PLN za Premium.',
-                    'payment_required': True
-                }), 403
-
-        elif selected_option in cv_builder_functions:
-            # STWÓRZ CV SAMEMU - oddzielna płatna usługa
-            cv_builder_paid = session.get('cv_builder_paid', False)
-            if not is_developer and not cv_builder_paid:
-                return jsonify({
-                    'success': False,
-                    'message': 'Funkcja STWÓRZ CV SAMEMU wymaga oddzielnej płatności.',
-                    'cv_builder_payment_required': True
-                }), 403
-
-        # Obsługa funkcji według poziomów dostępu
-        if selected_option == 'optimize':
-            # Funkcja za 9,99 PLN lub Premium
-            if not is_developer and not payment_verified and not is_premium_active:
-                ai_result = optimize_cv(cv_text, job_description, language, is_premium=False, payment_verified=False)
-                result = parse_ai_json_response(ai_result)
-                result = add_watermark_to_cv(result)
-            else:
-                # Pełne CV dla płacących lub Premium
-                ai_result = optimize_cv(cv_text, job_description, language, is_premium=is_premium_active, payment_verified=True)
-                result = parse_ai_json_response(ai_result)
-
-        elif selected_option == 'ats_optimization_check':
-            # Funkcja za 9,99 PLN lub Premium
-            result = options_handlers[selected_option](cv_text, job_description, language)
-
-        elif selected_option == 'position_optimization':
-            # Funkcja tylko Premium
-            job_title = data.get('job_title', 'Specjalista')
-            ai_result = optimize_for_position(cv_text, job_title, job_description, language)
-            result = parse_ai_json_response(ai_result)
-
-        elif selected_option == 'advanced_position_optimization':
-            # NOWA ZAAWANSOWANA FUNKCJA - tylko Premium
-            from utils.openrouter_api import optimize_cv_for_specific_position
-
-            job_title = data.get('job_title', 'Specjalista')
-            company_name = data.get('company_name', '')
-
-            ai_result = optimize_cv_for_specific_position(
-                cv_text, 
-                job_title, 
-                job_description, 
-                company_name, 
-                language, 
-                is_premium=is_premium_active, 
-                payment_verified=payment_verified
-            )
-            result = parse_ai_json_response(ai_result)
-
-        elif selected_option in ['cover_letter', 'interview_tips', 'recruiter_feedback']:
-            # Funkcje tylko Premium
-            if selected_option == 'cover_letter':
-                result = options_handlers[selected_option](cv_text, job_description, language)
-            else:
-                result = options_handlers[selected_option](cv_text, job_description, language)
-
-        else:
-            # Pozostałe funkcje
-            result = options_handlers[selected_option](cv_text, job_description, language)
+        # force_refresh pomija cache odpowiedzi AI i wymusza nową generację
+        with llm_cache.bypassed() if force_refresh else nullcontext():
+            result = run_cv_option(selected_option, cv_text, job_description, language, **option_kwargs)
 
         # Store optimized CV for comparison (only for optimization options)
         if selected_option in ['optimize', 'position_optimization']:
             session['last_optimized_cv'] = result
 
         # Zapisz wynik analizy w bazie danych
-        cv_upload_id = session.get('cv_upload_id')
-        if cv_upload_id:
-            try:
-                analysis_result = AnalysisResult(
-                    cv_upload_id=cv_upload_id,
-                    analysis_type=selected_option,
-                    result_data=json.dumps({
-                        'result': result,
-                        'job_description': extracted_job_description if extracted_job_description else job_description,
-                        'job_url': job_url,
-                        'timestamp': datetime.utcnow().isoformat()
-                    }, ensure_ascii=False)
-                )
-                db.session.add(analysis_result)
-                db.session.commit()
-            except Exception as e:
-                logger.error(f"Error saving analysis result: {str(e)}")
-                # Nie blokujemy odpowiedzi, tylko logujemy błąd
+        save_analysis_result(cv_upload_id, selected_option, {
+            'result': result,
+            'job_description': extracted_job_description if extracted_job_description else job_description,
+            'job_url': job_url,
+            'timestamp': datetime.utcnow().isoformat()
+        })
 
         return jsonify({
             'success': True,
@@ -1160,6 +1296,288 @@ def process_cv():
             'message': f"Error processing request: {str(e)}"
         }), 500
 
+@job_queue.handler('process_cv')
+def execute_process_cv(params):
+    """Wykonuje analizę /process-cv z kolejki zadań i zapisuje AnalysisResult"""
+    extracted_job_description = ''
+    if params['job_url']:
+        extracted_job_description = analyze_job_url(params['job_url'])
+    job_description = params['job_description'] if params['job_description'] is not None else extracted_job_description
+
+    with llm_cache.bypassed() if params['force_refresh'] else nullcontext():
+        result = run_cv_option(params['selected_option'], params['cv_text'], job_description,
+                               params['language'], **params['option_kwargs'])
+
+    save_analysis_result(params['cv_upload_id'], params['selected_option'], {
+        'result': result,
+        'job_description': extracted_job_description if extracted_job_description else job_description,
+        'job_url': params['job_url'],
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+    return {
+        'success': True,
+        'result': result,
+        'job_description': extracted_job_description if extracted_job_description else None
+    }
+
+def stream_cv_option(selected_option, cv_text, job_url, job_description, language,
+                     option_kwargs, force_refresh, cv_upload_id):
+    """
+    Tryb strumieniowy /process-cv: tokeny z OpenRouter trafiają do przeglądarki
+    jako Server-Sent Events (bez sekcji <think>), co jakiś czas także zdarzenie
+    'partial' z częściowo sparsowanym JSON, a po zakończeniu wysyłamy gotowy
+    wynik w zdarzeniu 'done'. Gdy odpowiedź zostanie poprawiona zapytaniem
+    naprawczym JSON, zdarzenie 'replace' zastępuje cały dotychczasowy tekst.
+    Analiza i zapis AnalysisResult działają w osobnym wątku, więc opłacony
+    wynik trafia do bazy także wtedy, gdy klient się rozłączy.
+    """
+    events = queue.Queue()
+    partial_state = {'extractor': JSONExtractor(), 'sent_at': 0.0}
+
+    def on_token(text):
+        events.put(('token', {'text': text}))
+        # Częściowo sparsowany JSON (np. rosnące optimized_cv) co STREAM_PARTIAL_INTERVAL sekund
+        if partial_state['extractor'].done:
+            partial_state['extractor'] = JSONExtractor()
+        partial_state['extractor'].feed(text)
+        now = time.monotonic()
+        if now - partial_state['sent_at'] >= STREAM_PARTIAL_INTERVAL:
+            partial_state['sent_at'] = now
+            partial = partial_state['extractor'].partial()
+            if partial:
+                events.put(('partial', {'result': partial}))
+
+    def on_replace(text):
+        # Odpowiedź poprawiona zapytaniem naprawczym - przeglądarka zastępuje dotychczasowy tekst
+        events.put(('replace', {'text': text}))
+        partial_state['extractor'] = JSONExtractor()
+        partial_state['extractor'].feed(text)
+
+    def run_analysis():
+        try:
+            extracted_job_description = ''
+            if job_url:
+                events.put(('status', {'stage': 'job_url'}))
+                extracted_job_description = analyze_job_url(job_url)
+            final_job_description = job_description if job_description is not None else extracted_job_description
+
+            events.put(('status', {'stage': 'generating'}))
+            with llm_cache.bypassed() if force_refresh else nullcontext():
+                with stream_tokens_to(on_token, replace=on_replace):
+                    result = run_cv_option(selected_option, cv_text, final_job_description, language, **option_kwargs)
+            with app.app_context():
+                save_analysis_result(cv_upload_id, selected_option, {
+                    'result': result,
+                    'job_description': extracted_job_description if extracted_job_description else final_job_description,
+                    'job_url': job_url,
+                    'timestamp': datetime.utcnow().isoformat()
+                })
+            events.put(('done', {
+                'success': True,
+                'result': result,
+                'job_description': extracted_job_description if extracted_job_description else None
+            }))
+        except Exception as e:
+            logger.error(f"Error streaming CV analysis: {str(e)}")
+            events.put(('error', {'success': False, 'message': f"Error processing request: {str(e)}"}))
+
+    threading.Thread(target=run_analysis, daemon=True).start()
+
+    @stream_with_context
+    def generate():
+        # Pierwszy bajt od razu - przeglądarka wie, że analiza ruszyła
+        yield ': stream-open\n\n'
+        while True:
+            try:
+                event, payload = events.get(timeout=15)
+            except queue.Empty:
+                # Model wciąż myśli (<think>) - podtrzymaj połączenie
+                yield ': keep-alive\n\n'
+                continue
+            yield sse_event(event, payload)
+            if event in ('done', 'error'):
+                return
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/process-cv/batch', methods=['POST'])
+@login_required
+def process_cv_batch():
+    """
+    Pełny raport: kilka analiz z options_handlers naraz.
+
+    CV i opis stanowiska (także pobrany z job_url) są przygotowywane raz,
+    a analizy działają równolegle w puli batch_executor. Z "stream": true
+    każdy wynik jest wysyłany jako zdarzenie SSE 'result' zaraz po ukończeniu.
+    Limit 'cv_process' jest liczony osobno dla każdej wybranej analizy.
+    """
+    if current_user.username != 'developer' and not session.get('payment_verified'):
+        return jsonify({
+            'success': False,
+            'message': 'Aby wygenerować CV, musisz najpierw dokonać płatności 9,99 PLN.',
+            'payment_required': True
+        }), 402
+
+    data = request.json or {}
+    cv_text = data.get('cv_text') or session.get('cv_text')
+    job_url = data.get('job_url', '')
+    language = data.get('language', 'pl')
+    stream = bool(data.get('stream'))
+    force_refresh = bool(data.get('force_refresh'))
+    cv_upload_id = session.get('cv_upload_id')
+
+    # Kolejność zachowana, duplikaty pominięte
+    selected_options = list(dict.fromkeys(data.get('options') or []))
+
+    if not cv_text:
+        return jsonify({
+            'success': False,
+            'message': 'No CV text found. Please upload a CV first.'
+        }), 400
+
+    invalid_options = [option for option in selected_options if option not in options_handlers]
+    if not selected_options or invalid_options:
+        return jsonify({
+            'success': False,
+            'message': f"Invalid options selected: {', '.join(invalid_options) or 'none'}"
+        }), 400
+
+    payment_verified = session.get('payment_verified', False)
+    is_developer = current_user.username == 'developer'
+    is_premium_active = current_user.is_premium_active()
+
+    for option in selected_options:
+        access_error = check_option_access(option, is_developer, payment_verified, is_premium_active)
+        if access_error:
+            access_error['option'] = option
+            return jsonify(access_error), 403
+
+    # Każda analiza to osobne płatne wywołanie AI - tyle samo pozycji w limicie co w /process-cv
+    identifier = request_identifier()
+    if not rate_limiter.is_allowed(identifier, 'cv_process', cost=len(selected_options)):
+        reset_time = rate_limiter.get_reset_time(identifier, 'cv_process')
+        return jsonify({
+            'success': False,
+            'message': f"Rate limit exceeded: {len(selected_options)} analyses requested, "
+                       f"{rate_limiter.remaining(identifier, 'cv_process')} left. Try again in {reset_time} seconds.",
+            'retry_after': reset_time
+        }), 429
+
+    option_kwargs = {
+        'job_title': data.get('job_title', 'Specjalista'),
+        'company_name': data.get('company_name', ''),
+        'is_developer': is_developer,
+        'payment_verified': payment_verified,
+        'is_premium_active': is_premium_active
+    }
+
+    # Wspólne przygotowanie danych - ogłoszenie pobieramy raz dla wszystkich analiz
+    cv_text = cv_text.strip()
+    extracted_job_description = ''
+    if job_url:
+        try:
+            extracted_job_description = analyze_job_url(job_url)
+        except Exception as e:
+            logger.error(f"Error extracting job description from URL: {str(e)}")
+            return jsonify({
+                'success': False,
+                'message': f"Error extracting job description from URL: {str(e)}"
+            }), 500
+    job_description = data.get('job_description', extracted_job_description)
+    stored_job_description = extracted_job_description if extracted_job_description else job_description
+
+    logger.info(f"Processing CV batch with language: {language}, options: {selected_options}")
+
+    def run_option(option):
+        with llm_cache.bypassed() if force_refresh else nullcontext():
+            result = run_cv_option(option, cv_text, job_description, language, **option_kwargs)
+        # Zapis w wątku puli - wynik zostaje w bazie także po rozłączeniu klienta strumienia
+        with app.app_context():
+            save_analysis_result(cv_upload_id, option, {
+                'result': result,
+                'job_description': stored_job_description,
+                'job_url': job_url,
+                'timestamp': datetime.utcnow().isoformat()
+            })
+        return result
+
+    events = queue.Queue()
+    started = time.monotonic()
+    for option in selected_options:
+        # Każde zadanie dostaje kopię kontekstu (contextvars) wątku żądania
+        future = batch_executor.submit(contextvars.copy_context().run, run_option, option)
+        future.add_done_callback(lambda f, option=option: events.put((option, f)))
+
+    def completed_results():
+        """Zwraca (option, result, error) w kolejności ukończenia; None podtrzymuje połączenie"""
+        for _ in selected_options:
+            while True:
+                try:
+                    option, future = events.get(timeout=15)
+                    break
+                except queue.Empty:
+                    yield None
+            try:
+                yield option, future.result(), None
+            except Exception as e:
+                logger.error(f"Error processing CV batch option {option}: {str(e)}")
+                yield option, None, f"Error processing request: {str(e)}"
+
+    if stream:
+        if 'optimize' in selected_options or 'position_optimization' in selected_options:
+            session.pop('last_optimized_cv', None)
+
+        @stream_with_context
+        def generate():
+            yield ': stream-open\n\n'
+            for item in completed_results():
+                if item is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                option, result, error = item
+                if error:
+                    yield sse_event('error', {'option': option, 'success': False, 'message': error})
+                    continue
+                yield sse_event('result', {'option': option, 'success': True, 'result': result})
+            yield sse_event('done', {
+                'success': True,
+                'options': selected_options,
+                'elapsed': round(time.monotonic() - started, 2),
+                'job_description': extracted_job_description if extracted_job_description else None
+            })
+
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+
+    results = {}
+    errors = {}
+    for item in completed_results():
+        if item is None:
+            continue
+        option, result, error = item
+        if error:
+            errors[option] = error
+            continue
+        results[option] = result
+
+    for option in ['optimize', 'position_optimization']:
+        if option in results:
+            session['last_optimized_cv'] = results[option]
+
+    return jsonify({
+        'success': bool(results),
+        'results': results,
+        'errors': errors,
+        'elapsed': round(time.monotonic() - started, 2),
+        'job_description': extracted_job_description if extracted_job_description else None
+    })
+
 @app.route('/apply-recruiter-feedback', methods=['POST'])
 @login_required
 @rate_limit('cv_process')
@@ -1199,45 +1617,27 @@ def apply_recruiter_feedback():
                 'payment_required': True
             }), 403
 
-        # Zastosuj poprawki rekrutera do CV
-        from utils.openrouter_api import apply_recruiter_feedback_to_cv
-        
-        ai_result = apply_recruiter_feedback_to_cv(
-            cv_text, 
-            recruiter_feedback, 
-            job_description, 
-            language, 
-            is_premium=is_premium_active, 
-            payment_verified=payment_verified or is_developer
-        )
+        params = {
+            'cv_text': cv_text,
+            'recruiter_feedback': recruiter_feedback,
+            'job_description': job_description,
+            'language': language,
+            'is_premium_active': is_premium_active,
+            'payment_verified': payment_verified or is_developer,
+            'cv_upload_id': session.get('cv_upload_id')
+        }
 
-        # Parse JSON response
-        result = parse_ai_json_response(ai_result)
+        if wants_async_job(data):
+            job = job_queue.enqueue('apply_recruiter_feedback', params, user_id=current_user.id)
+            return job_accepted_response(job)
+
+        result = execute_recruiter_feedback(params)['result']
 
         # Store improved CV for comparison
         if isinstance(result, dict) and 'improved_cv' in result:
             session['last_optimized_cv'] = result['improved_cv']
             session['last_feedback_applied'] = True
 
-        # Zapisz wynik w bazie danych
-        cv_upload_id = session.get('cv_upload_id')
-        if cv_upload_id:
-            try:
-                analysis_result = AnalysisResult(
-                    cv_upload_id=cv_upload_id,
-                    analysis_type='apply_recruiter_feedback',
-                    result_data=json.dumps({
-                        'result': result,
-                        'original_feedback': recruiter_feedback,
-                        'job_description': job_description,
-                        'timestamp': datetime.utcnow().isoformat()
-                    }, ensure_ascii=False)
-                )
-                db.session.add(analysis_result)
-                db.session.commit()
-            except Exception as e:
-                logger.error(f"Error saving feedback application result: {str(e)}")
-
         return jsonify({
             'success': True,
             'result': result,
@@ -1251,10 +1651,198 @@ def apply_recruiter_feedback():
             'message': f'Błąd podczas zastosowania poprawek: {str(e)}'
         }), 500
 
+@job_queue.handler('apply_recruiter_feedback')
+def execute_recruiter_feedback(params):
+    """Stosuje poprawki rekrutera do CV i zapisuje wynik w bazie danych"""
+    # Zastosuj poprawki rekrutera do CV
+    from utils.openrouter_api import apply_recruiter_feedback_to_cv
+    
+    # Funkcja płatna - hedging zapytań do modelu zapasowego
+    tier = user_tier(params['payment_verified'], params['is_premium_active'])
+    with model_tier(tier), model_router.hedging():
+        ai_result = apply_recruiter_feedback_to_cv(
+            params['cv_text'], 
+            params['recruiter_feedback'], 
+            params['job_description'], 
+            params['language'], 
+            is_premium=params['is_premium_active'], 
+            payment_verified=params['payment_verified']
+        )
+
+    # Parse JSON response (improved_cv, applied_changes, ...); tekst, jeśli to nie JSON
+    result = extract_json(ai_result, 'apply_recruiter_feedback') or ai_result
+
+    # Zapisz wynik w bazie danych
+    save_analysis_result(params['cv_upload_id'], 'apply_recruiter_feedback', {
+        'result': result,
+        'original_feedback': params['recruiter_feedback'],
+        'job_description': params['job_description'],
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+    return {'success': True, 'result': result, 'message': 'Poprawki rekrutera zostały pomyślnie zastosowane do CV!'}
+
+def anonymous_job_owner():
+    """Losowy identyfikator sesji, do której przypisywane są zadania niezalogowanego użytkownika"""
+    if 'job_owner' not in session:
+        session['job_owner'] = uuid.uuid4().hex
+    return session['job_owner']
+
+def get_accessible_job(job_id):
+    """Zwraca zadanie, jeśli bieżący użytkownik ma do niego dostęp"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return None
+    if job.user_id is not None:
+        if not current_user.is_authenticated or current_user.id != job.user_id:
+            return None
+    elif job.owner_token is None or job.owner_token != session.get('job_owner'):
+        # Anonimowe zadanie widzi tylko sesja, która je utworzyła
+        return None
+    return job
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Status zadania AI z kolejki"""
+    job = get_accessible_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Nie znaleziono zadania'}), 404
+
+    return jsonify(dict(job.to_status_dict(), success=True))
+
+@app.route('/api/jobs/<job_id>/result')
+def job_result(job_id):
+    """Wynik zadania AI - 202 dopóki zadanie nie zostanie zakończone"""
+    job = get_accessible_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Nie znaleziono zadania'}), 404
+
+    if job.status == 'failed':
+        return jsonify({
+            'success': False,
+            'status': job.status,
+            'message': f'Zadanie zakończone błędem: {job.error}'
+        }), 500
+
+    if job.status != 'done':
+        return jsonify(dict(job.to_status_dict(), success=True)), 202
+
+    result = job.get_result_json() or {}
+
+    # Te same wpisy w sesji, które ustawiają synchroniczne wersje endpointów
+    if job.job_type == 'process_cv':
+        if job.get_payload_json().get('selected_option') in ['optimize', 'position_optimization']:
+            session['last_optimized_cv'] = result.get('result')
+    elif job.job_type == 'apply_recruiter_feedback':
+        feedback_result = result.get('result')
+        if isinstance(feedback_result, dict) and 'improved_cv' in feedback_result:
+            session['last_optimized_cv'] = feedback_result['improved_cv']
+            session['last_feedback_applied'] = True
+    elif job.job_type == 'generate_ai_cv':
+        session['ai_generated_cv'] = result.get('cv_data')
+
+    return jsonify(result)
+
+@app.route('/api/admin/llm-stats')
+@login_required
+def llm_stats():
+    """Statystyki warstwy AI (cache, single-flight, tokeny rozumowania, opóźnienia modeli) - tylko dla konta developer"""
+    if current_user.username != 'developer':
+        return jsonify({'success': False, 'message': 'Brak dostępu'}), 403
+
+    return jsonify({
+        'success': True,
+        'cache': llm_cache.stats(),
+        'single_flight': single_flight.stats(),
+        'reasoning': reasoning_stats.stats(),
+        'models': model_router.stats(),
+        'token_budget': token_budget.stats(),
+        'job_pages': job_page_cache.stats(),
+        'anonymous_costs': anonymous_cost_limiter.stats(),
+        'pdf_text': pdf_text_cache.stats(),
+        'pdf_engines': engine_timings.stats()
+    })
+
+@app.route('/api/job-urls/batch', methods=['POST'])
+@login_required
+@rate_limit('job_batch')
+def ingest_job_urls_batch():
+    """
+    Pobiera wiele ofert pracy naraz i zwraca je jako NDJSON.
+
+    Adresy są deduplikowane po kanonicznym URL, pobierane równolegle
+    (z limitami na domenę) i każda oferta jest wysyłana jako osobna linia
+    JSON zaraz po wyciągnięciu; pominięte duplikaty dostają własną linię
+    z "duplicate_of", a ostatnia linia to podsumowanie "done".
+    """
+    data = request.get_json(silent=True) or {}
+    urls = data.get('urls')
+    if not isinstance(urls, list) or not urls:
+        return jsonify({'success': False, 'message': 'Podaj listę adresów ofert w polu "urls"'}), 400
+
+    unique_urls, invalid, duplicates = prepare_urls(urls)
+    if len(unique_urls) > JOB_BATCH_MAX_URLS:
+        return jsonify({
+            'success': False,
+            'message': f'Maksymalnie {JOB_BATCH_MAX_URLS} ofert w jednym żądaniu'
+        }), 400
+
+    started = time.monotonic()
+
+    @stream_with_context
+    def generate():
+        for url in invalid:
+            yield json.dumps({'url': url, 'success': False, 'message': 'Invalid URL format'}, ensure_ascii=False) + '\n'
+        for url, kept_url in duplicates:
+            yield json.dumps({
+                'url': url,
+                'success': False,
+                'duplicate_of': kept_url,
+                'message': 'Duplicate of another URL in this batch (same offer), skipped'
+            }, ensure_ascii=False) + '\n'
+        succeeded = 0
+        # Rozłączenie klienta zamyka generator - closing() anuluje wtedy pobrania, które jeszcze nie ruszyły
+        with closing(ingest_job_urls(unique_urls)) as results:
+            for result in results:
+                succeeded += result['success']
+                yield json.dumps(result, ensure_ascii=False) + '\n'
+        yield json.dumps({
+            'done': True,
+            'total': len(unique_urls),
+            'succeeded': succeeded,
+            'invalid': len(invalid),
+            'duplicates': len(duplicates),
+            'elapsed': round(time.monotonic() - started, 2)
+        }, ensure_ascii=False) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Koszt (w tokenach) pobrania ogłoszenia z URL dla niezalogowanych
+JOB_URL_FETCH_COST = int(os.environ.get('JOB_URL_FETCH_COST', 500))
+
+def anonymous_cost_exceeded(cost):
+    """429 response if an anonymous caller has no AI token budget left for `cost`, else None"""
+    if current_user.is_authenticated or cost <= 0:
+        return None
+    retry_after = anonymous_cost_limiter.charge(request.remote_addr, cost)
+    if not retry_after:
+        return None
+    return jsonify({
+        'success': False,
+        'message': f'Przekroczono limit analiz dla niezalogowanych. Spróbuj ponownie za {retry_after} s lub zaloguj się.',
+        'retry_after': retry_after
+    }), 429
+
 @app.route('/analyze-job-posting', methods=['POST'])
 def analyze_job_posting():
     """
     Analizuje opis stanowiska i zwraca szczegółowe informacje
+
+    Niezalogowani płacą z budżetu tokenów (anonymous_cost_limiter) - ogłoszenia
+    przeanalizowane już wcześniej (cache) są darmowe.
     """
     try:
         data = request.get_json()
@@ -1268,38 +1856,40 @@ def analyze_job_posting():
                 'message': 'Podaj opis stanowiska lub URL oferty pracy'
             }), 400
 
+        params = {'job_description': job_description, 'job_url': job_url, 'language': language}
+        if job_url and not job_description:
+            limited = anonymous_cost_exceeded(JOB_URL_FETCH_COST)
+            if limited:
+                return limited
+
+        if wants_async_job(data):
+            # Treść z URL nie jest jeszcze znana - liczymy koszt analizy bez samego opisu
+            if cached_job_posting_analysis(job_description, language) is None:
+                limited = anonymous_cost_exceeded(estimate_job_analysis_cost(job_description))
+                if limited:
+                    return limited
+            if current_user.is_authenticated:
+                job = job_queue.enqueue('analyze_job_posting', params, user_id=current_user.id)
+            else:
+                job = job_queue.enqueue('analyze_job_posting', params, owner_token=anonymous_job_owner())
+            return job_accepted_response(job)
+
         # Jeśli podano URL, najpierw wyciągnij opis
         if job_url and not job_description:
             try:
-                job_description = analyze_job_url(job_url)
+                params['job_description'] = analyze_job_url(job_url)
             except Exception as e:
                 return jsonify({
                     'success': False,
                     'message': f'Błąd podczas analizy URL: {str(e)}'
                 }), 500
 
-        # Analizuj opis stanowiska
-        from utils.openrouter_api import analyze_polish_job_posting
-        analysis_result = analyze_polish_job_posting(job_description, language)
+        if cached_job_posting_analysis(params['job_description'], language) is None:
+            limited = anonymous_cost_exceeded(estimate_job_analysis_cost(params['job_description']))
+            if limited:
+                return limited
 
-        # Spróbuj sparsować JSON z odpowiedzi AI
-        try:
-            import json
-            parsed_analysis = json.loads(analysis_result)
-        except json.JSONDecodeError:
-            # Jeśli nie da się sparsować jako JSON, wyciągnij JSON z tekstu
-            import re
-            json_match = re.search(r'\{.*\}', analysis_result, re.DOTALL)
-            if json_match:
-                parsed_analysis = json.loads(json_match.group())
-            else:
-                parsed_analysis = {'analysis': analysis_result}
-
-        return jsonify({
-            'success': True,
-            'analysis': parsed_analysis,
-            'raw_description': job_description
-        })
+        return jsonify(execute_job_posting_analysis(params))
 
     except Exception as e:
         logger.error(f"Error analyzing job posting: {str(e)}")
@@ -1308,10 +1898,34 @@ def analyze_job_posting():
             'message': f'Błąd podczas analizy stanowiska: {str(e)}'
         }), 500
 
+@job_queue.handler('analyze_job_posting')
+def execute_job_posting_analysis(params):
+    """Analizuje ogłoszenie (pobierając je z URL, jeśli trzeba) i zwraca sparsowaną analizę"""
+    job_description = params['job_description']
+    if params.get('job_url') and not job_description:
+        job_description = analyze_job_url(params['job_url'])
+
+    def analyze(description, language):
+        from utils.openrouter_api import analyze_polish_job_posting
+        analysis_result = analyze_polish_job_posting(description, language)
+        # Wyciągnij JSON z odpowiedzi AI, a jeśli się nie da - zwróć tekst analizy
+        return extract_json(analysis_result) or {'analysis': analysis_result}
+
+    # Ta sama oferta analizowana wcześniej - wynik z JobPosting
+    parsed_analysis, job_posting = analyze_job_posting_cached(
+        job_description, params['language'], analyze, url=params.get('job_url')
+    )
+
+    return {
+        'success': True,
+        'analysis': parsed_analysis,
+        'raw_description': job_description,
+        'job_posting_id': job_posting.id if job_posting else None,
+        'keywords': job_posting.get_keywords() if job_posting else []
+    }
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
-
         # Create developer account for management
         dev_user = User.query.filter_by(username='developer').first()
         if not dev_user:
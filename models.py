@@ -2,8 +2,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime, timedelta
 import json
+import time
 
 db = SQLAlchemy()
 
@@ -63,11 +65,13 @@ class CVUpload(db.Model):
     filename = db.Column(db.String(255), nullable=False)
     original_text = db.Column(db.Text, nullable=False)
     job_title = db.Column(db.String(200))
-    job_description = db.Column(db.Text)
+    job_description = db.Column(db.Text)  # starsze wpisy lub brak zapisu JobPosting - nowe wskazują job_posting
+    job_posting_id = db.Column(db.Integer, db.ForeignKey('job_postings.id'), index=True)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     analysis_results = db.relationship('AnalysisResult', backref='cv_upload', lazy=True, cascade='all, delete-orphan')
+    job_posting = db.relationship('JobPosting', lazy=True)
     
     def __repr__(self):
         return f'<CVUpload {self.filename}>'
@@ -78,15 +82,148 @@ class AnalysisResult(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     cv_upload_id = db.Column(db.Integer, db.ForeignKey('cv_uploads.id'), nullable=False)
     analysis_type = db.Column(db.String(50), nullable=False)  # optimize, feedback, cover_letter, etc.
-    result_data = db.Column(db.Text, nullable=False)  # JSON string
+    result_data = db.Column(db.Text, nullable=False)  # JSON string (bez treści ogłoszenia, jeśli jest job_posting)
+    job_posting_id = db.Column(db.Integer, db.ForeignKey('job_postings.id'), index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    job_posting = db.relationship('JobPosting', lazy=True)
+    
     def get_result_json(self):
-        """Parse result_data as JSON"""
+        """Parse result_data as JSON (job_description restored from the linked JobPosting)"""
         try:
-            return json.loads(self.result_data)
+            result = json.loads(self.result_data)
         except json.JSONDecodeError:
             return {}
+        if self.job_posting and isinstance(result, dict) and 'job_description' not in result:
+            result['job_description'] = self.job_posting.cleaned_text
+        return result
     
     def __repr__(self):
         return f'<AnalysisResult {self.analysis_type}>'
+
+class JobPosting(db.Model):
+    __tablename__ = 'job_postings'
+
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)  # sha256 oczyszczonego tekstu
+    canonical_url = db.Column(db.String(1000), index=True)
+    raw_text = db.Column(db.Text, nullable=False)
+    cleaned_text = db.Column(db.Text, nullable=False)
+    keywords = db.Column(db.Text)  # JSON list
+    analysis = db.Column(db.Text)  # JSON: język -> {version, analyzed_at, result} analyze_polish_job_posting
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def get_keywords(self):
+        try:
+            return json.loads(self.keywords) if self.keywords else []
+        except json.JSONDecodeError:
+            return []
+
+    def _analyses(self):
+        try:
+            analyses = json.loads(self.analysis) if self.analysis else {}
+        except json.JSONDecodeError:
+            return {}
+        return analyses if isinstance(analyses, dict) else {}
+
+    def get_analysis(self, language, version, max_age):
+        """Stored analysis in `language`, or None if missing, from another prompt version or older than max_age seconds"""
+        entry = self._analyses().get(language)
+        if not isinstance(entry, dict) or entry.get('version') != version:
+            return None
+        if time.time() - entry.get('analyzed_at', 0) > max_age:
+            return None
+        return entry.get('result')
+
+    def set_analysis(self, language, analysis, version):
+        analyses = self._analyses()
+        analyses[language] = {'version': version, 'analyzed_at': time.time(), 'result': analysis}
+        self.analysis = json.dumps(analyses, ensure_ascii=False)
+
+    def __repr__(self):
+        return f'<JobPosting {self.id} {self.content_hash[:12]}>'
+
+class AnalysisJob(db.Model):
+    __tablename__ = 'analysis_jobs'
+
+    id = db.Column(db.String(36), primary_key=True)  # uuid4
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # None dla anonimowych zadań
+    owner_token = db.Column(db.String(64))  # sesja, która utworzyła anonimowe zadanie
+    job_type = db.Column(db.String(50), nullable=False)  # process_cv, apply_recruiter_feedback, ...
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    payload = db.Column(db.Text, nullable=False)  # JSON string
+    result = db.Column(db.Text)  # JSON string
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker_id = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # odświeżane przez workera w trakcie wykonywania
+    finished_at = db.Column(db.DateTime)
+
+    def get_payload_json(self):
+        try:
+            return json.loads(self.payload)
+        except (TypeError, json.JSONDecodeError):
+            return {}
+
+    def get_result_json(self):
+        try:
+            return json.loads(self.result) if self.result else None
+        except json.JSONDecodeError:
+            return None
+
+    def to_status_dict(self):
+        return {
+            'job_id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<AnalysisJob {self.job_type} {self.status}>'
+
+
+def upgrade_schema():
+    """
+    Add columns introduced after the first deployment to existing tables.
+
+    db.create_all() creates missing tables but never alters existing ones;
+    all added columns are nullable, so a plain ALTER TABLE is enough.
+    """
+    added_columns = {
+        'cv_uploads': {'job_posting_id': 'INTEGER REFERENCES job_postings (id)'},
+        'analysis_results': {'job_posting_id': 'INTEGER REFERENCES job_postings (id)'},
+        'analysis_jobs': {'owner_token': 'VARCHAR(64)', 'heartbeat_at': 'TIMESTAMP'},
+    }
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table, columns in added_columns.items():
+            existing = {column['name'] for column in inspector.get_columns(table)}
+            for column, definition in columns.items():
+                if column not in existing:
+                    conn.execute(db.text(f'ALTER TABLE {table} ADD COLUMN {column} {definition}'))
+
+
+def init_schema(attempts=3):
+    """
+    Create missing tables and columns; run by every process at startup.
+
+    gunicorn workers import the app at the same time, so a DDL statement
+    that loses the race to another worker is retried once that one is done.
+    """
+    for attempt in range(attempts):
+        try:
+            db.create_all()
+            upgrade_schema()
+            return
+        except SQLAlchemyError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.5 * (attempt + 1))
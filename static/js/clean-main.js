@@ -122,7 +122,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 job_description: jobDescription,
                 job_url: jobUrl,
                 selected_option: optionValue,
-                language: language
+                language: language,
+                stream: true
             };
 
             // Pokaż wskaźnik ładowania
@@ -142,7 +143,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 },
                 body: JSON.stringify(requestData)
             })
-            .then(response => response.json())
+            .then(response => readProcessResponse(response, function(partialText) {
+                // Pokazuj tekst na bieżąco, zanim model skończy odpowiedź
+                if (resultContainer) {
+                    resultContainer.textContent = partialText;
+                }
+            }))
             .then(data => {
                 if (data.success) {
                     // Pokaż wyniki
@@ -415,4 +421,50 @@ document.addEventListener('DOMContentLoaded', function() {
             return false;
         }
     }
+
+    // Odczytuje odpowiedź /process-cv - strumień SSE albo zwykły JSON (np. błędy)
+    async function readProcessResponse(response, onPartialText) {
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!contentType.includes('text/event-stream')) {
+            return response.json();
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let partialText = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let eventData = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) eventData += line.slice(5).trim();
+                });
+                if (!eventData) continue;
+
+                const payload = JSON.parse(eventData);
+                if (eventName === 'token') {
+                    partialText += payload.text;
+                    onPartialText(partialText);
+                } else if (eventName === 'replace') {
+                    // Serwer poprawił odpowiedź - dotychczasowy tekst jest nieaktualny
+                    partialText = payload.text;
+                    onPartialText(partialText);
+                } else if (eventName === 'done' || eventName === 'error') {
+                    return payload;
+                }
+            }
+        }
+        return { success: false, message: 'Połączenie zostało przerwane' };
+    }
 });
\ No newline at end of file
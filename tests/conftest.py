@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Testy nie mogą pisać do współdzielonych plików cache ani wymagać Redisa
+os.environ.setdefault('LLM_CACHE_BACKEND', 'memory')
+os.environ.setdefault('JOB_CACHE_BACKEND', 'memory')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
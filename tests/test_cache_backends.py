@@ -0,0 +1,74 @@
+import pytest
+
+import utils.cache_backends as cache_backends
+from utils.cache_backends import MemoryLRUBackend, SQLiteBackend, create_backend
+from utils.llm_cache import LLMCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache_backends.time, 'time', fake.time)
+    return fake
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryLRUBackend(max_entries=3)
+    return SQLiteBackend(str(tmp_path / 'cache.db'), table='test_cache', max_entries=3, evict_every=1)
+
+
+def test_least_recently_used_entry_is_evicted(backend, clock):
+    for key in ('a', 'b', 'c'):
+        backend.set(key, key.upper(), 60)
+        clock.now += 1
+    # Odczyt odświeża wpis - najdawniej używany jest teraz 'b'
+    assert backend.get('a') == 'A'
+    clock.now += 1
+    backend.set('d', 'D', 60)
+
+    assert backend.get('b') is None
+    assert [backend.get(key) for key in ('a', 'c', 'd')] == ['A', 'C', 'D']
+    assert backend.size() == 3
+
+
+def test_entry_expires_after_ttl(backend, clock):
+    backend.set('short', 'value', 10)
+    backend.set('long', 'value', 100)
+    clock.now += 11
+
+    assert backend.get('short') is None
+    assert backend.get('long') == 'value'
+
+
+def test_unavailable_backend_falls_back_to_memory(monkeypatch):
+    def broken(*args, **kwargs):
+        raise OSError('read-only file system')
+
+    monkeypatch.setattr(cache_backends, 'SQLiteBackend', broken)
+    assert isinstance(create_backend('sqlite', 'llm_cache', 10), MemoryLRUBackend)
+    assert create_backend('none', 'llm_cache', 10) is None
+
+
+def test_llm_cache_uses_task_ttl_and_counts_hits(clock):
+    cache = LLMCache(MemoryLRUBackend(max_entries=10))
+    key = LLMCache.make_key('model', 'system', 'prompt', 1000, 0.3, 'pl')
+    assert key != LLMCache.make_key('model', 'system', 'prompt', 1000, 0.3, 'en')
+
+    assert cache.get(key) is None
+    cache.set(key, '{"score": 80}', 'cv_score')
+    assert cache.get(key) == '{"score": 80}'
+    clock.now += 24 * 3600 + 1
+    assert cache.get(key) is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['writes']) == (1, 2, 1)
@@ -0,0 +1,59 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import utils.job_batch as job_batch
+from utils.job_batch import prepare_urls
+from utils.job_page_cache import DomainBusy
+
+
+def test_distinct_indeed_offers_are_not_duplicates():
+    urls = [
+        'https://pl.indeed.com/jobs?q=python&vjk=1a2b3c4d5e6f7a8b',
+        'https://pl.indeed.com/jobs?q=python&vjk=9f8e7d6c5b4a3f2e',
+    ]
+    unique, invalid, duplicates = prepare_urls(urls)
+    assert unique == urls
+    assert invalid == []
+    assert duplicates == []
+
+
+def test_duplicates_are_reported_with_the_kept_url():
+    kept = 'https://www.linkedin.com/jobs/view/3812345678/'
+    urls = [
+        kept,
+        'https://pl.linkedin.com/jobs/search/?currentJobId=3812345678&trk=abc',
+        kept,
+        'not a url',
+    ]
+    unique, invalid, duplicates = prepare_urls(urls)
+    assert unique == [kept]
+    assert invalid == ['not a url']
+    assert duplicates == [(urls[1], kept), (kept, kept)]
+
+
+def test_closing_the_batch_cancels_pending_fetches(monkeypatch):
+    fetched = []
+    release = threading.Event()
+
+    def ingest(url, background=False):
+        fetched.append(url)
+        if url.endswith('/busy'):
+            raise DomainBusy(url, 0.2)
+        if not url.endswith('/0'):
+            release.wait(1)
+        return {'url': url, 'success': True}
+
+    monkeypatch.setattr(job_batch, 'ingest_job_url', ingest)
+    monkeypatch.setattr(job_batch, 'job_batch_executor', ThreadPoolExecutor(max_workers=1))
+    urls = ['https://example.com/busy'] + [f'https://example.com/{i}' for i in range(5)]
+
+    results = job_batch.ingest_job_urls(urls)
+    first = next(results)
+    results.close()
+    release.set()
+    time.sleep(0.4)
+
+    assert first['success']
+    # Po zamknięciu nie ruszyło żadne nowe pobranie ani ponowienie po DomainBusy
+    assert fetched == ['https://example.com/busy', 'https://example.com/0', 'https://example.com/1']
@@ -0,0 +1,156 @@
+import pytest
+import requests
+
+import utils.job_page_cache as job_page_cache_module
+from utils.cache_backends import MemoryLRUBackend
+from utils.job_page_cache import JobPageCache, JobPageFetchError, canonicalize_url
+
+
+def test_indeed_offers_differing_in_vjk_stay_distinct():
+    first = canonicalize_url('https://pl.indeed.com/jobs?q=python&l=Warszawa&vjk=1a2b3c4d5e6f7a8b')
+    second = canonicalize_url('https://pl.indeed.com/jobs?q=python&l=Warszawa&vjk=9f8e7d6c5b4a3f2e')
+    assert first != second
+    assert 'vjk=1a2b3c4d5e6f7a8b' in first
+
+
+def test_indeed_keeps_jk_and_drops_tracking():
+    url = 'https://www.indeed.com/viewjob?jk=0123456789abcdef&from=serp&tk=1h2j3k&utm_source=x'
+    assert canonicalize_url(url) == 'https://indeed.com/viewjob?jk=0123456789abcdef'
+
+
+def test_pracuj_offer_id_is_kept():
+    first = canonicalize_url('https://www.pracuj.pl/praca/python-developer-warszawa,oferta,1003456789?s=abc&searchId=1')
+    second = canonicalize_url('https://pracuj.pl/praca/python-developer-warszawa,oferta,1003456789')
+    assert first == second
+    assert canonicalize_url('https://pracuj.pl/aplikuj?oferta=100345&ref=mail') == 'https://pracuj.pl/aplikuj?oferta=100345'
+
+
+def test_linkedin_search_link_maps_to_offer():
+    assert canonicalize_url('https://www.linkedin.com/jobs/search/?currentJobId=3812345678&trk=abc') == \
+        'https://linkedin.com/jobs/view/3812345678'
+    assert canonicalize_url('https://pl.linkedin.com/jobs/view/python-developer-at-firma-3812345678/') == \
+        'https://linkedin.com/jobs/view/3812345678'
+
+
+def test_unknown_domain_keeps_meaningful_params():
+    url = 'https://kariera.example.com/offer?id=42&lang=pl&utm_medium=mail&fbclid=abc'
+    assert canonicalize_url(url) == 'https://kariera.example.com/offer?id=42&lang=pl'
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def _cache():
+    return JobPageCache(MemoryLRUBackend(max_entries=10), MemoryLRUBackend(max_entries=10))
+
+
+def test_transient_error_serves_stored_page(monkeypatch):
+    cache = _cache()
+    url = 'https://justjoin.it/offers/firma-python-developer'
+    monkeypatch.setattr(job_page_cache_module, 'download_page',
+                        lambda *args, **kwargs: (FakeResponse(), '<html>oferta</html>'))
+    assert cache.fetch(url).status == 'fetched'
+
+    def failing(*args, **kwargs):
+        raise requests.exceptions.HTTPError('503 Server Error', response=FakeResponse(503))
+
+    monkeypatch.setattr(job_page_cache_module, 'download_page', failing)
+    monkeypatch.setattr(job_page_cache_module, 'domain_ttl', lambda url: 0)
+    page = cache.fetch(url)
+    assert page.status == 'stale'
+    assert page.html == '<html>oferta</html>'
+    # W oknie NEGATIVE_TTL portal nie jest odpytywany ponownie
+    assert cache.fetch(url).status == 'stale'
+
+
+def test_gone_offer_replaces_stored_page(monkeypatch):
+    cache = _cache()
+    url = 'https://justjoin.it/offers/firma-python-developer'
+    monkeypatch.setattr(job_page_cache_module, 'download_page',
+                        lambda *args, **kwargs: (FakeResponse(), '<html>oferta</html>'))
+    cache.fetch(url)
+
+    def gone(*args, **kwargs):
+        raise requests.exceptions.HTTPError('410 Gone', response=FakeResponse(410))
+
+    monkeypatch.setattr(job_page_cache_module, 'download_page', gone)
+    monkeypatch.setattr(job_page_cache_module, 'domain_ttl', lambda url: 0)
+    with pytest.raises(JobPageFetchError):
+        cache.fetch(url)
+    with pytest.raises(JobPageFetchError):
+        cache.fetch(url)
+
+
+def test_timeout_without_stored_page_is_not_cached(monkeypatch):
+    cache = _cache()
+    url = 'https://justjoin.it/offers/firma-python-developer'
+
+    def timeout(*args, **kwargs):
+        raise requests.exceptions.ConnectTimeout('connect timed out')
+
+    monkeypatch.setattr(job_page_cache_module, 'download_page', timeout)
+    with pytest.raises(JobPageFetchError) as error:
+        cache.fetch(url)
+    assert isinstance(error.value.__cause__, requests.exceptions.Timeout)
+
+    # Portal znów odpowiada - kolejna próba nie trafia w cache porażek
+    monkeypatch.setattr(job_page_cache_module, 'download_page',
+                        lambda *args, **kwargs: (FakeResponse(), '<html>oferta</html>'))
+    assert cache.fetch(url).status == 'fetched'
+    assert cache.counters['negative'] == 0
+
+
+def test_missing_offer_is_cached(monkeypatch):
+    cache = _cache()
+    url = 'https://justjoin.it/offers/firma-python-developer'
+    calls = []
+
+    def missing(*args, **kwargs):
+        calls.append(1)
+        raise requests.exceptions.HTTPError('404 Not Found', response=FakeResponse(404))
+
+    monkeypatch.setattr(job_page_cache_module, 'download_page', missing)
+    for _ in range(2):
+        with pytest.raises(JobPageFetchError):
+            cache.fetch(url)
+    assert len(calls) == 1
+    assert cache.counters['negative'] == 1
+
+
+def _streamed_response(body, encoding):
+    import io
+    import urllib3
+
+    response = requests.Response()
+    response.status_code = 200
+    response.url = 'https://kariera.example.com/offer/1'
+    response.headers = requests.structures.CaseInsensitiveDict({'Content-Encoding': encoding, 'Content-Type': 'text/html'})
+    response.raw = urllib3.HTTPResponse(io.BytesIO(body), headers=dict(response.headers), preload_content=False)
+    return response
+
+
+def test_gzip_bomb_is_cut_at_the_size_cap():
+    import gzip
+    import time
+
+    bomb = gzip.compress(b'<p>' + b'A' * (64 * 1024 * 1024), 9)  # ~64 KB skompresowane, 64 MB po rozpakowaniu
+    chunks = list(job_page_cache_module._iter_decoded(_streamed_response(bomb, 'gzip'), 100_000))
+    assert sum(len(chunk) for chunk in chunks) == 100_000
+    assert max(len(chunk) for chunk in chunks) <= job_page_cache_module.CHUNK_SIZE
+
+    _, html = job_page_cache_module._read_page(
+        'https://kariera.example.com/offer/1', _streamed_response(bomb, 'gzip'), time.monotonic(), 100_000, 10
+    )
+    assert len(html) == 100_000
+
+
+def test_raw_deflate_body_is_decoded():
+    import zlib
+
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    body = compressor.compress(b'<h1>Python Developer</h1>') + compressor.flush()
+    chunks = job_page_cache_module._iter_decoded(_streamed_response(body, 'deflate'), 1000)
+    assert b''.join(chunks) == b'<h1>Python Developer</h1>'
@@ -0,0 +1,74 @@
+import pytest
+from flask import Flask
+
+import utils.job_postings as job_postings
+from models import db
+from utils.job_postings import analyze_job_posting_cached, cached_job_posting_analysis
+
+OFFER = 'Python Developer w Warszawie. Wymagania: Django, PostgreSQL, Docker. Oferujemy pracę zdalną.'
+
+
+@pytest.fixture(autouse=True)
+def database():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield
+        db.session.remove()
+
+
+def counting(result):
+    calls = []
+
+    def analyze(description, language):
+        calls.append(language)
+        return result
+    return analyze, calls
+
+
+def test_valid_analysis_is_reused():
+    analyze, calls = counting({'job_title': 'Python Developer'})
+    assert analyze_job_posting_cached(OFFER, 'pl', analyze)[0] == {'job_title': 'Python Developer'}
+    assert analyze_job_posting_cached(OFFER, 'pl', analyze)[0] == {'job_title': 'Python Developer'}
+    assert calls == ['pl']
+    assert cached_job_posting_analysis(OFFER, 'pl') == {'job_title': 'Python Developer'}
+
+
+def test_unparsed_fallback_is_returned_but_not_stored():
+    analyze, calls = counting({'analysis': 'Stanowisko: Python Dev'})
+    assert analyze_job_posting_cached(OFFER, 'pl', analyze)[0] == {'analysis': 'Stanowisko: Python Dev'}
+    analyze_job_posting_cached(OFFER, 'pl', analyze)
+    assert calls == ['pl', 'pl']
+    assert cached_job_posting_analysis(OFFER, 'pl') is None
+
+
+def test_prompt_version_change_invalidates_stored_analysis(monkeypatch):
+    analyze, calls = counting({'job_title': 'Python Developer'})
+    analyze_job_posting_cached(OFFER, 'pl', analyze)
+    monkeypatch.setattr(job_postings, 'JOB_ANALYSIS_VERSION', job_postings.JOB_ANALYSIS_VERSION + 1)
+    assert cached_job_posting_analysis(OFFER, 'pl') is None
+    analyze_job_posting_cached(OFFER, 'pl', analyze)
+    assert calls == ['pl', 'pl']
+
+
+def test_expired_analysis_is_not_served(monkeypatch):
+    analyze, calls = counting({'job_title': 'Python Developer'})
+    analyze_job_posting_cached(OFFER, 'pl', analyze)
+    monkeypatch.setattr(job_postings, 'ANALYSIS_TTL', -1)
+    analyze_job_posting_cached(OFFER, 'pl', analyze)
+    assert calls == ['pl', 'pl']
+
+
+def test_failed_analysis_creates_no_posting():
+    from models import JobPosting
+
+    def failing(description, language):
+        raise RuntimeError('upstream error')
+
+    with pytest.raises(RuntimeError):
+        analyze_job_posting_cached(OFFER, 'pl', failing)
+    analyze, _ = counting({'analysis': 'nieczytelna odpowiedź'})
+    assert analyze_job_posting_cached(OFFER, 'pl', analyze)[1] is None
+    assert JobPosting.query.count() == 0
@@ -0,0 +1,116 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+from flask import Flask
+
+from models import db, AnalysisJob
+from utils.job_queue import JobQueue
+
+
+@pytest.fixture
+def queue():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        job_queue = JobQueue()
+        job_queue.max_attempts = 2
+        job_queue.stale_after = 60
+        job_queue.handlers['echo'] = lambda payload: payload
+        yield job_queue
+        db.session.remove()
+
+
+def running_job(job_queue, heartbeat_age, started_age=3600, attempts=1):
+    job = job_queue.enqueue('echo', {})
+    job.status = 'running'
+    job.worker_id = 'dead-worker'
+    job.attempts = attempts
+    job.started_at = datetime.utcnow() - timedelta(seconds=started_age)
+    job.heartbeat_at = datetime.utcnow() - timedelta(seconds=heartbeat_age) if heartbeat_age is not None else None
+    db.session.commit()
+    return job.id
+
+
+def test_long_running_job_with_fresh_heartbeat_is_not_requeued(queue):
+    alive = running_job(queue, heartbeat_age=5)
+    dead = running_job(queue, heartbeat_age=120)
+    legacy = running_job(queue, heartbeat_age=None)
+
+    assert queue.requeue_stale() == 2
+    assert db.session.get(AnalysisJob, alive).status == 'running'
+    assert db.session.get(AnalysisJob, dead).status == 'queued'
+    assert db.session.get(AnalysisJob, legacy).status == 'queued'
+
+
+def test_stale_job_fails_after_max_attempts(queue):
+    job_id = running_job(queue, heartbeat_age=120, attempts=2)
+
+    assert queue.requeue_stale() == 0
+    job = db.session.get(AnalysisJob, job_id)
+    assert job.status == 'failed'
+    assert job.error
+
+
+def test_worker_refreshes_heartbeat_while_running(queue):
+    queue.heartbeat_interval = 0.05
+
+    def slow(payload):
+        time.sleep(0.3)
+        return {'ok': True}
+
+    queue.handlers['slow'] = slow
+    job_id = queue.enqueue('slow', {}).id
+    job = queue.claim_next('worker-1')
+    claimed_heartbeat = job.heartbeat_at
+    queue.run(job)
+
+    job = db.session.get(AnalysisJob, job_id)
+    assert job.status == 'done'
+    assert job.heartbeat_at > claimed_heartbeat
+
+
+def failing_job(queue, error):
+    def fail(payload):
+        try:
+            raise error
+        except Exception as e:
+            # Tak jak send_api_request - pierwotny wyjątek tylko w __context__
+            raise Exception(f"Failed to communicate with OpenRouter API: {e}")
+
+    queue.handlers['fail'] = fail
+    job_id = queue.enqueue('fail', {}).id
+    queue.run(queue.claim_next('worker-1'))
+    return db.session.get(AnalysisJob, job_id)
+
+
+def test_transient_error_requeues_job_without_finishing_it(queue):
+    job = failing_job(queue, requests.exceptions.ReadTimeout('read timed out'))
+
+    assert job.status == 'queued'
+    assert job.finished_at is None
+
+    queue.run(queue.claim_next('worker-1'))
+    job = db.session.get(AnalysisJob, job.id)
+    assert job.status == 'failed'
+    assert job.attempts == 2
+    assert job.finished_at is not None
+
+
+def test_server_error_is_retried(queue):
+    response = requests.Response()
+    response.status_code = 502
+    job = failing_job(queue, requests.exceptions.HTTPError('bad gateway', response=response))
+
+    assert job.status == 'queued'
+
+
+def test_parse_error_fails_job_at_once(queue):
+    job = failing_job(queue, ValueError('Unexpected API response format'))
+
+    assert job.status == 'failed'
+    assert job.attempts == 1
+    assert job.finished_at is not None
@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+from utils import job_sites
+from utils.job_sites import extract_posting
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'job_pages')
+
+# Zapisane (przycięte) strony ofert: adapter, URL, tytuł, firma, fragmenty opisu (i wymagań)
+CASES = [
+    (
+        'pracuj', 'https://www.pracuj.pl/praca/python-developer-warszawa,oferta,1003456789',
+        'Python Developer', 'Acme Software Sp. z o.o.',
+        ['usług backendowych w Pythonie', 'Pakiet medyczny'],
+        ['Minimum 3 lata doświadczenia', 'PostgreSQL i Dockera'],
+    ),
+    (
+        'nofluffjobs', 'https://nofluffjobs.com/pl/job/senior-data-engineer-dataflow-analytics-warszawa',
+        'Senior Data Engineer', 'DataFlow Analytics',
+        ['potoki przetwarzające miliardy zdarzeń', 'Tworzenie potoków ETL w Airflow'],
+        ['Apache Spark', 'Terraform'],
+    ),
+    (
+        'justjoin', 'https://justjoin.it/job-offer/pixel-forge-frontend-developer-react-krakow',
+        'Frontend Developer (React)', 'Pixel Forge',
+        ['aplikację do zarządzania projektami graficznymi', 'Testy jednostkowe i E2E'],
+        [],
+    ),
+    (
+        'indeed', 'https://pl.indeed.com/viewjob?jk=0123456789abcdef',
+        'Customer Support Specialist with German', 'Nordic Services Poland',
+        ['in German and English', 'German at C1 level'],
+        [],
+    ),
+    (
+        'linkedin', 'https://www.linkedin.com/jobs/view/devops-engineer-at-acme-bank-3812345678',
+        'DevOps Engineer', 'Acme Bank',
+        ['Kubernetes platform that runs our online banking', 'Terraform on Azure'],
+        [],
+    ),
+    (
+        'olx', 'https://www.olx.pl/d/oferta/magazynier-operator-wozka-widlowego-CID4-IDabc123.html',
+        'Magazynier / operator wózka widłowego', 'LogiTrans Poznań Sp. z o.o.',
+        ['uprawnieniami UDT na wózki widłowe', 'kompletacja zamówień ze skanerem'],
+        [],
+    ),
+    (
+        'praca', 'https://www.praca.pl/ksiegowa-ksiegowy_5123456.html',
+        'Księgowa / Księgowy', 'Biuro Rachunkowe Bilans s.c.',
+        ['Sporządzanie deklaracji VAT i JPK', 'Znajomość programu Symfonia'],
+        [],
+    ),
+]
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES, f'{name}.html'), encoding='utf-8') as file:
+        return file.read()
+
+
+@pytest.mark.parametrize('adapter, url, title, company, description, requirements', CASES, ids=[case[0] for case in CASES])
+def test_adapter_extracts_saved_page(adapter, url, title, company, description, requirements):
+    posting = extract_posting(_fixture(adapter), url)
+
+    assert posting.source == adapter
+    assert posting.title == title
+    assert posting.company == company
+    for fragment in description:
+        assert fragment in posting.description
+    for fragment in requirements:
+        assert fragment in posting.requirements
+    # Nawigacja i stopka strony nie trafiają do opisu
+    assert 'Regulamin' not in posting.description
+    assert 'Terms' not in posting.description
+
+
+def test_json_ld_is_preferred_over_selectors():
+    html = _fixture('linkedin').replace('</head>', '''
+<script type="application/ld+json">
+{"@context": "https://schema.org", "@type": "JobPosting", "title": "DevOps Engineer (JSON-LD)",
+ "hiringOrganization": {"@type": "Organization", "name": "Acme Bank S.A."},
+ "description": "<p>Platform team building Kubernetes for online banking.</p>"}
+</script>
+</head>''')
+    posting = extract_posting(html, 'https://www.linkedin.com/jobs/view/3812345678')
+
+    assert posting.source == 'linkedin:json-ld'
+    assert posting.title == 'DevOps Engineer (JSON-LD)'
+    assert posting.company == 'Acme Bank S.A.'
+    assert 'Kubernetes for online banking' in posting.description
+
+
+def test_auto_parser_never_benchmarks_html5lib(monkeypatch):
+    monkeypatch.setattr(job_sites, '_parser', None)
+    monkeypatch.setattr(job_sites, 'HTML_PARSER', 'auto')
+
+    assert job_sites.html_parser('<html><body><p>oferta</p></body></html>') in ('lxml', 'html.parser')
+    assert 'html5lib' not in job_sites.benchmark_parsers('<p></p>', rounds=1)
@@ -0,0 +1,73 @@
+from utils.job_summarizer import extract_keywords, summarize
+
+POSTING = """
+Senior Python Developer w zespole płatności online. Budujemy system rozliczeń dla sklepów internetowych.
+
+O nas:
+Jesteśmy firmą technologiczną działającą od 2005 roku na rynku polskim i niemieckim.
+Nasze biura znajdują się w Warszawie, Krakowie i Berlinie, a zespół liczy ponad 300 osób.
+
+Zakres obowiązków:
+- Projektowanie i rozwój mikroserwisów w Python z użyciem Django oraz FastAPI.
+- Utrzymanie kolejek zadań opartych o Celery i RabbitMQ w środowisku produkcyjnym.
+- Optymalizacja zapytań do bazy PostgreSQL obsługującej miliony transakcji dziennie.
+- Code review i mentoring młodszych programistów w zespole płatności.
+
+Wymagania:
+- Minimum 5 lat komercyjnego doświadczenia w programowaniu w Python.
+- Bardzo dobra znajomość Django, PostgreSQL i Docker w środowisku produkcyjnym.
+- Doświadczenie z Kubernetes oraz AWS przy wdrażaniu mikroserwisów.
+- Znajomość języka angielskiego na poziomie B2 pozwalająca na swobodną komunikację.
+
+Oferujemy:
+- Umowę B2B lub umowę o pracę z wynagrodzeniem 20000-28000 PLN netto.
+- Prywatną opiekę medyczną i kartę sportową dla całej rodziny.
+
+Klauzula:
+Wyrażam zgodę na przetwarzanie moich danych osobowych dla potrzeb niezbędnych do realizacji procesu rekrutacji.
+"""
+
+
+def body(summary):
+    """Selected sentences, without section headers and the keyword line"""
+    return [
+        line[2:] if line.startswith('- ') else line
+        for line in summary.split('\n')
+        if line and not line.endswith(':') and not line.startswith('KLUCZOWE SŁOWA:')
+    ]
+
+
+def test_summary_respects_length_cap():
+    for max_chars in (200, 400, 800):
+        sentences = body(summarize(POSTING, max_chars=max_chars))
+        assert sentences
+        assert sum(len(sentence) + 1 for sentence in sentences) <= max_chars
+
+
+def test_requirements_are_preferred_over_boilerplate():
+    summary = summarize(POSTING, max_chars=400)
+
+    assert 'Wymagania:' in summary
+    assert 'przetwarzanie moich danych osobowych' not in summary
+
+
+def test_sentences_keep_original_order_under_headers():
+    summary = summarize(POSTING)
+    lines = summary.split('\n')
+
+    assert lines.index('Zakres obowiązków:') < lines.index('Wymagania:') < lines.index('Oferujemy:')
+    assert all(line in POSTING for line in body(summary))
+
+
+def test_keyword_line_lists_top_terms():
+    summary = summarize(POSTING, keyword_count=5)
+    keyword_line = summary.split('\n')[-1]
+
+    assert keyword_line.startswith('KLUCZOWE SŁOWA: ')
+    keywords = keyword_line[len('KLUCZOWE SŁOWA: '):].split(', ')
+    assert keywords == extract_keywords(POSTING, count=5)
+    assert 'python' in keywords
+
+
+def test_text_without_sentences_is_cut_to_cap():
+    assert summarize('Python, SQL', max_chars=5) == 'Pytho'
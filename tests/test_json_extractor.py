@@ -0,0 +1,50 @@
+from utils.json_extractor import JSONExtractor, extract_json, validate
+
+
+def test_think_block_and_prose_are_skipped():
+    text = '<think>Rozważam {"draft": true}</think>Oto wynik: {"score": 85, "summary": "Dobre CV"}'
+    assert extract_json(text) == {'score': 85, 'summary': 'Dobre CV'}
+
+
+def test_code_fence():
+    text = 'Wynik:\n```json\n{"optimized_cv": "CV",\n "changes": ["a", "b"]}\n```\nKoniec.'
+    assert extract_json(text, 'optimize') == {'optimized_cv': 'CV', 'changes': ['a', 'b']}
+
+
+def test_trailing_commas():
+    assert extract_json('{"a": [1, 2, 3,], "b": {"c": 1,},}') == {'a': [1, 2, 3], 'b': {'c': 1}}
+
+
+def test_python_literals_and_invalid_escapes():
+    assert extract_json('{"ok": True, "missing": None, "off": False, "path": "C:\\_dane"}') == \
+        {'ok': True, 'missing': None, 'off': False, 'path': 'C:_dane'}
+
+
+def test_missing_closing_bracket_is_repaired():
+    assert extract_json('{"a": {"b": [1, 2}, "c": 3}') == {'a': {'b': [1, 2]}, 'c': 3}
+    assert extract_json('{"items": [{"x": 1], "n": 2}') == {'items': [{'x': 1}], 'n': 2}
+
+
+def test_partial_output_of_a_truncated_answer():
+    text = '{"optimized_cv": "Jan Kowalski\\nPython Developer", "changes": ["Dodano sekcję", "Skróc'
+    assert extract_json(text) is None
+    assert extract_json(text, allow_partial=True) == {
+        'optimized_cv': 'Jan Kowalski\nPython Developer',
+        'changes': ['Dodano sekcję', 'Skróc']
+    }
+
+
+def test_incremental_feed_reports_completion():
+    extractor = JSONExtractor()
+    assert not extractor.feed('{"score": 7')
+    # Liczba może jeszcze rosnąć ("70") - częściowy wynik jej nie zawiera
+    assert extractor.partial() == {}
+    assert not extractor.feed('0, "note": "Do')
+    assert extractor.partial() == {'score': 70, 'note': 'Do'}
+    assert extractor.feed('bre"}')
+    assert extractor.result() == {'score': 70, 'note': 'Dobre'}
+
+
+def test_schema_mismatch_returns_none():
+    assert extract_json('{"cv": "x"}', 'optimize') is None
+    assert validate({'optimized_cv': 1}, 'optimize') == ["field 'optimized_cv' has wrong type"]
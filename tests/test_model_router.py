@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from utils.model_router import ModelRouter, class_fallbacks
+
+
+def router(**kwargs):
+    options = dict(model_fallbacks={'primary': ['backup']}, hedge_min_delay=0.1, hedge_default_delay=0.1)
+    options.update(kwargs)
+    return ModelRouter(**options)
+
+
+def test_fallbacks_stay_within_the_model_class():
+    fallbacks = class_fallbacks(
+        {'light': 'small-model', 'heavy': 'big-model'},
+        {'light': ['small-backup'], 'heavy': ['big-backup']}
+    )
+    model_router = ModelRouter(fallback_models=['generic-backup'], model_fallbacks=fallbacks)
+    assert model_router.candidates('small-model') == ['small-model', 'small-backup']
+    assert model_router.candidates('big-model') == ['big-model', 'big-backup']
+    assert model_router.candidates('custom/model') == ['custom/model', 'generic-backup']
+
+
+def test_slow_primary_is_hedged_after_its_delay():
+    model_router = router()
+    calls = []
+
+    def fn(model):
+        calls.append((model, time.monotonic()))
+        if model == 'primary':
+            time.sleep(1.0)
+        return model
+
+    started = time.monotonic()
+    with model_router.hedging():
+        assert model_router.call('primary', fn) == 'backup'
+    hedge_started = dict(calls)['backup'] - started
+    assert 0.1 <= hedge_started < 0.5
+    assert model_router.stats()['hedges'] == 1
+    assert model_router.stats()['hedge_wins'] == 1
+
+
+def test_fast_primary_is_not_hedged():
+    model_router = router()
+    calls = []
+
+    with model_router.hedging():
+        assert model_router.call('primary', lambda model: calls.append(model) or model) == 'primary'
+    time.sleep(0.2)
+    assert calls == ['primary']
+
+
+def test_hedging_only_inside_hedging_block():
+    model_router = router()
+    calls = []
+
+    def fn(model):
+        calls.append(model)
+        time.sleep(0.3)
+        return model
+
+    assert model_router.call('primary', fn) == 'primary'
+    assert calls == ['primary']
+
+
+def test_failover_to_next_model():
+    model_router = router()
+
+    def fn(model):
+        if model == 'primary':
+            raise ConnectionError('upstream down')
+        return model
+
+    assert model_router.call('primary', fn) == 'backup'
+    assert model_router.stats()['failovers'] == 1
+
+
+def test_every_model_failing_raises_the_last_error():
+    model_router = router()
+
+    def fn(model):
+        raise ConnectionError(model)
+
+    with pytest.raises(ConnectionError, match='backup'):
+        model_router.call('primary', fn)
+
+
+def test_unhealthy_model_is_skipped_until_cooldown_ends():
+    model_router = router(failure_threshold=1, cooldown=0.3)
+    calls = []
+    lock = threading.Lock()
+
+    def fn(model):
+        with lock:
+            calls.append(model)
+        if model == 'primary' and len(calls) == 1:
+            raise ConnectionError('upstream down')
+        return model
+
+    assert model_router.call('primary', fn) == 'backup'
+    assert not model_router.is_healthy('primary')
+    assert model_router.call('primary', fn) == 'backup'
+    assert calls == ['primary', 'backup', 'backup']
+
+    time.sleep(0.35)
+    assert model_router.call('primary', fn) == 'primary'
@@ -0,0 +1,146 @@
+import pytest
+import requests
+
+import utils.openrouter_client as client_module
+from utils.openrouter_client import CircuitOpenError, OpenRouterClient
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}", response=self)
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.timeouts = []
+
+    def post(self, url, headers=None, json=None, timeout=None, stream=False):
+        self.timeouts.append(timeout)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(client_module.time, 'monotonic', fake.monotonic)
+    monkeypatch.setattr(client_module.time, 'sleep', fake.sleep)
+    return fake
+
+
+def make_client(outcomes, **settings):
+    client = OpenRouterClient(base_url='http://openrouter.test')
+    client.connect_timeout = 5
+    client.read_timeout = 90
+    client.total_timeout = 150
+    client.max_retries = 3
+    client.backoff_base = 1
+    client.backoff_max = 20
+    client.breaker_threshold = 2
+    for name, value in settings.items():
+        setattr(client, name, value)
+    session = FakeSession(outcomes)
+    client._get_session = lambda: session
+    return client, session
+
+
+def test_read_timeout_is_clamped_to_remaining_deadline(clock):
+    client, session = make_client([
+        requests.exceptions.ReadTimeout('slow'),
+        requests.exceptions.ReadTimeout('slow'),
+        FakeResponse(200),
+    ], backoff_base=0, breaker_threshold=5)
+    original = session.post
+
+    def timed_post(url, timeout=None, **kwargs):
+        try:
+            return original(url, timeout=timeout, **kwargs)
+        finally:
+            clock.now += 60
+
+    session.post = timed_post
+
+    client.post({'model': 'm'}, {})
+    assert session.timeouts == [(5, 90), (5, 90), (5, 30)]
+
+
+def test_deadline_spent_raises_timeout_without_another_attempt(clock):
+    client, session = make_client([requests.exceptions.ReadTimeout('slow')] * 4, backoff_base=0)
+    original = session.post
+
+    def timed_post(url, timeout=None, **kwargs):
+        clock.now += timeout[1]
+        return original(url, timeout=timeout, **kwargs)
+
+    session.post = timed_post
+
+    with pytest.raises(requests.exceptions.Timeout):
+        client.post({'model': 'm'}, {})
+    assert len(session.timeouts) == 2
+    assert clock.now <= 1000.0 + 150
+
+
+def test_rate_limit_honours_retry_after_and_keeps_circuit_closed(clock):
+    client, session = make_client([FakeResponse(429, {'Retry-After': '30'})] * 3 + [FakeResponse(200)])
+
+    response = client.post({'model': 'm'}, {})
+    assert response.status_code == 200
+    # Retry-After powyżej backoff_max jest respektowane
+    assert clock.sleeps == [30.0, 30.0, 30.0]
+    assert client.breaker_for('m').state == 'closed'
+
+
+def test_retry_after_beyond_deadline_gives_up_at_once(clock):
+    client, session = make_client([FakeResponse(429, {'Retry-After': '600'})])
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.post({'model': 'm'}, {})
+    assert clock.sleeps == []
+    assert client.breaker_for('m').failures == 0
+
+
+def test_server_errors_open_the_circuit(clock):
+    client, session = make_client([FakeResponse(503), FakeResponse(503)], max_retries=1)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.post({'model': 'm'}, {})
+    assert client.breaker_for('m').state == 'open'
+    with pytest.raises(CircuitOpenError):
+        client.post({'model': 'm'}, {})
+    # Inne modele mają własny bezpiecznik
+    assert client.breaker_for('other').allow_request()
+
+
+def test_rate_limited_probe_closes_the_circuit(clock):
+    client, session = make_client([FakeResponse(429, {'Retry-After': '1'}), FakeResponse(200)])
+    breaker = client.breaker_for('m')
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += client.breaker_reset
+
+    assert client.post({'model': 'm'}, {}).status_code == 200
+    assert breaker.state == 'closed'
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+import utils.openrouter_api as api
+from utils.llm_profiles import strip_think
+
+
+class FakeStream:
+    def __init__(self, chunks, finish_reason='stop'):
+        self.chunks = chunks
+        self.finish_reason = finish_reason
+
+    def iter_lines(self, decode_unicode=True):
+        for index, chunk in enumerate(self.chunks):
+            last = index == len(self.chunks) - 1
+            choice = {'delta': {'content': chunk}, 'finish_reason': self.finish_reason if last else None}
+            yield 'data: ' + json.dumps({'choices': [choice]})
+        yield 'data: [DONE]'
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    streams = []
+    answers = []
+    monkeypatch.setattr(api, 'OPENROUTER_API_KEY', 'test-key')
+    monkeypatch.setattr(api.openrouter_client, 'post', lambda payload, headers, stream=False: streams.pop(0))
+    monkeypatch.setattr(api.openrouter_client, 'post_json', lambda payload, headers: {
+        'choices': [{'message': {'content': answers.pop(0)}, 'finish_reason': 'stop'}]
+    })
+    return streams, answers
+
+
+def stream(prompt, task='optimize'):
+    tokens, replaced = [], []
+    with api.stream_tokens_to(tokens.append, replace=replaced.append):
+        content = api.send_api_request(prompt, task=task, use_cache=False)
+    return content, ''.join(tokens), replaced
+
+
+def test_reasoning_cut_off_by_max_tokens_stays_hidden_in_continuation(upstream):
+    streams, _ = upstream
+    streams.append(FakeStream(['<think>Najpierw ', 'przeanalizuję doświadczenie'], 'length'))
+    streams.append(FakeStream([' kandydata i dopasuję słowa kluczowe.</think>', '{"optimized_cv": "Nowe CV"}']))
+
+    content, streamed, _ = stream('prompt 1')
+    assert content == '{"optimized_cv": "Nowe CV"}'
+    assert streamed == content
+
+
+def test_repeated_overlap_is_not_streamed_twice(upstream):
+    streams, _ = upstream
+    streams.append(FakeStream(['{"optimized_cv": "Jan Kowalski, ', 'doświadczony programista Python'], 'length'))
+    streams.append(FakeStream(['doświadczony programista ', 'Python z 10-letnim stażem"}']))
+
+    content, streamed, _ = stream('prompt 2')
+    assert content == '{"optimized_cv": "Jan Kowalski, doświadczony programista Python z 10-letnim stażem"}'
+    assert streamed == strip_think(content)[0]
+
+
+def test_repaired_answer_replaces_streamed_text(upstream):
+    streams, answers = upstream
+    streams.append(FakeStream(['{"cv": "Nowe CV"}']))
+    answers.append('{"optimized_cv": "Nowe CV"}')
+
+    content, streamed, replaced = stream('prompt 3')
+    assert streamed == '{"cv": "Nowe CV"}'
+    assert content == '{"optimized_cv": "Nowe CV"}'
+    assert replaced == [content]
@@ -0,0 +1,162 @@
+import hashlib
+import io
+
+import pytest
+
+import utils.pdf_extraction as pdf_extraction
+from utils.cache_backends import MemoryLRUBackend
+from utils.pdf_extraction import (
+    HashingSpooledFile, PDFTextCache, extract_pdf, extract_pdf_cached, hashed_upload, is_pdf, text_quality
+)
+
+CONTENT = b'%PDF-1.4\n' + b'x' * 5000
+
+
+def test_upload_is_hashed_and_measured_while_written():
+    upload = HashingSpooledFile(max_size=1 << 20)
+    for start in range(0, len(CONTENT), 1000):
+        upload.write(CONTENT[start:start + 1000])
+
+    assert upload.sha256 == hashlib.sha256(CONTENT).hexdigest()
+    assert upload.size == len(CONTENT)
+    assert upload.head == CONTENT[:1024]
+    assert not upload.spooled
+    upload.close()
+
+
+def test_large_upload_rolls_over_to_disk():
+    upload = HashingSpooledFile(max_size=2048)
+    upload.write(CONTENT[:2000])
+    assert not upload.spooled
+    upload.write(CONTENT[2000:])
+
+    assert upload.spooled
+    upload.seek(0)
+    assert upload.read() == CONTENT
+    assert upload.sha256 == hashlib.sha256(CONTENT).hexdigest()
+    upload.close()
+
+
+def test_foreign_stream_is_copied_and_rewound():
+    with hashed_upload(io.BytesIO(CONTENT)) as upload:
+        assert isinstance(upload, HashingSpooledFile)
+        assert upload.read() == CONTENT
+        assert upload.sha256 == hashlib.sha256(CONTENT).hexdigest()
+
+    upload = HashingSpooledFile()
+    upload.write(CONTENT)
+    assert hashed_upload(upload) is upload
+    assert upload.tell() == 0
+    upload.close()
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    calls = []
+
+    def fake_extract(source):
+        calls.append(source)
+        text = source.decode('latin-1') if isinstance(source, bytes) else ''
+        return {'text': text, 'pages': 1, 'engine': 'pypdf2', 'quality': 1.0, 'timings': {'pypdf2': 0.01}}
+
+    monkeypatch.setattr(pdf_extraction, 'pdf_text_cache', PDFTextCache(MemoryLRUBackend(max_entries=10)))
+    monkeypatch.setattr(pdf_extraction, 'extract_pdf', fake_extract)
+    return calls
+
+
+def test_same_pdf_is_parsed_once(parsed):
+    first = extract_pdf_cached(CONTENT)
+    second = extract_pdf_cached(CONTENT)
+
+    assert len(parsed) == 1
+    assert (first['cached'], second['cached']) == (False, True)
+    assert second['text'] == first['text']
+    assert second['sha256'] == hashlib.sha256(CONTENT).hexdigest()
+    assert pdf_extraction.pdf_text_cache.stats()['hits'] == 1
+
+
+def test_upload_hash_is_used_as_cache_key(parsed):
+    extract_pdf_cached(CONTENT)
+    with hashed_upload(io.BytesIO(CONTENT)) as upload:
+        assert extract_pdf_cached(upload, sha256=upload.sha256)['cached']
+    assert len(parsed) == 1
+
+
+def test_empty_or_oversized_text_is_not_stored(parsed, monkeypatch):
+    monkeypatch.setattr(pdf_extraction, 'PDF_CACHE_MAX_TEXT_CHARS', 100)
+    for source in (b'   ', CONTENT):
+        extract_pdf_cached(source)
+        extract_pdf_cached(source)
+
+    assert len(parsed) == 4
+    assert pdf_extraction.pdf_text_cache.stats()['writes'] == 0
+
+
+GOOD_TEXT = ' '.join(['Doświadczony programista Python z wieloletnią praktyką'] * 10)
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    runs = []
+
+    def engine(name, pages):
+        def run(file):
+            runs.append(name)
+            if isinstance(pages, Exception):
+                raise pages
+            return pages
+        return run
+
+    def install(primary, fallback):
+        monkeypatch.setattr(pdf_extraction, 'ENGINES', {'pypdf2': engine('pypdf2', primary),
+                                                        'pdfminer': engine('pdfminer', fallback)})
+        monkeypatch.setattr(pdf_extraction, 'PDF_ENGINE', 'pypdf2')
+        monkeypatch.setattr(pdf_extraction, 'PDF_FALLBACK_ENGINE', 'pdfminer')
+        return runs
+    return install
+
+
+def test_pdf_magic_is_accepted_within_first_kilobyte():
+    assert is_pdf(b'%PDF-1.7\n')
+    assert is_pdf(b'\xef\xbb\xbf' + b' ' * 500 + b'%PDF-1.4')
+    assert not is_pdf(b' ' * 1100 + b'%PDF-1.4')
+    assert not is_pdf(b'PK\x03\x04word/document.xml')
+
+
+def test_text_quality_penalizes_garbled_and_glued_text():
+    assert text_quality(GOOD_TEXT, 1) == 1.0
+    assert text_quality('', 1) == 0.0
+    assert text_quality('(cid:12)(cid:40) ' * 40, 1) < 0.2
+    assert text_quality('Doświadczonyprogramista' * 30, 1) < 0.2
+
+
+def test_good_text_skips_fallback_engine(engines):
+    runs = engines([GOOD_TEXT], [GOOD_TEXT])
+    result = extract_pdf(CONTENT)
+
+    assert runs == ['pypdf2']
+    assert result['engine'] == 'pypdf2'
+    assert set(result['timings']) == {'pypdf2'}
+
+
+def test_low_quality_text_falls_back_to_layout_engine(engines):
+    runs = engines(['�� (cid:3) ' * 50], [GOOD_TEXT])
+    result = extract_pdf(CONTENT)
+
+    assert runs == ['pypdf2', 'pdfminer']
+    assert result['engine'] == 'pdfminer'
+    assert result['text'] == GOOD_TEXT
+
+
+def test_better_of_two_poor_results_is_kept(engines):
+    engines(['Python ' * 20], [ValueError('broken xref table')])
+    result = extract_pdf(CONTENT)
+
+    assert result['engine'] == 'pypdf2'
+    assert result['quality'] < pdf_extraction.PDF_QUALITY_THRESHOLD
+
+
+def test_all_engines_failing_raises(engines):
+    engines(ValueError('not a PDF'), ValueError('not a PDF'))
+    with pytest.raises(ValueError):
+        extract_pdf(CONTENT)
@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+
+import pytest
+
+from utils.rate_limiter import CostLimiter, MemoryCostStore, SQLiteCostStore
+
+
+def test_cost_limiter_forgets_idle_callers(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr('utils.rate_limiter.time.time', lambda: clock[0])
+    store = MemoryCostStore()
+    limiter = CostLimiter(per_caller=100, shared=1000, window=60, store=store)
+
+    for caller in range(50):
+        assert limiter.charge(f'10.0.0.{caller}', 10) == 0
+    assert limiter.stats()['callers'] == 50
+
+    clock[0] += 61
+    assert limiter.charge('10.0.1.1', 10) == 0
+    assert set(store.spent) == {'10.0.1.1', CostLimiter.SHARED_KEY}
+
+
+@pytest.mark.parametrize('store', ['memory', 'sqlite'])
+def test_cost_limiter_budgets(store, tmp_path):
+    store = MemoryCostStore() if store == 'memory' else SQLiteCostStore(os.path.join(tmp_path, 'costs.db'))
+    limiter = CostLimiter(per_caller=100, shared=150, window=60, store=store)
+    assert limiter.charge('a', 80) == 0
+    assert 0 < limiter.charge('a', 30) <= 61
+    assert limiter.charge('b', 60) == 0
+    assert limiter.charge('c', 20) > 0
+    # Odrzucone wywołanie nie zostawia wpisu
+    assert limiter.stats()['callers'] == 2
+    assert limiter.stats()['shared_used'] == 140
+
+
+def _charge_from_worker(path, results):
+    limiter = CostLimiter(per_caller=10_000, shared=100, window=60, store=SQLiteCostStore(path))
+    results.extend([limiter.charge(f'10.0.0.{os.getpid()}', 10) == 0 for _ in range(10)])
+
+
+def test_shared_budget_holds_across_processes(tmp_path):
+    path = os.path.join(tmp_path, 'costs.db')
+    SQLiteCostStore(path)
+    with multiprocessing.Manager() as manager:
+        results = manager.list()
+        workers = [multiprocessing.Process(target=_charge_from_worker, args=(path, results)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        allowed = sum(results)
+    # 4 workery po 10 prób po 10 tokenów - wspólny budżet 100 przepuszcza dokładnie 10 z nich
+    assert allowed == 10
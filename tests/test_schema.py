@@ -0,0 +1,46 @@
+import sqlite3
+
+from flask import Flask
+
+from models import db, CVUpload, AnalysisResult, AnalysisJob, init_schema
+
+# Tabele w postaci sprzed JobPosting i kolejki zadań (pierwsze wdrożenie)
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, email VARCHAR(120) NOT NULL UNIQUE,
+    password_hash VARCHAR(255) NOT NULL, first_name VARCHAR(50), last_name VARCHAR(50),
+    created_at DATETIME, last_login DATETIME, is_active BOOLEAN, premium_until DATETIME,
+    stripe_customer_id VARCHAR(100), stripe_session_id VARCHAR(200)
+);
+CREATE TABLE cv_uploads (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id), filename VARCHAR(255) NOT NULL,
+    original_text TEXT NOT NULL, job_title VARCHAR(200), job_description TEXT, uploaded_at DATETIME
+);
+CREATE TABLE analysis_results (
+    id INTEGER PRIMARY KEY, cv_upload_id INTEGER NOT NULL REFERENCES cv_uploads (id),
+    analysis_type VARCHAR(50) NOT NULL, result_data TEXT NOT NULL, created_at DATETIME
+);
+INSERT INTO users (id, username, email, password_hash) VALUES (1, 'jan', 'jan@example.com', 'x');
+INSERT INTO cv_uploads (id, user_id, filename, original_text, job_description) VALUES (1, 1, 'cv.pdf', 'CV', 'Opis');
+INSERT INTO analysis_results (id, cv_upload_id, analysis_type, result_data) VALUES (1, 1, 'optimize', '{"a": 1}');
+"""
+
+
+def test_init_schema_upgrades_a_baseline_database(tmp_path):
+    path = tmp_path / 'baseline.db'
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    with app.app_context():
+        init_schema()
+        init_schema()  # kolejny proces startujący na już zaktualizowanej bazie
+
+        upload = db.session.get(CVUpload, 1)
+        assert upload.job_description == 'Opis'
+        assert upload.job_posting_id is None
+        assert db.session.get(AnalysisResult, 1).get_result_json() == {'a': 1}
+        assert db.session.query(AnalysisJob).count() == 0
+        db.session.remove()
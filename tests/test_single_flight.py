@@ -0,0 +1,40 @@
+import os
+import threading
+import time
+
+from utils.single_flight import SingleFlight, SQLiteLockStore
+
+
+def test_leader_lease_is_renewed_during_a_slow_call(tmp_path):
+    path = os.path.join(tmp_path, 'inflight.db')
+    leader = SingleFlight(SQLiteLockStore(path), lock_ttl=0.3, poll_interval=0.05, max_wait=5)
+    # Drugi "proces" z własnym połączeniem do tej samej tabeli blokad
+    other = SingleFlight(SQLiteLockStore(path), lock_ttl=0.3, poll_interval=0.05, max_wait=5)
+    calls = []
+
+    def slow():
+        calls.append('leader')
+        time.sleep(1.0)  # dużo dłużej niż lock_ttl
+        return 'wynik'
+
+    thread = threading.Thread(target=leader.do, args=('key', slow))
+    thread.start()
+    time.sleep(0.1)
+    result, shared = other.do('key', lambda: calls.append('duplicate') or 'duplikat')
+    thread.join()
+
+    assert (result, shared) == ('wynik', True)
+    assert calls == ['leader']
+
+
+def test_crashed_leader_lease_expires(tmp_path):
+    store = SQLiteLockStore(os.path.join(tmp_path, 'inflight.db'))
+    # Dzierżawa porzucona bez odnawiania (proces lidera zginął)
+    assert store.acquire('key', 'dead-owner', 0.2)
+    flight = SingleFlight(store, lock_ttl=0.2, poll_interval=0.05, max_wait=5)
+
+    started = time.monotonic()
+    result, shared = flight.do('key', lambda: 'przejęte')
+    assert (result, shared) == ('przejęte', False)
+    assert time.monotonic() - started < 1
+    assert flight.stats()['takeovers'] == 1
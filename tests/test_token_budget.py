@@ -0,0 +1,57 @@
+from utils.token_budget import MemoryUsageStore, SQLiteUsageStore, TokenBudget
+
+PROMPT = 'Popraw CV kandydata. ' * 40
+
+
+def budget(store=None, **settings):
+    return TokenBudget(store or MemoryUsageStore(), percentile=95, margin=0.2, min_samples=20, floor=256, **settings)
+
+
+def record_sizes(token_budget, sizes, task='cv_score'):
+    for size in sizes:
+        token_budget.record(task, PROMPT, size)
+
+
+def test_default_limit_until_enough_samples():
+    token_budget = budget()
+    record_sizes(token_budget, [500] * 19)
+
+    assert token_budget.max_tokens_for('cv_score', PROMPT, 4000) == 4000
+    assert token_budget.stats()['default'] == 1
+
+
+def test_p95_with_margin():
+    token_budget = budget()
+    # 1..100 * 10: 95. percentyl to 950 tokenów, plus 20% zapasu
+    record_sizes(token_budget, [size * 10 for size in range(1, 101)])
+
+    assert token_budget.max_tokens_for('cv_score', PROMPT, 4000) == int(950 * 1.2)
+    assert token_budget.stats()['suggestions'] == {'cv_score:0': 1140}
+
+
+def test_suggestion_is_clamped_to_profile_limit_and_floor():
+    token_budget = budget()
+    record_sizes(token_budget, [3900] * 20, task='optimize')
+    record_sizes(token_budget, [50] * 20, task='grammar_check')
+
+    assert token_budget.max_tokens_for('optimize', PROMPT, 4000) == 4000
+    assert token_budget.max_tokens_for('grammar_check', PROMPT, 4000) == 256
+
+
+def test_prompt_length_buckets_are_separate():
+    token_budget = budget()
+    record_sizes(token_budget, [500] * 20)
+
+    assert token_budget.max_tokens_for('cv_score', PROMPT, 4000) == 600
+    assert token_budget.max_tokens_for('cv_score', PROMPT * 20, 4000) == 4000
+
+
+def test_sqlite_history_is_shared_and_trimmed(tmp_path):
+    path = str(tmp_path / 'usage.db')
+    writer = budget(SQLiteUsageStore(path, window=30))
+    record_sizes(writer, [100] * 30 + [1000] * 30)
+
+    reader = budget(SQLiteUsageStore(path, window=30))
+    assert reader.max_tokens_for('cv_score', PROMPT, 4000) == 1200
+    rows = reader.store._connect().execute('SELECT COUNT(*) FROM token_usage').fetchone()[0]
+    assert rows == 30
@@ -0,0 +1,215 @@
+import os
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.environ.get('CACHE_DIR', tempfile.gettempdir())
+
+
+class MemoryLRUBackend:
+    """In-process LRU store with per-entry expiry, bounded by entry count"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=500):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.time() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def size(self):
+        return len(self.entries)
+
+
+class SQLiteBackend:
+    """
+    On-disk store shared by all gunicorn workers on one host.
+
+    Uses WAL mode so readers do not block the writer. Eviction is LRU by last
+    access time and runs every `evict_every` writes to keep writes cheap.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, table='cache', max_entries=5000, evict_every=50):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self.writes = 0
+        self.local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        # Połączenia SQLite nie mogą przechodzić między procesami ani wątkami
+        pid = os.getpid()
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or getattr(self.local, 'pid', None) != pid:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+            self.local.pid = pid
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)')
+
+    def get(self, key):
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                return None
+            conn.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE key = ?', (now, key))
+            return row[0]
+        except sqlite3.Error as e:
+            logger.warning(f"SQLite cache read failed: {e}")
+            return None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, value, now + ttl, now)
+            )
+            self.writes += 1
+            if self.writes % self.evict_every == 0:
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.warning(f"SQLite cache write failed: {e}")
+
+    def _evict(self, conn, now):
+        conn.execute(f'DELETE FROM {self.table} WHERE expires_at < ?', (now,))
+        conn.execute(
+            f'DELETE FROM {self.table} WHERE key IN ('
+            f'SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+    def delete(self, key):
+        try:
+            self._connect().execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+        except sqlite3.Error as e:
+            logger.warning(f"SQLite cache delete failed: {e}")
+
+    def clear(self):
+        self._connect().execute(f'DELETE FROM {self.table}')
+
+    def size(self):
+        try:
+            return self._connect().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+
+class RedisBackend:
+    """
+    Redis-compatible store (Redis, Valkey, KeyDB, ...) shared across hosts.
+
+    Size is bounded by the server's `maxmemory` with an LRU eviction policy,
+    so no client-side eviction is done here.
+    """
+
+    name = 'redis'
+
+    def __init__(self, url, prefix='cache:'):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self.prefix = prefix
+
+    def get(self, key):
+        try:
+            value = self.client.get(self.prefix + key)
+            return value.decode('utf-8') if value is not None else None
+        except Exception as e:
+            logger.warning(f"Redis cache read failed: {e}")
+            return None
+
+    def set(self, key, value, ttl):
+        try:
+            self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+        except Exception as e:
+            logger.warning(f"Redis cache write failed: {e}")
+
+    def delete(self, key):
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"Redis cache delete failed: {e}")
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+    def size(self):
+        try:
+            return sum(1 for _ in self.client.scan_iter(match=self.prefix + '*'))
+        except Exception:
+            return 0
+
+
+def create_backend(kind, name, max_entries):
+    """
+    Build a cache backend by kind ('memory', 'sqlite', 'redis' or 'none').
+
+    `name` namespaces the store: SQLite table/file name or Redis key prefix.
+    Falls back to the in-process LRU if the requested backend is unavailable.
+    """
+    kind = (kind or 'memory').lower()
+    if kind == 'none':
+        return None
+    try:
+        if kind == 'sqlite':
+            path = os.path.join(DEFAULT_CACHE_DIR, f'cv_optimizer_{name}.db')
+            return SQLiteBackend(path, table=name, max_entries=max_entries)
+        if kind == 'redis':
+            return RedisBackend(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'), prefix=f'{name}:')
+    except Exception as e:
+        logger.warning(f"Cache backend '{kind}' unavailable for {name}, using in-process LRU: {e}")
+    return MemoryLRUBackend(max_entries=max_entries)
@@ -3,8 +3,10 @@ import json
 import logging
 import requests
 import urllib.parse
-from bs4 import BeautifulSoup
 from utils.openrouter_api import send_api_request
+from utils.json_extractor import extract_json
+from utils.job_page_cache import job_page_cache
+from utils.job_sites import extract_posting, QUALITY_THRESHOLD
 
 logger = logging.getLogger(__name__)
 
@@ -31,22 +33,25 @@ def extract_job_info_from_url(url):
             "Upgrade-Insecure-Requests": "1"
         }
         
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
+        page = job_page_cache.fetch(url, headers=headers, timeout=10)
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        domain = parsed_url.netloc.lower()
+        # Wynik dla tej samej wersji strony jest już w cache
+        cached_info = job_page_cache.get_result('job_info', page)
+        if cached_info is not None:
+            logger.info(f"Informacje o ofercie z cache ({page.status}): {page.canonical_url}")
+            return cached_info
         
-        # Wyciągnij informacje specyficzne dla różnych portali
-        job_info = extract_by_domain(soup, domain)
+        # Adapter portalu, a dla brakujących pól selektory ogólne
+        posting = extract_posting(page.html, url)
+        job_info = posting.to_job_info()
         
-        # Jeśli nie udało się wyciągnąć specyficznie, spróbuj ogólnych selektorów
-        if not job_info['job_title'] or not job_info['job_description']:
-            job_info = extract_generic(soup, job_info)
-        
-        # Użyj AI do poprawy i uzupełnienia informacji
+        # Użyj AI do poprawy i uzupełnienia informacji tylko przy słabej jakości ekstrakcji
         if job_info['job_title'] or job_info['job_description']:
-            job_info = enhance_with_ai(job_info, url)
+            quality = posting.quality()
+            if quality < QUALITY_THRESHOLD:
+                logger.info(f"Jakość ekstrakcji {quality} < {QUALITY_THRESHOLD}, uzupełnianie przez AI")
+                job_info = enhance_with_ai(job_info, url)
+            job_page_cache.set_result('job_info', page, job_info)
         
         logger.info(f"Pomyślnie wyciągnięto: tytuł='{job_info['job_title'][:50]}...', opis={len(job_info['job_description'])} znaków")
         
@@ -60,194 +65,6 @@ def extract_job_info_from_url(url):
         logger.error(f"Błąd analizy URL: {str(e)}")
         raise Exception(f"Nie udało się przeanalizować oferty: {str(e)}")
 
-def extract_by_domain(soup, domain):
-    """Wyciąga informacje specyficzne dla różnych portali pracy"""
-    job_info = {'job_title': '', 'job_description': '', 'company': ''}
-    
-    try:
-        if 'linkedin.com' in domain:
-            # LinkedIn
-            title_elem = soup.select_one('.top-card-layout__title, .jobs-unified-top-card__job-title, h1')
-            if title_elem:
-                job_info['job_title'] = title_elem.get_text(strip=True)
-            
-            company_elem = soup.select_one('.top-card-layout__card .topcard__org-name-link, .jobs-unified-top-card__company-name')
-            if company_elem:
-                job_info['company'] = company_elem.get_text(strip=True)
-            
-            desc_elem = soup.select_one('.description__text, .show-more-less-html__markup, .jobs-description__content')
-            if desc_elem:
-                job_info['job_description'] = desc_elem.get_text(separator='\n', strip=True)
-                
-        elif 'indeed.com' in domain:
-            # Indeed
-            title_elem = soup.select_one('.jobsearch-JobInfoHeader-title, h1[data-testid="job-title"]')
-            if title_elem:
-                job_info['job_title'] = title_elem.get_text(strip=True)
-            
-            company_elem = soup.select_one('[data-testid="inlineHeader-companyName"], .icl-u-lg-mr--sm')
-            if company_elem:
-                job_info['company'] = company_elem.get_text(strip=True)
-            
-            desc_elem = soup.select_one('#jobDescriptionText, [data-testid="job-description"]')
-            if desc_elem:
-                job_info['job_description'] = desc_elem.get_text(separator='\n', strip=True)
-                
-        elif 'pracuj.pl' in domain:
-            # Pracuj.pl
-            title_elem = soup.select_one('[data-test="text-jobTitle"], .offer-viewBBjNq h1')
-            if title_elem:
-                job_info['job_title'] = title_elem.get_text(strip=True)
-            
-            company_elem = soup.select_one('[data-test="text-employer"], .offer-company-name')
-            if company_elem:
-                job_info['company'] = company_elem.get_text(strip=True)
-            
-            desc_containers = soup.select('[data-test="section-description-text"], [data-test="section-requirements-text"], [data-test="section-offered-text"]')
-            if desc_containers:
-                job_info['job_description'] = '\n\n'.join([c.get_text(separator='\n', strip=True) for c in desc_containers])
-                
-        elif 'nofluffjobs.com' in domain:
-            # NoFluffJobs
-            title_elem = soup.select_one('h1[data-cy="JobOfferTitle"], .posting-details-description h1')
-            if title_elem:
-                job_info['job_title'] = title_elem.get_text(strip=True)
-            
-            company_elem = soup.select_one('[data-cy="CompanyName"], .company-name')
-            if company_elem:
-                job_info['company'] = company_elem.get_text(strip=True)
-            
-            desc_elem = soup.select_one('[data-cy="JobOfferDescription"], .posting-details-description')
-            if desc_elem:
-                job_info['job_description'] = desc_elem.get_text(separator='\n', strip=True)
-                
-        elif 'olx.pl' in domain:
-            # OLX Praca - zaktualizowane selektory
-            title_elem = soup.select_one('h1, [data-cy="ad_title"], .css-1juynto, .ad-title')
-            if title_elem:
-                job_info['job_title'] = title_elem.get_text(strip=True)
-            
-            # Szukaj opisu w różnych miejscach
-            desc_containers = soup.select('[data-cy="ad_description"], .css-g5mtl5, .description, .ad-description, .ad-description-full')
-            if desc_containers:
-                job_info['job_description'] = desc_containers[0].get_text(separator='\n', strip=True)
-            else:
-                # Jeśli nie ma specyficznych selektorów, szukaj w całej treści
-                # Znajdź wszystkie div-y i p-ki które mogą zawierać opis
-                potential_desc = soup.select('div:has(p), section, article, .content, .details')
-                for container in potential_desc:
-                    text = container.get_text(separator='\n', strip=True)
-                    if len(text) > 100 and 'opis' in text.lower() or 'stanowisko' in text.lower() or 'wymagania' in text.lower():
-                        job_info['job_description'] = text
-                        break
-                
-        elif 'justjoin.it' in domain:
-            # JustJoin.it
-            title_elem = soup.select_one('h1[data-test-id="offer-title"], .MuiTypography-h1')
-            if title_elem:
-                job_info['job_title'] = title_elem.get_text(strip=True)
-            
-            company_elem = soup.select_one('[data-test-id="company-name"], .MuiTypography-h6')
-            if company_elem:
-                job_info['company'] = company_elem.get_text(strip=True)
-            
-            desc_elem = soup.select_one('[data-test-id="offer-description"], .OfferDescription')
-            if desc_elem:
-                job_info['job_description'] = desc_elem.get_text(separator='\n', strip=True)
-                
-    except Exception as e:
-        logger.warning(f"Błąd podczas wyciągania dla domeny {domain}: {str(e)}")
-    
-    return job_info
-
-def extract_generic(soup, existing_info):
-    """Ogólne wyciąganie informacji gdy specyficzne selektory nie działają"""
-    
-    # Jeśli nie ma tytułu, szukaj w ogólnych miejscach
-    if not existing_info['job_title']:
-        title_selectors = [
-            'h1', '.job-title', '.offer-title', '.position-title',
-            '[class*="title"]', '[class*="job"]', '[class*="position"]',
-            'title', '.headline', '.job-header h1'
-        ]
-        
-        for selector in title_selectors:
-            elem = soup.select_one(selector)
-            if elem:
-                title_text = elem.get_text(strip=True)
-                if 5 < len(title_text) < 100:  # Rozsądna długość tytułu
-                    existing_info['job_title'] = title_text
-                    break
-    
-    # Jeśli nie ma opisu, szukaj w ogólnych miejscach
-    if not existing_info['job_description']:
-        desc_selectors = [
-            '.job-description', '.offer-description', '.description',
-            '.job-content', '.offer-content', '.content',
-            '[class*="description"]', '[class*="details"]',
-            'article', '.main-content', '.job-details'
-        ]
-        
-        for selector in desc_selectors:
-            elem = soup.select_one(selector)
-            if elem:
-                desc_text = elem.get_text(separator='\n', strip=True)
-                if len(desc_text) > 100:  # Minimum dla opisu
-                    existing_info['job_description'] = desc_text
-                    break
-    
-    # Specjalna obsługa dla OLX - wyciągnij tekst z całej strony i filtruj
-    if not existing_info['job_description'] and 'olx.pl' in soup.get_text().lower():
-        all_text = soup.get_text(separator='\n', strip=True)
-        lines = [line.strip() for line in all_text.split('\n') if line.strip()]
-        
-        # Znajdź linie które mogą zawierać opis pracy
-        job_related_lines = []
-        job_keywords = ['stanowisko', 'praca', 'wymagania', 'obowiązki', 'opis', 'oferujemy', 'poszukujemy', 'mile widziane']
-        
-        for i, line in enumerate(lines):
-            if len(line) > 20 and any(keyword in line.lower() for keyword in job_keywords):
-                # Dodaj tę linię i kilka następnych
-                for j in range(max(0, i-1), min(len(lines), i+5)):
-                    if lines[j] not in job_related_lines and len(lines[j]) > 10:
-                        job_related_lines.append(lines[j])
-        
-        if job_related_lines:
-            existing_info['job_description'] = '\n'.join(job_related_lines[:20])  # Maksymalnie 20 linii
-    
-    # Jeśli nadal nie ma opisu, weź text z body (z filtrowaniem)
-    if not existing_info['job_description'] and soup.body:
-        # Usuń niepotrzebne elementy
-        for tag in soup.select('nav, header, footer, script, style, iframe, aside, .sidebar, .menu'):
-            tag.decompose()
-        
-        body_text = soup.body.get_text(separator='\n', strip=True)
-        
-        # Filtruj tekst do najważniejszych części
-        lines = [line.strip() for line in body_text.split('\n') if line.strip()]
-        filtered_lines = []
-        
-        job_keywords = [
-            'wymagania', 'requirements', 'obowiązki', 'responsibilities',
-            'kwalifikacje', 'qualifications', 'umiejętności', 'skills',
-            'doświadczenie', 'experience', 'oferujemy', 'benefits',
-            'opis stanowiska', 'job description', 'zakres obowiązków'
-        ]
-        
-        relevant_section = False
-        for line in lines:
-            if any(keyword.lower() in line.lower() for keyword in job_keywords):
-                relevant_section = True
-            if relevant_section and len(line) > 20:
-                filtered_lines.append(line)
-            if len('\n'.join(filtered_lines)) > 2000:  # Limit długości
-                break
-        
-        if filtered_lines:
-            existing_info['job_description'] = '\n'.join(filtered_lines)
-    
-    return existing_info
-
 def enhance_with_ai(job_info, url):
     """Używa AI do poprawy i uzupełnienia wyciągniętych informacji"""
     try:
@@ -275,15 +92,13 @@ Zwróć TYLKO JSON w formacie:
 """
         
         # Wywołaj AI
-        ai_response = send_api_request(prompt, max_tokens=1000, language='pl')
+        ai_response = send_api_request(prompt, language='pl', task='job_enhance')
         
         # Spróbuj sparsować odpowiedź AI
         try:
             # Znajdź JSON w odpowiedzi
-            import re
-            json_match = re.search(r'\{.*\}', ai_response, re.DOTALL)
-            if json_match:
-                enhanced_info = json.loads(json_match.group())
+            enhanced_info = extract_json(ai_response)
+            if enhanced_info:
                 
                 # Sprawdź czy AI poprawiło informacje
                 if enhanced_info.get('job_title') and len(enhanced_info['job_title']) > 3:
@@ -0,0 +1,148 @@
+import os
+import time
+import queue
+import threading
+import logging
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.job_page_cache import job_page_cache, canonicalize_url, JobPageFetchError, DomainBusy
+from utils.job_sites import extract_posting
+
+logger = logging.getLogger(__name__)
+
+JOB_BATCH_CONCURRENCY = int(os.environ.get('JOB_BATCH_CONCURRENCY', 8))
+JOB_BATCH_MAX_URLS = int(os.environ.get('JOB_BATCH_MAX_URLS', 50))
+
+# Pula wspólna dla wszystkich żądań wsadowych; limity na domenę pilnuje domain_limiter
+job_batch_executor = ThreadPoolExecutor(max_workers=JOB_BATCH_CONCURRENCY, thread_name_prefix='job-batch')
+
+BROWSER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "pl,en-US;q=0.5"
+}
+
+
+def ingest_job_url(url, background=False):
+    """
+    Fetch and extract one job offer; returns a JSON-serializable dict (also for failures).
+
+    With background=True a busy domain raises DomainBusy so the caller can requeue the URL.
+    """
+    started = time.monotonic()
+    try:
+        page = job_page_cache.fetch(url, headers=BROWSER_HEADERS, background=background)
+        posting = job_page_cache.get_result('posting', page)
+        if posting is None:
+            extracted = extract_posting(page.html, url)
+            posting = extracted.to_dict()
+            posting['quality'] = extracted.quality()
+            job_page_cache.set_result('posting', page, posting)
+        result = {
+            'url': url,
+            'canonical_url': page.canonical_url,
+            'success': bool(posting['description']),
+            'cache': page.status,
+            'job_title': posting['title'],
+            'company': posting['company'],
+            'job_description': posting['description'],
+            'requirements': posting['requirements'],
+            'quality': posting['quality'],
+            'source': posting['source']
+        }
+        if not result['success']:
+            result['message'] = 'Could not extract job description from the URL'
+    except DomainBusy:
+        raise
+    except JobPageFetchError as e:
+        result = {'url': url, 'success': False, 'message': f"Failed to fetch job posting from URL: {e}"}
+    except Exception as e:
+        logger.error(f"Error ingesting job URL {url}: {e}")
+        result = {'url': url, 'success': False, 'message': f"Failed to analyze job posting: {e}"}
+    result['elapsed'] = round(time.monotonic() - started, 3)
+    return result
+
+
+def prepare_urls(urls):
+    """
+    Validate and deduplicate a list of job URLs.
+
+    Returns (unique URLs in request order, invalid entries, duplicates)
+    where duplicates lists (repeated URL, URL kept for the same offer) pairs.
+    """
+    unique = {}
+    invalid = []
+    duplicates = []
+    for url in urls:
+        if not isinstance(url, str):
+            invalid.append(url)
+            continue
+        url = url.strip()
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+            invalid.append(url)
+            continue
+        canonical_url = canonicalize_url(url)
+        if canonical_url in unique:
+            duplicates.append((url, unique[canonical_url]))
+        else:
+            unique[canonical_url] = url
+    return list(unique.values()), invalid, duplicates
+
+
+def ingest_job_urls(urls):
+    """
+    Yield ingest_job_url results in completion order, fetching concurrently.
+
+    A URL whose domain is at its limit is resubmitted after the suggested
+    delay instead of blocking a pool thread, so other domains (and
+    interactive fetches) keep going. Closing the generator (the client
+    disconnected) cancels the pending retries and the URLs not started yet.
+    """
+    results = queue.Queue()
+    cancelled = threading.Event()
+    timers = []
+    futures = set()
+    lock = threading.Lock()
+
+    def ingest(url):
+        # Zadanie czekało w puli, a klient w tym czasie się rozłączył
+        if cancelled.is_set():
+            return None
+        return ingest_job_url(url, True)
+
+    def submit(url):
+        with lock:
+            if cancelled.is_set():
+                return
+            future = job_batch_executor.submit(ingest, url)
+            futures.add(future)
+        future.add_done_callback(lambda f: results.put((url, f)))
+
+    try:
+        for url in urls:
+            submit(url)
+        pending = len(urls)
+        while pending:
+            url, future = results.get()
+            with lock:
+                futures.discard(future)
+            error = future.exception()
+            if isinstance(error, DomainBusy):
+                timer = threading.Timer(error.retry_after, submit, args=(url,))
+                timer.daemon = True
+                with lock:
+                    timers.append(timer)
+                timer.start()
+                continue
+            pending -= 1
+            yield future.result()
+    finally:
+        with lock:
+            cancelled.set()
+            for timer in timers:
+                timer.cancel()
+            cancelled_fetches = sum(future.cancel() for future in futures)
+        if cancelled_fetches:
+            logger.info(f"Job URL batch closed early, {cancelled_fetches} fetches cancelled")
@@ -0,0 +1,491 @@
+import os
+import re
+import json
+import time
+import zlib
+import base64
+import hashlib
+import logging
+import threading
+import urllib.parse
+from contextlib import contextmanager
+
+import requests
+
+from utils.cache_backends import create_backend
+from utils.job_sites import adapter_for
+
+logger = logging.getLogger(__name__)
+
+# Jak długo pobrana strona oferty jest świeża (bez odpytywania portalu), w sekundach
+DOMAIN_TTLS = {
+    'pracuj.pl': 6 * 3600,
+    'linkedin.com': 12 * 3600,
+    'indeed.com': 12 * 3600,
+    'nofluffjobs.com': 12 * 3600,
+    'justjoin.it': 12 * 3600,
+    'olx.pl': 3 * 3600,
+    'praca.pl': 6 * 3600,
+}
+DEFAULT_TTL = int(os.environ.get('JOB_CACHE_DEFAULT_TTL', 6 * 3600))
+# Po tym czasie wpis znika; do tego momentu nieświeżą stronę można tanio odświeżyć (ETag / Last-Modified)
+STORE_TTL = int(os.environ.get('JOB_CACHE_STORE_TTL', 7 * 24 * 3600))
+# Po błędzie przejściowym zapisana strona jest serwowana bez odpytywania portalu przez NEGATIVE_TTL
+NEGATIVE_TTL = int(os.environ.get('JOB_CACHE_NEGATIVE_TTL', 600))
+# Cache porażek tylko dla odpowiedzi rozstrzygających (404/410) - oferta nie istnieje
+GONE_TTL = int(os.environ.get('JOB_CACHE_GONE_TTL', 3600))
+GONE_STATUS_CODES = (404, 410)
+
+# Limity pobierania: rozmiar po dekompresji, łączny czas i zapas czytany po znacznikach treści adaptera
+MAX_PAGE_BYTES = int(os.environ.get('JOB_FETCH_MAX_BYTES', 2 * 1024 * 1024))
+FETCH_DEADLINE = float(os.environ.get('JOB_FETCH_DEADLINE', 10))
+STOP_TAIL_BYTES = int(os.environ.get('JOB_FETCH_STOP_TAIL', 32 * 1024))
+CHUNK_SIZE = 16 * 1024
+
+# Uprzejmość wobec portali: równoległe pobrania i minimalny odstęp między nimi w jednej domenie
+DOMAIN_CONCURRENCY = int(os.environ.get('JOB_DOMAIN_CONCURRENCY', 2))
+DOMAIN_DELAY = float(os.environ.get('JOB_DOMAIN_DELAY', 1.0))
+# Sloty w domenie zarezerwowane dla pobrań interaktywnych (niedostępne dla importu wsadowego)
+DOMAIN_INTERACTIVE_SLOTS = int(os.environ.get('JOB_DOMAIN_INTERACTIVE_SLOTS', 1))
+
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+# Parametry zapytania, które identyfikują ofertę na znanych portalach - wszystkie inne są tam odrzucane
+# (na Indeed jk/vjk to identyfikator oferty, na Pracuj oferta jest w ścieżce lub w parametrze oferty)
+DOMAIN_QUERY_ALLOWLISTS = {
+    'linkedin.com': (),
+    'indeed.com': ('jk', 'vjk'),
+    'pracuj.pl': ('oferta', 'offerid', 'id'),
+    'nofluffjobs.com': (),
+    'justjoin.it': (),
+    'olx.pl': (),
+    'praca.pl': (),
+}
+# Na pozostałych domenach odrzucane są tylko utm_* i znane parametry kliknięć
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', 'igshid',
+    'trk', 'trkinfo', 'trackingid',
+}
+
+
+class JobPageFetchError(requests.exceptions.RequestException):
+    """Fetching a job page failed (possibly answered from the negative cache)"""
+
+
+def _query_allowlist(host):
+    for domain, allowlist in DOMAIN_QUERY_ALLOWLISTS.items():
+        if host == domain or host.endswith('.' + domain):
+            return allowlist
+    return None
+
+
+def canonicalize_url(url):
+    """
+    Normalize a job offer URL so copies of the same offer share one cache entry.
+
+    Lowercases scheme and host, drops 'www.', fragments and trailing
+    slashes, and sorts the query. On known portals only the parameters in
+    DOMAIN_QUERY_ALLOWLISTS (the offer identifiers) are kept; elsewhere only
+    utm_* and TRACKING_PARAMS are dropped. LinkedIn search links
+    (?currentJobId=) map to /jobs/view/<id>.
+    """
+    parsed = urllib.parse.urlsplit(url.strip())
+    scheme = (parsed.scheme or 'https').lower()
+    host = parsed.netloc.lower()
+    if host.endswith(':443') and scheme == 'https':
+        host = host[:-4]
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parsed.path or '/'
+    query = urllib.parse.parse_qsl(parsed.query, keep_blank_values=False)
+
+    if host.endswith('linkedin.com'):
+        host = 'linkedin.com'
+        job_id = dict(query).get('currentJobId')
+        if job_id and job_id.isdigit():
+            path = f'/jobs/view/{job_id}'
+        elif path.startswith('/jobs/view/'):
+            # /jobs/view/senior-python-developer-at-firma-1234567890 -> /jobs/view/1234567890
+            slug = path[len('/jobs/view/'):].strip('/').split('/')[0]
+            job_id = slug.rsplit('-', 1)[-1]
+            if job_id.isdigit():
+                path = f'/jobs/view/{job_id}'
+        query = []
+
+    allowlist = _query_allowlist(host)
+    if allowlist is not None:
+        query = [(key, value) for key, value in query if key.lower() in allowlist]
+    else:
+        query = [
+            (key, value) for key, value in query
+            if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+        ]
+    query = sorted(query)
+    if len(path) > 1:
+        path = path.rstrip('/')
+    return urllib.parse.urlunsplit((scheme, host, path, urllib.parse.urlencode(query), ''))
+
+
+def domain_ttl(url):
+    host = urllib.parse.urlsplit(url).netloc.lower()
+    for domain, ttl in DOMAIN_TTLS.items():
+        if host == domain or host.endswith('.' + domain):
+            return ttl
+    return DEFAULT_TTL
+
+
+class DomainBusy(Exception):
+    """A background download could not start now because of the per-domain limits"""
+
+    def __init__(self, url, retry_after):
+        super().__init__(f"Domain of {url} busy, retry in {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+
+class DomainLimiter:
+    """
+    Per-domain politeness for page downloads in this process.
+
+    At most `concurrency` downloads run at once per host, and consecutive
+    downloads from one host start at least `delay` seconds apart.
+    `reserved` of the slots are kept for interactive fetches, so a batch
+    import never holds all of them. Background (batch) downloads never
+    wait: try_acquire tells them when to retry instead of blocking a thread
+    of the shared fetch pool. Interactive downloads wait in their own
+    (request) thread.
+    """
+
+    def __init__(self, concurrency=2, delay=1.0, reserved=1):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.reserved = max(0, min(reserved, concurrency - 1))
+        self.domains = {}
+        self.lock = threading.Lock()
+        self.released = threading.Condition(self.lock)
+
+    def _host(self, url):
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        return host[4:] if host.startswith('www.') else host
+
+    def try_acquire(self, url, background=True):
+        """Take a download slot without waiting; returns 0.0 when taken, else seconds to wait before retrying"""
+        host = self._host(url)
+        limit = self.concurrency - (self.reserved if background else 0)
+        with self.lock:
+            domain = self.domains.setdefault(host, {'active': 0, 'next_start': 0.0})
+            now = time.monotonic()
+            if domain['active'] >= limit:
+                return max(self.delay, 0.05)
+            if domain['next_start'] > now:
+                return domain['next_start'] - now
+            domain['active'] += 1
+            domain['next_start'] = now + self.delay
+            return 0.0
+
+    def release(self, url):
+        with self.lock:
+            domain = self.domains[self._host(url)]
+            domain['active'] -= 1
+            self.released.notify_all()
+
+    @contextmanager
+    def slot(self, url, background=False):
+        """Hold a download slot; background callers get DomainBusy instead of waiting"""
+        while True:
+            wait = self.try_acquire(url, background)
+            if not wait:
+                break
+            if background:
+                raise DomainBusy(url, wait)
+            with self.lock:
+                self.released.wait(wait)
+        try:
+            yield
+        finally:
+            self.release(url)
+
+
+domain_limiter = DomainLimiter(DOMAIN_CONCURRENCY, DOMAIN_DELAY, DOMAIN_INTERACTIVE_SLOTS)
+
+
+def _decode(body, response):
+    """Decode the body like requests does, without its full-body charset detection"""
+    encoding = None
+    if 'charset' in response.headers.get('Content-Type', '').lower():
+        encoding = response.encoding
+    if not encoding:
+        match = _META_CHARSET.search(body[:4096])
+        encoding = match.group(1).decode('ascii') if match else 'utf-8'
+    try:
+        return body.decode(encoding, errors='replace')
+    except LookupError:
+        return body.decode('utf-8', errors='replace')
+
+
+def download_page(url, headers=None, timeout=10, max_bytes=None, deadline=None, background=False):
+    """
+    Stream a job page with a size cap and a total deadline.
+
+    The body is read in chunks and decompressed on the fly, so a gzip bomb
+    or a huge SPA page stops at `max_bytes` of decoded HTML. Once every
+    content marker of the portal's adapter has arrived, only STOP_TAIL_BYTES
+    more are read and the connection is closed. A page cut short by a limit
+    is returned truncated (html.parser copes with unclosed tags); a deadline
+    hit before any content arrives is an error. Downloads respect the
+    per-domain limits of domain_limiter; background downloads raise
+    DomainBusy instead of waiting for a slot.
+    Returns (response, html); `html` is None for 304 Not Modified.
+    """
+    max_bytes = max_bytes or MAX_PAGE_BYTES
+    deadline = deadline or FETCH_DEADLINE
+    # Tylko kodowania, które _iter_decoded potrafi rozpakowywać z limitem (bez br/zstd)
+    headers = dict(headers or {}, **{'Accept-Encoding': 'gzip, deflate'})
+    with domain_limiter.slot(url, background=background):
+        started = time.monotonic()
+        response = requests.get(url, headers=headers, timeout=timeout, stream=True)
+        return _read_page(url, response, started, max_bytes, deadline)
+
+
+def _decompressor(encoding):
+    if encoding in ('', 'identity'):
+        return None
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        return zlib.decompressobj()
+    raise requests.exceptions.ContentDecodingError(f"Unsupported Content-Encoding: {encoding}")
+
+
+def _iter_decoded(response, limit):
+    """
+    Decoded body chunks of at most CHUNK_SIZE bytes, `limit` bytes in total.
+
+    The raw stream is decompressed here rather than by urllib3, with
+    max_length, so a few KB of gzip cannot expand past the cap in memory.
+    """
+    encoding = response.headers.get('Content-Encoding', '').strip().lower()
+    decompressor = _decompressor(encoding)
+    produced = 0
+    for data in response.raw.stream(CHUNK_SIZE, decode_content=False):
+        if decompressor is None:
+            chunk = data[:limit - produced]
+            produced += len(chunk)
+            yield chunk
+        while decompressor is not None and data and produced < limit:
+            try:
+                chunk = decompressor.decompress(data, min(CHUNK_SIZE, limit - produced))
+            except zlib.error as e:
+                if encoding == 'deflate' and not produced:
+                    # Część serwerów wysyła "deflate" bez nagłówka zlib
+                    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                    continue
+                raise requests.exceptions.ContentDecodingError(f"Cannot decode {encoding} body: {e}") from e
+            data = decompressor.unconsumed_tail
+            produced += len(chunk)
+            if chunk:
+                yield chunk
+        if produced >= limit:
+            return
+
+
+def _read_page(url, response, started, max_bytes, deadline):
+    try:
+        if response.status_code == 304:
+            return response, None
+        response.raise_for_status()
+
+        adapter = adapter_for(url)
+        markers = list(adapter.stop_markers) if adapter else []
+        body = bytearray()
+        stop_at = None
+        for chunk in _iter_decoded(response, max_bytes):
+            body.extend(chunk)
+            if markers:
+                window = bytes(body[-(len(chunk) + 256):])
+                markers = [marker for marker in markers if marker not in window]
+                if not markers:
+                    stop_at = len(body) + STOP_TAIL_BYTES
+            if stop_at is not None and len(body) >= stop_at:
+                logger.debug(f"Stopped reading {url} after adapter content ({len(body)} bytes)")
+                break
+            if len(body) >= max_bytes:
+                logger.warning(f"Job page {url} exceeds {max_bytes} bytes, truncated")
+                del body[max_bytes:]
+                break
+            if time.monotonic() - started > deadline:
+                if not body:
+                    raise JobPageFetchError(f"Fetching {url} exceeded {deadline}s")
+                logger.warning(f"Job page {url} exceeded {deadline}s, using {len(body)} bytes")
+                break
+        return response, _decode(bytes(body), response)
+    finally:
+        response.close()
+
+
+def _url_key(canonical_url):
+    return hashlib.sha256(canonical_url.encode('utf-8')).hexdigest()
+
+
+def _pack(text):
+    return base64.b64encode(zlib.compress(text.encode('utf-8'), 6)).decode('ascii')
+
+
+def _unpack(data):
+    return zlib.decompress(base64.b64decode(data)).decode('utf-8')
+
+
+class JobPage:
+    """A job offer page served from the cache or the network"""
+
+    def __init__(self, url, canonical_url, html, version, status):
+        self.url = url
+        self.canonical_url = canonical_url
+        self.html = html
+        self.version = version  # skrót treści - wyniki ekstrakcji są ważne tylko dla tej wersji
+        self.status = status  # fresh, revalidated, fetched lub stale
+
+
+class JobPageCache:
+    """
+    Cache of job offer pages and of results extracted from them.
+
+    Pages are stored compressed with their ETag / Last-Modified headers.
+    A fresh page (per-domain TTL) is served without any request; a stale
+    one is revalidated with If-None-Match / If-Modified-Since, so an
+    unchanged offer costs one 304. Extraction results (job description
+    text, AI-enhanced job info, ...) are stored per page version and reused
+    until the page content changes. Only definitive failures (404/410) are
+    cached, for GONE_TTL; a page that is not a job offer is remembered as
+    an empty extraction result for its version. A transient failure
+    (timeout, connection error, 5xx, ...) serves the stored page if there
+    is one (stale-if-error), otherwise it is not cached at all.
+    """
+
+    def __init__(self, pages, results):
+        self.pages = pages
+        self.results = results
+        self.counters = {'fresh': 0, 'revalidated': 0, 'fetched': 0, 'stale': 0, 'negative': 0, 'result_hits': 0}
+        self.lock = threading.Lock()
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _load_page(self, key):
+        if self.pages is None:
+            return None
+        raw = self.pages.get(key)
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+
+    def _store_page(self, key, entry):
+        if self.pages is not None:
+            self.pages.set(key, json.dumps(entry), STORE_TTL if 'error' not in entry else entry['error_ttl'])
+
+    def fetch(self, url, headers=None, timeout=10, background=False):
+        """
+        Return a JobPage for url; raises JobPageFetchError if the page cannot be fetched.
+
+        With background=True a download that would have to wait for the
+        domain limits raises DomainBusy (cache hits are served as usual).
+        """
+        canonical_url = canonicalize_url(url)
+        key = _url_key(canonical_url)
+        entry = self._load_page(key)
+        now = time.time()
+
+        if entry and 'error' in entry:
+            self._count('negative')
+            raise JobPageFetchError(entry['error'])
+
+        if entry and now - entry['fetched_at'] < domain_ttl(canonical_url):
+            self._count('fresh')
+            return JobPage(url, canonical_url, _unpack(entry['html']), entry['version'], 'fresh')
+
+        # Niedawna porażka odświeżania - zapisana strona bez ponownego odpytywania portalu
+        if entry and entry.get('retry_at', 0) > now:
+            self._count('stale')
+            return JobPage(url, canonical_url, _unpack(entry['html']), entry['version'], 'stale')
+
+        request_headers = dict(headers or {})
+        if entry:
+            if entry.get('etag'):
+                request_headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                request_headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response, html = download_page(url, headers=request_headers, timeout=timeout, background=background)
+            if html is None:
+                if not entry:
+                    raise JobPageFetchError(f"Unexpected 304 Not Modified for {url}")
+                entry['fetched_at'] = now
+                entry.pop('retry_at', None)
+                self._store_page(key, entry)
+                self._count('revalidated')
+                return JobPage(url, canonical_url, _unpack(entry['html']), entry['version'], 'revalidated')
+        except requests.exceptions.RequestException as e:
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+            if status in GONE_STATUS_CODES:
+                self._store_page(key, {'error': str(e), 'error_ttl': GONE_TTL})
+            elif entry:
+                logger.warning(f"Refreshing {canonical_url} failed ({e}), serving the stored page")
+                entry['retry_at'] = now + NEGATIVE_TTL
+                self._store_page(key, entry)
+                self._count('stale')
+                return JobPage(url, canonical_url, _unpack(entry['html']), entry['version'], 'stale')
+            # Timeout czy błąd połączenia bez zapisanej strony nie jest zapamiętywany - ponowna próba od razu
+            raise JobPageFetchError(str(e)) from e
+
+        version = hashlib.sha1(html.encode('utf-8')).hexdigest()
+        self._store_page(key, {
+            'html': _pack(html),
+            'version': version,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': now
+        })
+        self._count('fetched')
+        return JobPage(url, canonical_url, html, version, 'fetched')
+
+    def get_result(self, kind, page):
+        """Cached extraction result of `kind` for this page version, or None"""
+        if self.results is None:
+            return None
+        raw = self.results.get(f"{kind}:{_url_key(page.canonical_url)}")
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        if entry.get('version') != page.version:
+            return None
+        self._count('result_hits')
+        return entry['value']
+
+    def set_result(self, kind, page, value):
+        if self.results is not None:
+            self.results.set(
+                f"{kind}:{_url_key(page.canonical_url)}",
+                json.dumps({'version': page.version, 'value': value}, ensure_ascii=False),
+                STORE_TTL
+            )
+
+    def invalidate(self, url):
+        if self.pages is not None:
+            self.pages.delete(_url_key(canonicalize_url(url)))
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats['pages'] = self.pages.size() if self.pages is not None else 0
+        return stats
+
+
+_backend_kind = os.environ.get('JOB_CACHE_BACKEND', os.environ.get('LLM_CACHE_BACKEND', 'sqlite'))
+job_page_cache = JobPageCache(
+    create_backend(_backend_kind, 'job_pages', int(os.environ.get('JOB_CACHE_MAX_PAGES', 2000))),
+    create_backend(_backend_kind, 'job_results', int(os.environ.get('JOB_CACHE_MAX_RESULTS', 5000)))
+)
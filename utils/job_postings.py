@@ -0,0 +1,118 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, JobPosting
+from utils.job_page_cache import canonicalize_url
+from utils.job_sites import normalize_job_text
+from utils.job_summarizer import extract_keywords
+from utils.json_extractor import validate
+from utils.llm_cache import TASK_TTLS
+from utils.openrouter_api import JOB_ANALYSIS_VERSION
+
+logger = logging.getLogger(__name__)
+
+KEYWORD_COUNT = 15
+# Jak długo zapisana analiza ogłoszenia jest używana ponownie (jak odpowiedzi w llm_cache)
+ANALYSIS_TTL = int(os.environ.get('JOB_ANALYSIS_TTL', TASK_TTLS['job_posting_analysis']))
+
+
+def content_hash(cleaned_text):
+    return hashlib.sha256(cleaned_text.encode('utf-8')).hexdigest()
+
+
+def get_or_create_job_posting(text, url=None):
+    """
+    Return the JobPosting for this job description, creating it on first use.
+
+    Postings are deduplicated by the hash of the cleaned text, so the same
+    offer pasted by many users, or analyzed many times, is stored once.
+    Returns None for an empty description or when the database fails
+    (callers then keep the text inline as before).
+    """
+    cleaned_text = normalize_job_text(text)
+    if not cleaned_text:
+        return None
+    digest = content_hash(cleaned_text)
+    canonical_url = canonicalize_url(url) if url else None
+    try:
+        posting = JobPosting.query.filter_by(content_hash=digest).first()
+        if posting is None:
+            posting = JobPosting(
+                content_hash=digest,
+                canonical_url=canonical_url,
+                raw_text=text,
+                cleaned_text=cleaned_text,
+                keywords=json.dumps(extract_keywords(cleaned_text, KEYWORD_COUNT), ensure_ascii=False)
+            )
+            db.session.add(posting)
+        else:
+            posting.last_used_at = datetime.utcnow()
+            if canonical_url and not posting.canonical_url:
+                posting.canonical_url = canonical_url
+        db.session.commit()
+        return posting
+    except IntegrityError:
+        # Ten sam opis zapisany równolegle przez inne żądanie
+        db.session.rollback()
+        return JobPosting.query.filter_by(content_hash=digest).first()
+    except Exception as e:
+        logger.error(f"Error saving job posting: {str(e)}")
+        db.session.rollback()
+        return None
+
+
+def find_job_posting(text):
+    """The stored JobPosting for this job description, or None (never creates one)"""
+    cleaned_text = normalize_job_text(text)
+    if not cleaned_text:
+        return None
+    try:
+        return JobPosting.query.filter_by(content_hash=content_hash(cleaned_text)).first()
+    except Exception as e:
+        logger.error(f"Error reading job posting: {str(e)}")
+        return None
+
+
+def cached_job_posting_analysis(job_description, language):
+    """Stored analysis of this job description in `language`, or None"""
+    posting = find_job_posting(job_description)
+    return posting.get_analysis(language, JOB_ANALYSIS_VERSION, ANALYSIS_TTL) if posting is not None else None
+
+
+def analyze_job_posting_cached(job_description, language, analyze, url=None):
+    """
+    Analysis of a job description, reused across all analyses of the same offer.
+
+    Returns (analysis, posting). On a miss `analyze(job_description, language)`
+    runs; its result is stored on the posting per language only if it matches
+    the job_posting_analysis schema, so an unparsed or truncated answer is
+    returned once and never served again from the database. A new posting
+    is created only for a valid analysis, so failed or rejected calls (e.g.
+    anonymous ones over budget) leave no rows behind.
+    """
+    posting = find_job_posting(job_description)
+    if posting is not None:
+        analysis = posting.get_analysis(language, JOB_ANALYSIS_VERSION, ANALYSIS_TTL)
+        if analysis is not None:
+            return analysis, posting
+
+    analysis = analyze(job_description, language)
+    errors = validate(analysis, 'job_posting_analysis')
+    if errors:
+        logger.warning(f"Job posting analysis not stored: {'; '.join(errors)}")
+        return analysis, posting
+
+    posting = get_or_create_job_posting(job_description, url)
+    if posting is not None:
+        try:
+            posting.set_analysis(language, analysis, JOB_ANALYSIS_VERSION)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error saving job posting analysis: {str(e)}")
+            db.session.rollback()
+    return analysis, posting
@@ -0,0 +1,170 @@
+import os
+import json
+import uuid
+import logging
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+import requests
+
+from models import db, AnalysisJob
+from utils.openrouter_client import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT_ERRORS = (requests.exceptions.Timeout, requests.exceptions.ConnectionError, CircuitOpenError)
+
+
+def is_transient(error):
+    """
+    True if the error (or one it was raised from) may pass on retry.
+
+    Timeouts, connection errors, an open circuit and 429/5xx responses are
+    transient; parse and validation errors would fail the same way again.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, TRANSIENT_ERRORS):
+            return True
+        if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+            status = error.response.status_code
+            if status == 429 or status >= 500:
+                return True
+        # Wyjątki są często opakowywane (raise Exception(...) w bloku except)
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class JobQueue:
+    """
+    Durable queue of AI analyses stored in the application database.
+
+    Works on both SQLite and PostgreSQL: a job is claimed with a conditional
+    UPDATE (status 'queued' -> 'running'), so two workers can never run the
+    same job. A failed job is retried only if the error is transient (see
+    is_transient). While a job runs, the worker refreshes its heartbeat every
+    `heartbeat_interval` seconds; jobs whose heartbeat is older than
+    `stale_after` belong to a crashed worker and are requeued, or failed
+    once they have used up `max_attempts`.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.max_attempts = int(os.environ.get('AI_JOB_MAX_ATTEMPTS', 2))
+        self.heartbeat_interval = int(os.environ.get('AI_JOB_HEARTBEAT_INTERVAL', 15))
+        self.stale_after = int(os.environ.get('AI_JOB_STALE_AFTER', 90))
+
+    def handler(self, job_type):
+        """Register the function that executes jobs of `job_type` (payload dict -> result dict)"""
+        def decorator(f):
+            self.handlers[job_type] = f
+            return f
+        return decorator
+
+    def enqueue(self, job_type, payload, user_id=None, owner_token=None):
+        """owner_token binds an anonymous job (user_id None) to the session that created it"""
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job = AnalysisJob(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            owner_token=owner_token,
+            job_type=job_type,
+            status='queued',
+            payload=json.dumps(payload, ensure_ascii=False)
+        )
+        db.session.add(job)
+        db.session.commit()
+        logger.info(f"Enqueued {job_type} job {job.id}")
+        return job
+
+    def get(self, job_id):
+        return db.session.get(AnalysisJob, job_id)
+
+    def claim_next(self, worker_id):
+        """Atomically take the oldest queued job, or return None if the queue is empty"""
+        candidates = db.session.query(AnalysisJob.id).filter_by(status='queued') \
+            .order_by(AnalysisJob.created_at).limit(5).all()
+        for (job_id,) in candidates:
+            claimed = db.session.query(AnalysisJob) \
+                .filter_by(id=job_id, status='queued') \
+                .update({
+                    'status': 'running',
+                    'worker_id': worker_id,
+                    'started_at': datetime.utcnow(),
+                    'heartbeat_at': datetime.utcnow(),
+                    'attempts': AnalysisJob.attempts + 1
+                }, synchronize_session=False)
+            db.session.commit()
+            if claimed == 1:
+                return db.session.get(AnalysisJob, job_id)
+        return None
+
+    def _heartbeat(self, engine, job_id, worker_id, stop):
+        # Osobne połączenie - sesja db należy do wątku wykonującego zadanie
+        table = AnalysisJob.__table__
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        table.update()
+                        .where(table.c.id == job_id, table.c.worker_id == worker_id, table.c.status == 'running')
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+            except Exception as e:
+                logger.warning(f"Heartbeat of job {job_id} failed: {e}")
+
+    def run(self, job):
+        """Execute a claimed job and store its result or error"""
+        handler = self.handlers.get(job.job_type)
+        stop = threading.Event()
+        threading.Thread(
+            target=self._heartbeat, args=(db.engine, job.id, job.worker_id, stop),
+            daemon=True, name=f'job-heartbeat-{job.id[:8]}'
+        ).start()
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job type: {job.job_type}")
+            result = handler(job.get_payload_json())
+            job.result = json.dumps(result, ensure_ascii=False)
+            job.status = 'done'
+            job.error = None
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Job {job.id} ({job.job_type}) failed: {e}\n{traceback.format_exc()}")
+            job.error = str(e)
+            retry = is_transient(e) and job.attempts < self.max_attempts
+            job.status = 'queued' if retry else 'failed'
+        finally:
+            stop.set()
+        # Zadanie wracające do kolejki nie jest zakończone
+        job.finished_at = datetime.utcnow() if job.status in ('done', 'failed') else None
+        db.session.commit()
+
+    def requeue_stale(self):
+        """Return jobs of workers that stopped sending heartbeats to the queue, or fail them after max_attempts"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        # Wiersze sprzed kolumny heartbeat_at mają tylko started_at
+        stale = db.or_(
+            AnalysisJob.heartbeat_at < cutoff,
+            db.and_(AnalysisJob.heartbeat_at.is_(None), AnalysisJob.started_at < cutoff)
+        )
+        query = db.session.query(AnalysisJob).filter(AnalysisJob.status == 'running', stale)
+        failed = query.filter(AnalysisJob.attempts >= self.max_attempts) \
+            .update({
+                'status': 'failed',
+                'worker_id': None,
+                'error': 'Worker stopped responding',
+                'finished_at': datetime.utcnow()
+            }, synchronize_session=False)
+        requeued = query.filter(AnalysisJob.attempts < self.max_attempts) \
+            .update({'status': 'queued', 'worker_id': None}, synchronize_session=False)
+        db.session.commit()
+        if requeued or failed:
+            logger.warning(f"Stale AI jobs: {requeued} requeued, {failed} failed after {self.max_attempts} attempts")
+        return requeued
+
+
+job_queue = JobQueue()
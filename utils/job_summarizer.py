@@ -0,0 +1,180 @@
+import re
+import logging
+from collections import Counter
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Sekcje ogłoszenia ważne dla optymalizacji CV (nagłówek -> mnożnik wagi zdań w sekcji)
+SECTION_BOOSTS = (
+    (('wymagania', 'oczekujemy', 'requirements', 'qualifications', 'kwalifikacje', 'umiejętności', 'skills',
+      'twój profil', 'your profile', 'must have', 'mile widziane', 'nice to have'), 1.6),
+    (('obowiązki', 'zakres obowiązków', 'twój zakres', 'zadania', 'responsibilities', 'your role', 'what you will do'), 1.4),
+    (('oferujemy', 'benefity', 'we offer', 'benefits'), 1.1),
+    (('o nas', 'o firmie', 'about us', 'about the company', 'klauzula', 'rodo', 'gdpr'), 0.5),
+)
+STOPWORDS = set("""
+a aby ale albo będzie być by czy dla do gdy i ich im jak jako je jego jej jest już lub ma my na nad nas nie niż o od oraz
+po pod przez przy się są ta tak także te tego ten to tu tym w we więc z za ze że która które który których naszego naszej
+nasz nasza nasze twoje twój twoja będziesz oferujemy pracy praca pracę osoba osoby firma firmy bardzo mile widziane
+the and or of to in for with on at by as is are be will you your we our an a this that from have has it its not
+znajomość znajomości doświadczenie doświadczenia minimum lat lata roku poziomie dobra dobrze bardzo umiejętność zespołu
+zespole współpraca pracę danych oraz również min. knowledge experience years good strong ability team work skills
+""".split())
+MAX_SUMMARY_CHARS = 2500
+KEYWORD_COUNT = 5
+# Zdania podobniejsze (cosinus TF-IDF) do już wybranych są pomijane
+REDUNDANCY_THRESHOLD = 0.8
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?;])\s+(?=[A-ZĄĆĘŁŃÓŚŹŻ0-9•\-–])')
+_BULLET = re.compile(r'^\s*(?:[-–•*·▪●]|\d+[.)])\s*')
+_TOKEN = re.compile(r'[a-ząćęłńóśźż][a-ząćęłńóśźż0-9+#.]*[a-ząćęłńóśźż0-9+#]|[a-z]', re.IGNORECASE)
+
+
+def _section_boost(line):
+    lowered = line.lower().strip(' :')
+    if len(lowered) > 60:
+        return None
+    for headers, boost in SECTION_BOOSTS:
+        if any(lowered.startswith(header) or lowered.endswith(header) for header in headers):
+            return boost
+    return None
+
+
+def _segment(text):
+    """Split a posting into (sentence, section boost, section header) units, bullets kept whole"""
+    units = []
+    boost, header = 1.0, None
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        line_boost = _section_boost(line)
+        if line_boost is not None:
+            boost, header = line_boost, line.strip(' :')
+            continue
+        line = _BULLET.sub('', line)
+        for sentence in _SENTENCE_SPLIT.split(line):
+            sentence = sentence.strip()
+            if len(sentence) >= 15:
+                units.append((sentence, boost, header))
+    return units
+
+
+def _tokens(sentence):
+    return [token.lower() for token in _TOKEN.findall(sentence) if token.lower() not in STOPWORDS and len(token) > 2]
+
+
+def _textrank(similarity, damping=0.85, iterations=30):
+    n = similarity.shape[0]
+    np.fill_diagonal(similarity, 0.0)
+    row_sums = similarity.sum(axis=1, keepdims=True)
+    row_sums[row_sums == 0] = 1.0
+    transition = similarity / row_sums
+    ranks = np.full(n, 1.0 / n)
+    for _ in range(iterations):
+        updated = (1 - damping) / n + damping * transition.T.dot(ranks)
+        if np.abs(updated - ranks).sum() < 1e-6:
+            return updated
+        ranks = updated
+    return ranks
+
+
+def _proper_terms(sentences):
+    """Terms written with a capital letter inside a sentence - usually technologies, tools and certificates"""
+    terms = set()
+    for sentence in sentences:
+        for token in _TOKEN.findall(sentence)[1:]:
+            if token[0].isupper() or token.isupper():
+                terms.add(token.lower())
+    return terms
+
+
+def _top_terms(documents, boosts, proper_terms, count):
+    document_frequency = Counter(term for tokens in documents for term in set(tokens))
+    if not document_frequency:
+        return []
+    n = len(documents)
+    weights = Counter()
+    for tokens, boost in zip(documents, boosts):
+        for term, frequency in Counter(tokens).items():
+            weight = boost * frequency * np.log(1 + n / document_frequency[term])
+            weights[term] += weight * 2 if term in proper_terms else weight
+    return [term for term, _ in weights.most_common(count)]
+
+
+def extract_keywords(text, count=KEYWORD_COUNT):
+    """Most characteristic terms of a posting (the same ones as in the summary's KLUCZOWE SŁOWA line)"""
+    units = _segment(text)
+    documents = [_tokens(sentence) for sentence, _, _ in units]
+    boosts = [boost for _, boost, _ in units]
+    return _top_terms(documents, boosts, _proper_terms(sentence for sentence, _, _ in units), count)
+
+
+def summarize(text, max_chars=MAX_SUMMARY_CHARS, keyword_count=KEYWORD_COUNT):
+    """
+    Extractive summary of a job posting, with a "KLUCZOWE SŁOWA:" line.
+
+    Sentences (and bullet points) are vectorized with TF-IDF, ranked with
+    TextRank over their cosine similarity, weighted up in requirement /
+    duty / offer sections and down in company boilerplate, then the best
+    non-redundant ones are kept in original order, under their section
+    headers, until max_chars is reached. Keywords are the top TF-IDF terms,
+    preferring capitalized ones (technologies, tools).
+    """
+    units = _segment(text)
+    if not units:
+        return text[:max_chars]
+
+    documents = [_tokens(sentence) for sentence, _, _ in units]
+    vocabulary = {term: index for index, term in enumerate(sorted({term for tokens in documents for term in tokens}))}
+    boosts = np.array([boost for _, boost, _ in units])
+
+    if vocabulary and len(units) > 1:
+        counts = np.zeros((len(units), len(vocabulary)))
+        for row, tokens in enumerate(documents):
+            for term in tokens:
+                counts[row, vocabulary[term]] += 1
+        idf = np.log((1 + len(units)) / (1 + (counts > 0).sum(axis=0))) + 1
+        tfidf = counts * idf
+        norms = np.linalg.norm(tfidf, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = tfidf / norms
+        similarity = vectors.dot(vectors.T)
+        ranks = _textrank(similarity.copy())
+    else:
+        similarity = np.eye(len(units))
+        ranks = np.ones(len(units))
+
+    # Lekka premia za pozycję - początek ogłoszenia zwykle opisuje stanowisko
+    position = 1.0 + 0.2 * (1 - np.arange(len(units)) / len(units))
+    scores = ranks * boosts * position
+
+    selected = set()
+    length = 0
+    for index in np.argsort(-scores):
+        sentence_length = len(units[index][0]) + 1
+        if length + sentence_length > max_chars and selected:
+            continue
+        # Pomijaj powtórzenia (ta sama treść w wersji mobilnej i desktopowej strony, powtórzone sekcje)
+        if selected and similarity[index, list(selected)].max() > REDUNDANCY_THRESHOLD:
+            continue
+        selected.add(int(index))
+        length += sentence_length
+
+    lines = []
+    current_header = None
+    for index, (sentence, _, header) in enumerate(units):
+        if index not in selected:
+            continue
+        if header and header != current_header:
+            lines.append(f"{header}:")
+            current_header = header
+        lines.append(f"- {sentence}" if header else sentence)
+
+    terms = _top_terms(documents, list(boosts), _proper_terms(sentence for sentence, _, _ in units), keyword_count)
+    if terms:
+        lines.append('')
+        lines.append(f"KLUCZOWE SŁOWA: {', '.join(terms)}")
+    return '\n'.join(lines)
@@ -0,0 +1,229 @@
+import json
+import logging
+
+from utils.llm_profiles import strip_think
+
+logger = logging.getLogger(__name__)
+
+# Wymagane pola odpowiedzi JSON dla zadań AI (pole -> typ lub krotka typów)
+TASK_SCHEMAS = {
+    'optimize': {'optimized_cv': str},
+    'position_optimization': {'optimized_cv': str},
+    'advanced_position_optimization': {'optimized_cv': str},
+    'apply_recruiter_feedback': {'improved_cv': str},
+    'cv_generation': {'professional_title': str, 'professional_summary': str, 'experience_suggestions': list},
+    'cv_score': {'score': (int, float, str)},
+    'job_posting_analysis': {'job_title': str},
+    'job_enhance': {'job_title': str},
+}
+
+_BARE_WORDS = {'True': 'true', 'False': 'false', 'None': 'null', 'undefined': 'null'}
+_VALID_ESCAPES = set('"\\/bfnrtu')
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+class JSONExtractor:
+    """
+    Single-pass, incremental JSON extractor for LLM output.
+
+    Feed text as it arrives (streamed tokens or a whole completion). Text
+    before the first '{' (prose, code fences) is skipped, and common defects
+    are repaired on the fly: trailing commas, Python literals (True/None),
+    invalid escapes and mismatched closing brackets. `partial()` returns the
+    object parsed so far, with open strings and containers closed, so
+    truncated or still-streaming output is usable; `result()` returns the
+    complete object once the top-level value has been closed.
+    """
+
+    def __init__(self, start_chars='{'):
+        self.start_chars = start_chars
+        self.out = []
+        self.stack = []
+        self.expect = []
+        self.started = False
+        self.done = False
+        self.in_string = False
+        self.string_is_key = False
+        self.escaped = False
+        self.bare = ''
+        self.last_safe = 0
+
+    def feed(self, text):
+        """Consume more text; returns True once the top-level value is complete"""
+        for char in text:
+            if self.done:
+                break
+            self._step(char)
+        return self.done
+
+    def _step(self, char):
+        if not self.started:
+            if char in self.start_chars:
+                self.started = True
+                self._open(char)
+            return
+
+        if self.in_string:
+            if self.escaped:
+                self.escaped = False
+                if char not in _VALID_ESCAPES:
+                    # Nieprawidłowa sekwencja (np. \_) - zostaw sam znak
+                    self.out.pop()
+                self.out.append(char)
+            elif char == '\\':
+                self.escaped = True
+                self.out.append(char)
+            elif char == '"':
+                self.in_string = False
+                self.out.append(char)
+                if self.string_is_key:
+                    self.expect[-1] = 'colon'
+                else:
+                    self._value_done()
+            else:
+                self.out.append(char)
+            return
+
+        if self.bare and not (char.isalnum() or char in '.+-_'):
+            self._flush_bare()
+            if self.done:
+                return
+
+        if char.isspace():
+            return
+        if char == '"':
+            self.in_string = True
+            self.string_is_key = self.stack[-1] == '{' and self.expect[-1] in ('key', 'comma')
+            if self.expect[-1] == 'comma':
+                # Brakujący przecinek między elementami
+                self.out.append(',')
+            self.out.append(char)
+        elif char in '{[':
+            if self.expect[-1] == 'comma':
+                self.out.append(',')
+            self._open(char)
+        elif char in '}]':
+            opener = '{' if char == '}' else '['
+            if self.stack[-1] != opener and opener in self.stack:
+                # Brakujący nawias zamykający (np. "[1, 2}") - zamknij też wewnętrzne kontenery
+                while self.stack[-1] != opener:
+                    self._close()
+            self._close()
+        elif char == ':':
+            if self.stack[-1] == '{':
+                self.expect[-1] = 'value'
+                self.out.append(char)
+        elif char == ',':
+            if self.expect[-1] == 'comma':
+                self.expect[-1] = 'key' if self.stack[-1] == '{' else 'value'
+                self.out.append(char)
+        else:
+            self.bare += char
+
+    def _open(self, char):
+        self.stack.append(char)
+        self.expect.append('key' if char == '{' else 'value')
+        self.out.append(char)
+        self.last_safe = len(self.out)
+
+    def _close(self):
+        if self.out and self.out[-1] == ',':
+            self.out.pop()
+        if self.stack[-1] == '{' and self.expect[-1] in ('colon', 'value'):
+            # Klucz bez wartości - usuń go razem z poprzedzającym przecinkiem
+            del self.out[self.last_safe:]
+            if self.out and self.out[-1] == ',':
+                self.out.pop()
+        opener = self.stack.pop()
+        self.expect.pop()
+        self.out.append(_CLOSERS[opener])
+        self._value_done()
+
+    def _flush_bare(self):
+        word = _BARE_WORDS.get(self.bare, self.bare)
+        self.bare = ''
+        if self.expect[-1] == 'comma':
+            self.out.append(',')
+        self.out.append(word)
+        self._value_done()
+
+    def _value_done(self):
+        if not self.stack:
+            self.done = True
+        else:
+            self.expect[-1] = 'comma'
+        self.last_safe = len(self.out)
+
+    def _closing_suffix(self):
+        return ''.join(_CLOSERS[opener] for opener in reversed(self.stack))
+
+    def result(self):
+        """The complete parsed value, or None if it has not been closed yet"""
+        if not self.done:
+            return None
+        try:
+            return json.loads(''.join(self.out), strict=False)
+        except json.JSONDecodeError as e:
+            logger.debug(f"Repaired JSON still invalid: {e}")
+            return None
+
+    def partial(self):
+        """Best-effort parse of everything seen so far (closes open strings and containers)"""
+        if self.done:
+            return self.result()
+        if not self.started:
+            return None
+        if self.in_string and not self.string_is_key:
+            text = ''.join(self.out)
+            if self.escaped:
+                text = text[:-1]
+            text += '"'
+        else:
+            text = ''.join(self.out[:self.last_safe])
+        text = text.rstrip(',') + self._closing_suffix()
+        try:
+            return json.loads(text, strict=False)
+        except json.JSONDecodeError:
+            return None
+
+
+def validate(value, task):
+    """Return a list of schema violations for the task (empty if valid or no schema)"""
+    schema = TASK_SCHEMAS.get(task)
+    if not schema:
+        return []
+    if not isinstance(value, dict):
+        return ['expected a JSON object']
+    errors = []
+    for field, expected_type in schema.items():
+        if field not in value:
+            errors.append(f"missing field '{field}'")
+        elif not isinstance(value[field], expected_type):
+            errors.append(f"field '{field}' has wrong type")
+    return errors
+
+
+def extract_json(text, task=None, allow_partial=False):
+    """
+    Extract a JSON object from an LLM completion.
+
+    Handles <think> blocks, code fences, surrounding prose and the defects
+    repaired by JSONExtractor. With allow_partial, truncated output yields
+    the object parsed so far. Returns None if nothing usable was found or
+    the object does not match the task's schema.
+    """
+    if not isinstance(text, str):
+        return text if isinstance(text, dict) else None
+    answer, _ = strip_think(text)
+    extractor = JSONExtractor()
+    extractor.feed(answer)
+    value = extractor.result()
+    if value is None and allow_partial:
+        value = extractor.partial()
+    if value is None:
+        return None
+    errors = validate(value, task)
+    if errors:
+        logger.warning(f"AI JSON for task {task} does not match schema: {'; '.join(errors)}")
+        return None
+    return value
@@ -0,0 +1,110 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from utils.cache_backends import create_backend
+
+logger = logging.getLogger(__name__)
+
+# Czas życia odpowiedzi w sekundach dla poszczególnych zadań
+TASK_TTLS = {
+    'optimize': 6 * 3600,
+    'advanced_position_optimization': 6 * 3600,
+    'position_optimization': 6 * 3600,
+    'apply_recruiter_feedback': 6 * 3600,
+    'cv_generation': 3600,
+    'cover_letter': 6 * 3600,
+    'feedback': 24 * 3600,
+    'cv_score': 24 * 3600,
+    'ats_check': 24 * 3600,
+    'keyword_analysis': 24 * 3600,
+    'grammar_check': 24 * 3600,
+    'interview_questions': 24 * 3600,
+    'interview_tips': 24 * 3600,
+    'cv_strengths': 24 * 3600,
+    'job_posting_analysis': 7 * 24 * 3600,
+    'job_summary': 7 * 24 * 3600,
+    'job_enhance': 7 * 24 * 3600,
+}
+DEFAULT_TTL = int(os.environ.get('LLM_CACHE_DEFAULT_TTL', 12 * 3600))
+
+_bypass = ContextVar('llm_cache_bypass', default=False)
+
+
+class LLMCache:
+    """
+    Content-addressed cache for LLM completions.
+
+    Keys are a SHA-256 of everything that determines the completion (model,
+    prompts, sampling parameters, language), so identical requests from any
+    worker are answered without another OpenRouter round trip.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.counters = {'hits': 0, 'misses': 0, 'writes': 0, 'bypassed': 0}
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    @staticmethod
+    def make_key(model, system_prompt, prompt, max_tokens, temperature, language):
+        material = json.dumps(
+            [model, system_prompt, prompt, max_tokens, temperature, language],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        value = self.backend.get(key)
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value, task=None):
+        if not self.enabled or not value:
+            return
+        self.backend.set(key, value, TASK_TTLS.get(task, DEFAULT_TTL))
+        self._count('writes')
+
+    @contextmanager
+    def bypassed(self):
+        """Skip cache lookups (but still store fresh results) inside this block"""
+        token = _bypass.set(True)
+        try:
+            yield
+        finally:
+            _bypass.reset(token)
+
+    def is_bypassed(self):
+        return _bypass.get()
+
+    def record_bypass(self):
+        self._count('bypassed')
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['backend'] = self.backend.name if self.enabled else 'none'
+        stats['entries'] = self.backend.size() if self.enabled else 0
+        return stats
+
+
+llm_cache = LLMCache(create_backend(
+    os.environ.get('LLM_CACHE_BACKEND', 'sqlite'),
+    'llm_cache',
+    int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 5000))
+))
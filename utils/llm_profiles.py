@@ -0,0 +1,194 @@
+import os
+import re
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "qwen/qwen-2.5-72b-instruct:free"
+
+# Klasy modeli - profile wskazują klasę, a konkretny model ustawia się w zmiennych środowiskowych
+MODEL_CLASSES = {
+    'light': os.environ.get('LLM_MODEL_LIGHT', 'meta-llama/llama-3.1-8b-instruct:free'),
+    'standard': os.environ.get('LLM_MODEL_STANDARD', 'mistralai/mistral-small-3.1-24b-instruct:free'),
+    'heavy': os.environ.get('LLM_MODEL_HEAVY', DEFAULT_MODEL),
+}
+
+# Poziom dostępu bieżącego użytkownika: free, paid (9,99 PLN) lub premium (29,99 PLN/miesiąc)
+TIERS = ('free', 'paid', 'premium')
+_tier = ContextVar('llm_tier', default=None)
+
+# Profil zadania AI:
+#   reasoning        - czy model ma rozumować w sekcji <think> przed odpowiedzią
+#   reasoning_budget - limit tokenów na rozumowanie (doliczany do max_tokens)
+#   max_tokens       - limit tokenów na właściwą odpowiedź (funkcja może go nadpisać, np. dla premium)
+#   temperature      - niżej dla analiz i ekstrakcji, wyżej dla tekstów kreatywnych
+#   model            - klasa modelu (light / standard / heavy) lub pełny identyfikator modelu OpenRouter
+DEFAULT_PROFILE = {
+    'reasoning': False,
+    'reasoning_budget': 0,
+    'max_tokens': 2000,
+    'temperature': 0.7,
+    'model': 'heavy',
+}
+
+TASK_PROFILES = {
+    # Przepisywanie CV - jakość ważniejsza niż czas, rozumowanie się opłaca
+    'optimize': {'reasoning': True, 'reasoning_budget': 1500, 'max_tokens': 3000, 'temperature': 0.7, 'model': 'heavy'},
+    'advanced_position_optimization': {'reasoning': True, 'reasoning_budget': 1500, 'max_tokens': 4000, 'temperature': 0.7, 'model': 'heavy'},
+    'apply_recruiter_feedback': {'reasoning': True, 'reasoning_budget': 1000, 'max_tokens': 4000, 'temperature': 0.6, 'model': 'heavy'},
+    'position_optimization': {'reasoning': False, 'max_tokens': 2500, 'temperature': 0.7, 'model': 'heavy'},
+    'cv_generation': {'reasoning': False, 'max_tokens': 4000, 'temperature': 0.8, 'model': 'heavy'},
+    'cover_letter': {'reasoning': False, 'max_tokens': 2000, 'temperature': 0.8, 'model': 'standard'},
+    # Oceny - krótkie rozumowanie poprawia spójność punktacji
+    'feedback': {'reasoning': True, 'reasoning_budget': 800, 'max_tokens': 2000, 'temperature': 0.5, 'model': 'standard'},
+    'cv_score': {'reasoning': True, 'reasoning_budget': 800, 'max_tokens': 2500, 'temperature': 0.3, 'model': 'standard'},
+    'ats_check': {'reasoning': True, 'reasoning_budget': 600, 'max_tokens': 1800, 'temperature': 0.3, 'model': 'standard'},
+    # Proste analizy i ekstrakcja - bez rozumowania, mały szybki model
+    'keyword_analysis': {'reasoning': False, 'max_tokens': 2000, 'temperature': 0.3, 'model': 'light'},
+    'grammar_check': {'reasoning': False, 'max_tokens': 1500, 'temperature': 0.2, 'model': 'light'},
+    'cv_strengths': {'reasoning': False, 'max_tokens': 2500, 'temperature': 0.5, 'model': 'standard'},
+    'interview_tips': {'reasoning': False, 'max_tokens': 2000, 'temperature': 0.7, 'model': 'standard'},
+    'interview_questions': {'reasoning': False, 'max_tokens': 2000, 'temperature': 0.7, 'model': 'standard'},
+    'job_posting_analysis': {'reasoning': False, 'max_tokens': 2000, 'temperature': 0.2, 'model': 'light'},
+    'job_summary': {'reasoning': False, 'max_tokens': 1500, 'temperature': 0.3, 'model': 'light'},
+    'job_enhance': {'reasoning': False, 'max_tokens': 1000, 'temperature': 0.2, 'model': 'light'},
+}
+
+# Nadpisania profili dla poziomów dostępu ('*' dotyczy wszystkich zadań danego poziomu)
+TIER_PROFILES = {
+    'free': {
+        # Darmowy podgląd ze znakiem wodnym nie potrzebuje największego modelu
+        'optimize': {'model': 'standard', 'reasoning': False},
+    },
+    'paid': {},
+    'premium': {
+        'cover_letter': {'model': 'heavy'},
+        'feedback': {'model': 'heavy'},
+        'cv_score': {'model': 'heavy'},
+    },
+}
+
+
+def _load_overrides():
+    """
+    Optional JSON overrides by task or tier:task, e.g.
+    LLM_TASK_PROFILES='{"feedback": {"reasoning": false}, "premium:grammar_check": {"model": "standard"}}'
+    """
+    raw = os.environ.get('LLM_TASK_PROFILES')
+    if not raw:
+        return {}
+    try:
+        overrides = json.loads(raw)
+        return overrides if isinstance(overrides, dict) else {}
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid LLM_TASK_PROFILES: {e}")
+        return {}
+
+
+_overrides = _load_overrides()
+
+
+@contextmanager
+def model_tier(tier):
+    """Select tier-specific profiles for AI calls made inside this block"""
+    token = _tier.set(tier if tier in TIERS else None)
+    try:
+        yield
+    finally:
+        _tier.reset(token)
+
+
+def current_tier():
+    return _tier.get()
+
+
+def resolve_model(model):
+    return MODEL_CLASSES.get(model, model)
+
+
+def get_profile(task, tier=None):
+    """
+    Return the effective profile for a task.
+
+    Precedence: DEFAULT_PROFILE < TASK_PROFILES < TIER_PROFILES (tier '*',
+    then tier task) < LLM_TASK_PROFILES (task, then tier:task). The tier
+    defaults to the one set by model_tier().
+    """
+    tier = tier or _tier.get()
+    tier_profiles = TIER_PROFILES.get(tier, {})
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(TASK_PROFILES.get(task, {}))
+    profile.update(tier_profiles.get('*', {}))
+    profile.update(tier_profiles.get(task, {}))
+    profile.update(_overrides.get(task, {}))
+    if tier:
+        profile.update(_overrides.get(f'{tier}:{task}', {}))
+    profile['model'] = resolve_model(profile['model'])
+    if not profile['reasoning']:
+        profile['reasoning_budget'] = 0
+    return profile
+
+
+_THINK_BLOCK = re.compile(r'<think>(.*?)(?:</think>|$)', re.DOTALL)
+
+
+def strip_think(text):
+    """
+    Split a completion into (answer, reasoning).
+
+    Removes every <think>...</think> block, including an unterminated one
+    cut off by max_tokens.
+    """
+    if not text or '<think>' not in text:
+        return text, ''
+    reasoning = ''.join(_THINK_BLOCK.findall(text))
+    return _THINK_BLOCK.sub('', text).strip(), reasoning
+
+
+class ReasoningStats:
+    """Per-task token accounting: how much of each completion was spent on <think> reasoning"""
+
+    def __init__(self):
+        self.tasks = {}
+        self.lock = threading.Lock()
+
+    def record(self, task, raw_text, reasoning_text, usage=None, latency=None):
+        usage = usage or {}
+        completion_tokens = usage.get('completion_tokens')
+        reasoning_tokens = (usage.get('completion_tokens_details') or {}).get('reasoning_tokens')
+        if not reasoning_tokens and reasoning_text:
+            # Brak rozbicia w usage - szacujemy proporcjonalnie do długości tekstu
+            if completion_tokens and raw_text:
+                reasoning_tokens = round(completion_tokens * len(reasoning_text) / len(raw_text))
+            else:
+                reasoning_tokens = len(reasoning_text) // 4
+        if completion_tokens is None:
+            completion_tokens = len(raw_text or '') // 4
+
+        with self.lock:
+            entry = self.tasks.setdefault(task or 'default', {
+                'calls': 0, 'completion_tokens': 0, 'reasoning_tokens': 0, 'total_latency': 0.0
+            })
+            entry['calls'] += 1
+            entry['completion_tokens'] += completion_tokens
+            entry['reasoning_tokens'] += reasoning_tokens or 0
+            entry['total_latency'] += latency or 0.0
+
+    def stats(self):
+        with self.lock:
+            snapshot = {task: dict(entry) for task, entry in self.tasks.items()}
+        for task, entry in snapshot.items():
+            calls = entry['calls']
+            entry['avg_reasoning_tokens'] = round(entry['reasoning_tokens'] / calls) if calls else 0
+            entry['reasoning_share'] = round(entry['reasoning_tokens'] / entry['completion_tokens'], 3) \
+                if entry['completion_tokens'] else 0.0
+            entry['avg_latency'] = round(entry.pop('total_latency') / calls, 2) if calls else 0.0
+            entry['profile'] = get_profile(task)
+        return snapshot
+
+
+reasoning_stats = ReasoningStats()
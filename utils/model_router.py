@@ -0,0 +1,233 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from utils.llm_profiles import MODEL_CLASSES
+
+logger = logging.getLogger(__name__)
+
+# Czy bieżące zapytanie może wysłać zapasową kopię do drugiego modelu (tylko płacący użytkownicy)
+_hedging = ContextVar('model_router_hedging', default=False)
+
+
+class ModelStats:
+    """Rolling latency and error window for one model"""
+
+    def __init__(self, window=100, error_window=20):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=error_window)
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    def percentile(self, p):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+
+class ModelRouter:
+    """
+    Routes completions across a primary model and fallbacks.
+
+    Fallbacks are chosen per primary model (`model_fallbacks`, built from
+    the model classes), so a light task never fails over or hedges to a
+    heavy model; `fallback_models` covers primaries outside the classes.
+    Tracks rolling p50/p95 latency and error rate per model. A model with
+    too many errors is taken out of rotation for `cooldown` seconds
+    (automatic failover). Inside `hedging()` a request still running after
+    the primary's p95 gets a duplicate on the next healthy model, and the
+    first successful answer wins.
+    """
+
+    def __init__(self, fallback_models=None, model_fallbacks=None, hedge_min_delay=5.0, hedge_default_delay=30.0,
+                 min_samples=10, error_threshold=0.5, failure_threshold=3, cooldown=60.0, max_workers=8):
+        self.fallback_models = fallback_models or []
+        self.model_fallbacks = model_fallbacks or {}
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.min_samples = min_samples
+        self.error_threshold = error_threshold
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.models = {}
+        self.counters = {'hedges': 0, 'hedge_wins': 0, 'failovers': 0}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='model-router')
+
+    def _stats(self, model):
+        stats = self.models.get(model)
+        if stats is None:
+            stats = self.models[model] = ModelStats()
+        return stats
+
+    def record(self, model, latency, ok):
+        with self.lock:
+            stats = self._stats(model)
+            stats.outcomes.append(ok)
+            if ok:
+                stats.latencies.append(latency)
+                stats.consecutive_failures = 0
+                return
+            stats.consecutive_failures += 1
+            too_many_errors = len(stats.outcomes) >= self.min_samples and stats.error_rate() >= self.error_threshold
+            if stats.consecutive_failures >= self.failure_threshold or too_many_errors:
+                stats.unhealthy_until = time.monotonic() + self.cooldown
+                logger.warning(f"Model {model} marked unhealthy for {self.cooldown:.0f}s "
+                               f"(error rate {stats.error_rate():.0%})")
+
+    def is_healthy(self, model):
+        with self.lock:
+            return self._stats(model).unhealthy_until <= time.monotonic()
+
+    def fallbacks_for(self, primary):
+        return self.model_fallbacks.get(primary, self.fallback_models)
+
+    def candidates(self, primary):
+        """Primary first, then its fallbacks; unhealthy models go to the end of the list"""
+        models = list(dict.fromkeys([primary] + self.fallbacks_for(primary)))
+        healthy = [model for model in models if self.is_healthy(model)]
+        return healthy + [model for model in models if model not in healthy]
+
+    def hedge_delay(self, model):
+        with self.lock:
+            stats = self._stats(model)
+            p95 = stats.percentile(95) if len(stats.latencies) >= self.min_samples else None
+        return max(self.hedge_min_delay, p95 if p95 is not None else self.hedge_default_delay)
+
+    @contextmanager
+    def hedging(self, enabled=True):
+        """Allow hedged duplicate requests for calls made inside this block"""
+        token = _hedging.set(enabled)
+        try:
+            yield
+        finally:
+            _hedging.reset(token)
+
+    def _timed(self, model, fn):
+        started = time.monotonic()
+        try:
+            result = fn(model)
+        except Exception:
+            self.record(model, time.monotonic() - started, False)
+            raise
+        self.record(model, time.monotonic() - started, True)
+        return result
+
+    def call(self, primary, fn, hedge=True):
+        """
+        Run fn(model) -> result on the best available model.
+
+        Failures move on to the next candidate model; the last error is
+        raised when every model failed.
+        """
+        models = self.candidates(primary)
+        hedge = hedge and _hedging.get() and len(models) > 1
+        last_error = None
+        index = 0
+        while index < len(models):
+            model = models[index]
+            if index > 0:
+                with self.lock:
+                    self.counters['failovers'] += 1
+                logger.warning(f"Failing over to model {model}")
+            try:
+                if hedge and index + 1 < len(models):
+                    return self._hedged_call(model, models[index + 1], fn)
+                return self._timed(model, fn)
+            except Exception as e:
+                last_error = e
+                logger.error(f"Model {model} failed: {str(e)}")
+            # Wariant z hedgingiem zużył też kolejny model
+            index += 2 if hedge and index + 1 < len(models) else 1
+        raise last_error
+
+    def _hedged_call(self, primary, secondary, fn):
+        context = copy_context()
+        first = self.executor.submit(context.copy().run, self._timed, primary, fn)
+        futures = {first: primary}
+        done, _ = wait(futures, timeout=self.hedge_delay(primary))
+        if not done or first.exception() is not None:
+            with self.lock:
+                self.counters['hedges' if not done else 'failovers'] += 1
+            if not done:
+                logger.info(f"Model {primary} slower than its p95, hedging with {secondary}")
+            futures[self.executor.submit(context.copy().run, self._timed, secondary, fn)] = secondary
+
+        pending = set(futures)
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if futures[future] != primary:
+                    with self.lock:
+                        self.counters['hedge_wins'] += 1
+                # Przegrany wątek kończy się w tle - jego czas i tak trafia do statystyk
+                return result
+        raise last_error
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            snapshot = dict(self.counters)
+            models = {}
+            for model, stats in self.models.items():
+                p50, p95 = stats.percentile(50), stats.percentile(95)
+                models[model] = {
+                    'samples': len(stats.latencies),
+                    'p50': round(p50, 2) if p50 is not None else None,
+                    'p95': round(p95, 2) if p95 is not None else None,
+                    'error_rate': round(stats.error_rate(), 3),
+                    'healthy': stats.unhealthy_until <= now
+                }
+        snapshot['models'] = models
+        snapshot['fallback_models'] = self.fallback_models
+        snapshot['model_fallbacks'] = self.model_fallbacks
+        return snapshot
+
+
+def _models_from_env(name, default):
+    return [model.strip() for model in os.environ.get(name, default).split(',') if model.strip()]
+
+
+# Modele zapasowe każdej klasy (llm_profiles.MODEL_CLASSES) - failover i hedging zostają w tej samej klasie
+CLASS_FALLBACKS = {
+    'light': _models_from_env('OPENROUTER_FALLBACK_MODELS_LIGHT', 'google/gemma-2-9b-it:free'),
+    'standard': _models_from_env('OPENROUTER_FALLBACK_MODELS_STANDARD', 'google/gemma-3-27b-it:free'),
+    'heavy': _models_from_env('OPENROUTER_FALLBACK_MODELS_HEAVY', 'meta-llama/llama-3.3-70b-instruct:free'),
+}
+
+
+def class_fallbacks(model_classes, fallbacks):
+    """Primary model -> fallbacks of its class (models shared by several classes get all of them)"""
+    by_model = {}
+    for model_class, model in model_classes.items():
+        merged = by_model.setdefault(model, [])
+        merged.extend(fallback for fallback in fallbacks.get(model_class, []) if fallback not in merged)
+    return by_model
+
+
+model_router = ModelRouter(
+    # Modele spoza klas (pełny identyfikator w LLM_TASK_PROFILES)
+    fallback_models=_models_from_env('OPENROUTER_FALLBACK_MODELS', 'meta-llama/llama-3.3-70b-instruct:free'),
+    model_fallbacks=class_fallbacks(MODEL_CLASSES, CLASS_FALLBACKS),
+    hedge_min_delay=float(os.environ.get('OPENROUTER_HEDGE_MIN_DELAY', 5)),
+    hedge_default_delay=float(os.environ.get('OPENROUTER_HEDGE_DEFAULT_DELAY', 30)),
+    cooldown=float(os.environ.get('OPENROUTER_MODEL_COOLDOWN', 60))
+)
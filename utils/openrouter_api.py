@@ -1,9 +1,21 @@
 import os
 import json
+import time
 import logging
 import requests
 import urllib.parse
-from bs4 import BeautifulSoup
+from contextlib import contextmanager
+from contextvars import ContextVar
+from utils.openrouter_client import openrouter_client, OPENROUTER_BASE_URL
+from utils.llm_cache import llm_cache
+from utils.single_flight import single_flight
+from utils.llm_profiles import DEFAULT_MODEL, get_profile, strip_think, reasoning_stats
+from utils.model_router import model_router
+from utils.token_budget import token_budget, estimate_tokens
+from utils.json_extractor import TASK_SCHEMAS, JSONExtractor, validate, extract_json
+from utils.job_page_cache import job_page_cache
+from utils.job_sites import extract_posting, normalize_job_text, QUALITY_THRESHOLD
+from utils.job_summarizer import summarize as summarize_locally
 
 logger = logging.getLogger(__name__)
 
@@ -15,20 +27,247 @@ if OPENROUTER_API_KEY:
 else:
     logger.error("OpenRouter API key is empty or not found in environment variables")
 
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
-MODEL = "qwen/qwen-2.5-72b-instruct:free"
+MODEL = DEFAULT_MODEL
 
 DEEP_REASONING_PROMPT = """You are a deep thinking AI, you may use extremely long chains of thought to deeply consider the problem and deliberate with yourself via systematic reasoning processes to help come to a correct solution prior to answering. You should enclose your thoughts and internal monologue inside <think> </think> tags, and then provide your solution or response to the problem."""
 
+REASONING_BUDGET_PROMPT = "Keep your reasoning inside <think> </think> under {budget} tokens, then give the complete answer."
+
+CONTINUE_PROMPT = "Your previous answer was cut off. Continue exactly where it stopped, without repeating anything and without any introduction."
+
+JSON_REPAIR_PROMPT = "Your previous answer is not valid JSON in the requested format ({errors}). Return the complete answer again as ONLY one valid JSON object with the requested fields, without any other text."
+
+# Maksymalna liczba dopisań do odpowiedzi uciętej na max_tokens
+MAX_CONTINUATIONS = int(os.environ.get('LLM_MAX_CONTINUATIONS', 3))
+
+# Podsumowanie długich ogłoszeń: local (ekstrakcyjne, bez wywołania AI) lub llm
+JOB_SUMMARY_ENGINE = os.environ.get('JOB_SUMMARY_ENGINE', 'local')
+
 headers = {
     "Content-Type": "application/json",
     "Authorization": f"Bearer {OPENROUTER_API_KEY}",
     "HTTP-Referer": "https://cv-optimizer-pro.repl.co/"
 }
 
-def send_api_request(prompt, max_tokens=2000, language='pl'):
+# Odbiorca tokenów dla trybu strumieniowego (ustawiany przez stream_tokens_to)
+_stream_sink = ContextVar('openrouter_stream_sink', default=None)
+_stream_replace = ContextVar('openrouter_stream_replace', default=None)
+# Ile początkowych znaków kontynuacji porównujemy z końcem poprzedniej części
+OVERLAP_WINDOW = 200
+
+
+class ThinkTagFilter:
+    """
+    Incrementally hides <think>...</think> sections from streamed text.
+
+    Tags may be split across chunks, so a possible partial tag at the end of a
+    chunk is held back until the next chunk decides what it is.
+    """
+
+    OPEN_TAG = '<think>'
+    CLOSE_TAG = '</think>'
+
+    def __init__(self):
+        self.buffer = ''
+        self.in_think = False
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        visible = []
+        while self.buffer:
+            tag = self.CLOSE_TAG if self.in_think else self.OPEN_TAG
+            index = self.buffer.find(tag)
+            if index != -1:
+                if not self.in_think:
+                    visible.append(self.buffer[:index])
+                self.buffer = self.buffer[index + len(tag):]
+                self.in_think = not self.in_think
+                continue
+
+            # Zatrzymaj możliwy początek znacznika do następnego fragmentu
+            keep = 0
+            for size in range(min(len(tag) - 1, len(self.buffer)), 0, -1):
+                if tag.startswith(self.buffer[-size:]):
+                    keep = size
+                    break
+            if not self.in_think:
+                visible.append(self.buffer[:len(self.buffer) - keep])
+            self.buffer = self.buffer[len(self.buffer) - keep:]
+            break
+        return ''.join(visible)
+
+    def flush(self):
+        rest = '' if self.in_think else self.buffer
+        self.buffer = ''
+        return rest
+
+
+@contextmanager
+def stream_tokens_to(callback, replace=None):
+    """
+    Stream completions produced inside this block.
+
+    Every send_api_request call made in the block uses OpenRouter's
+    `stream: true` mode and passes visible (non-<think>) text to `callback`
+    as it arrives. The full completion is still returned and cached. If the
+    streamed answer is later replaced (by a JSON repair request), `replace`
+    is called with the whole new visible text.
+    """
+    token = _stream_sink.set(callback)
+    replace_token = _stream_replace.set(replace)
+    try:
+        yield
+    finally:
+        _stream_replace.reset(replace_token)
+        _stream_sink.reset(token)
+
+
+class _StreamRelay:
+    """
+    Passes the streamed deltas of one completion and its continuations to the sink.
+
+    One ThinkTagFilter spans all parts, so reasoning cut off by max_tokens
+    stays hidden when the continuation goes on with it. The first
+    OVERLAP_WINDOW characters of each continuation are held back until the
+    text the model repeated from the previous part has been dropped.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.think_filter = ThinkTagFilter()
+        self.previous = None
+        self.pending = ''
+
+    def start_continuation(self, previous):
+        self.previous = previous
+        self.pending = ''
+
+    def feed(self, delta):
+        if self.previous is not None:
+            self.pending += delta
+            if len(self.pending) < OVERLAP_WINDOW:
+                return
+            delta = self._release()
+        self._emit(delta)
+
+    def end_part(self):
+        # Kontynuacja krótsza niż okno - wysyłamy to, co zostało po usunięciu powtórzenia
+        if self.previous is not None:
+            self._emit(self._release())
+
+    def finish(self):
+        self.end_part()
+        rest = self.think_filter.flush()
+        if rest:
+            self.sink(rest)
+
+    def _release(self):
+        text = self.pending[_continuation_overlap(self.previous, self.pending):]
+        self.previous = None
+        self.pending = ''
+        return text
+
+    def _emit(self, text):
+        visible = self.think_filter.feed(text)
+        if visible:
+            self.sink(visible)
+
+
+def _stream_completion(payload, on_delta):
+    """Read an SSE chat completion, pass raw text deltas to on_delta and return (content, usage, finish_reason)"""
+    response = openrouter_client.post(dict(payload, stream=True, usage={'include': True}), headers, stream=True)
+    parts = []
+    usage = None
+    finish_reason = None
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            event = json.loads(data)
+            if 'error' in event:
+                raise ValueError(f"OpenRouter stream error: {event['error']}")
+            if event.get('usage'):
+                usage = event['usage']
+            choices = event.get('choices') or []
+            if not choices:
+                continue
+            finish_reason = choices[0].get('finish_reason') or finish_reason
+            delta = choices[0].get('delta', {}).get('content')
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+    finally:
+        response.close()
+
+    return ''.join(parts), usage, finish_reason
+
+
+def _json_complete(text):
+    """True if text contains a top-level JSON object that has been closed"""
+    return JSONExtractor().feed(text or '')
+
+
+def _json_errors(content, task):
+    """Schema problems of a completion for tasks that must answer with JSON"""
+    extractor = JSONExtractor()
+    extractor.feed(content or '')
+    value = extractor.result()
+    if value is None:
+        return ['no complete JSON object']
+    return validate(value, task)
+
+
+def _continuation_overlap(previous, more):
+    """Number of leading characters of a continuation that repeat the end of the previous part"""
+    start = 0
+    stripped = more.lstrip()
+    if stripped.startswith('```') and previous.count('```') % 2 == 1:
+        # Model otworzył ponownie blok kodu, który wciąż jest otwarty
+        newline = stripped.find('\n')
+        start = len(more) if newline == -1 else len(more) - len(stripped) + newline + 1
+    rest = more[start:]
+    # Najkrótsze dopasowanie - przy powtarzalnym tekście dłuższe mogłoby usunąć nową treść
+    for size in range(20, min(len(previous), len(rest), OVERLAP_WINDOW) + 1):
+        if previous.endswith(rest[:size]):
+            return start + size
+    return start
+
+
+def _join_continuation(previous, more):
+    """Append a continuation, dropping text the model repeated from the end of the previous part"""
+    return previous + more[_continuation_overlap(previous, more):]
+
+
+def _complete_once(payload, on_delta=None):
+    """One chat completion call; returns (content, usage, finish_reason)"""
+    if on_delta is not None:
+        logger.debug(f"Streaming request to OpenRouter API ({payload['model']})")
+        return _stream_completion(payload, on_delta)
+
+    logger.debug(f"Sending request to OpenRouter API ({payload['model']})")
+    result = openrouter_client.post_json(payload, headers)
+    logger.debug("Received response from OpenRouter API")
+
+    if 'choices' in result and len(result['choices']) > 0:
+        choice = result['choices'][0]
+        return choice['message']['content'], result.get('usage'), choice.get('finish_reason')
+    else:
+        raise ValueError("Unexpected API response format")
+
+def send_api_request(prompt, max_tokens=None, language='pl', task=None, use_cache=True):
     """
     Send a request to the OpenRouter API with language specification
+
+    Model, temperature, reasoning and max_tokens come from the task profile
+    (utils.llm_profiles); an explicit max_tokens overrides the profile's
+    answer budget. <think> sections are removed from the returned text.
+
+    Identical requests are answered from the LLM response cache; pass
+    use_cache=False to force a fresh completion. Identical requests already
+    in flight (in this or another worker) are coalesced into one upstream call.
     """
     if not OPENROUTER_API_KEY:
         logger.error("OpenRouter API key not found")
@@ -40,30 +279,136 @@ def send_api_request(prompt, max_tokens=2000, language='pl'):
         'en': "You are an expert resume editor and career advisor. ALWAYS respond in English, regardless of the language of the CV or job description. Use proper English HR terminology and grammar."
     }
 
-    system_prompt = DEEP_REASONING_PROMPT + "\n" + language_prompts.get(language, language_prompts['pl'])
+    profile = get_profile(task)
+    system_prompt = language_prompts.get(language, language_prompts['pl'])
+    if profile['reasoning']:
+        system_prompt = DEEP_REASONING_PROMPT + "\n" + \
+            REASONING_BUDGET_PROMPT.format(budget=profile['reasoning_budget']) + "\n" + system_prompt
+
+    model = profile['model']
+    temperature = profile['temperature']
+    max_tokens = (max_tokens or profile['max_tokens']) + profile['reasoning_budget']
+    sink = _stream_sink.get()
+    cache_key = llm_cache.make_key(model, system_prompt, prompt, max_tokens, temperature, language)
+    if not use_cache or llm_cache.is_bypassed():
+        llm_cache.record_bypass()
+    else:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            cached, _ = strip_think(cached)
+            logger.debug(f"LLM cache hit for task {task}")
+            if sink is not None:
+                think_filter = ThinkTagFilter()
+                sink(think_filter.feed(cached) + think_filter.flush())
+            return cached
 
     payload = {
-        "model": MODEL,
+        "model": model,
         "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": prompt}
         ],
-        "max_tokens": max_tokens,
-        "temperature": 0.7
+        # Limit z historii zużycia dla tego zadania i długości promptu (nie więcej niż w profilu)
+        "max_tokens": token_budget.max_tokens_for(task, prompt, max_tokens),
+        "temperature": temperature
     }
 
-    try:
-        logger.debug(f"Sending request to OpenRouter API")
-        response = requests.post(OPENROUTER_BASE_URL, headers=headers, json=payload)
-        response.raise_for_status()
-
-        result = response.json()
-        logger.debug("Received response from OpenRouter API")
+    def complete(routed_model):
+        routed_payload = dict(payload, model=routed_model)
+        relay = _StreamRelay(sink) if sink is not None else None
+        on_delta = relay.feed if relay is not None else None
+        raw, usage, finish_reason = _complete_once(routed_payload, on_delta)
+        usage = dict(usage or {})
+        used = usage.get('completion_tokens') or estimate_tokens(raw)
+        first_truncated = finish_reason == 'length'
+
+        # Odpowiedź ucięta na max_tokens - dopisujemy kolejne części zamiast generować wszystko od nowa,
+        # ale wszystkie części razem mieszczą się w budżecie profilu
+        continuations = 0
+        while finish_reason == 'length' and continuations < MAX_CONTINUATIONS:
+            answer, _ = strip_think(raw)
+            if _json_complete(answer):
+                break
+            remaining = max_tokens - used
+            if remaining <= 0:
+                logger.warning(f"Completion for task {task} used its whole budget of {max_tokens} tokens")
+                break
+            continuations += 1
+            logger.info(f"Completion for task {task} truncated, continuation {continuations}/{MAX_CONTINUATIONS}")
+            continuation_payload = dict(
+                routed_payload,
+                max_tokens=remaining,
+                messages=routed_payload['messages'] + [
+                    {"role": "assistant", "content": raw},
+                    {"role": "user", "content": CONTINUE_PROMPT}
+                ]
+            )
+            if relay is not None:
+                relay.start_continuation(raw)
+            more, more_usage, finish_reason = _complete_once(continuation_payload, on_delta)
+            if relay is not None:
+                relay.end_part()
+            raw = _join_continuation(raw, more)
+            used += (more_usage or {}).get('completion_tokens') or estimate_tokens(more)
+        usage['completion_tokens'] = used
+        if relay is not None:
+            relay.finish()
+
+        if finish_reason == 'length':
+            logger.warning(f"Completion for task {task} still truncated after {continuations} continuations")
+        return raw, usage, routed_model, first_truncated, continuations
+
+    def fetch():
+        started = time.monotonic()
+        # Strumienia nie duplikujemy - tokeny trafiłyby do przeglądarki dwa razy
+        raw, usage, answered_model, truncated, continuations = model_router.call(model, complete, hedge=sink is None)
+        # Tylko wywołanie, które wygrało - przegrana kopia z hedgingu nie zaniża ani nie zawyża p95
+        token_budget.record(task, prompt, usage['completion_tokens'], truncated=truncated)
+        for _ in range(continuations):
+            token_budget.record_continuation()
+        content, reasoning = strip_think(raw)
+        reasoning_stats.record(task, raw, reasoning, usage, time.monotonic() - started)
+
+        # Ekstraktor naprawia typowe usterki sam - ponowne zapytanie tylko gdy naprawa zawiodła
+        errors = _json_errors(content, task) if task in TASK_SCHEMAS else []
+        if errors:
+            logger.warning(f"Invalid JSON for task {task} ({'; '.join(errors)}), requesting a corrected answer")
+            repair_payload = dict(payload, max_tokens=max_tokens, messages=payload['messages'] + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": JSON_REPAIR_PROMPT.format(errors='; '.join(errors))}
+            ])
+
+            def repair(routed_model):
+                repaired, _, _ = _complete_once(dict(repair_payload, model=routed_model))
+                return repaired
+
+            # Poprawkę robi model, który odpowiedział (przez router - z circuit breakerem i failoverem)
+            try:
+                repaired, _ = strip_think(model_router.call(answered_model, repair, hedge=False))
+                errors = _json_errors(repaired, task)
+                if not errors:
+                    content = repaired
+                    # Przeglądarka widziała już błędną pierwszą odpowiedź - podmieniamy ją
+                    replace = _stream_replace.get()
+                    if sink is not None and replace is not None:
+                        replace(content)
+            except (requests.exceptions.RequestException, KeyError, IndexError, ValueError) as e:
+                # Pierwsza odpowiedź zostaje - ekstraktor i tak wyciąga z niej, co się da
+                logger.error(f"JSON repair request failed: {str(e)}")
+
+        # Niepoprawnej odpowiedzi nie zapisujemy - następne zapytanie spróbuje ponownie
+        if not errors:
+            llm_cache.set(cache_key, content, task)
+        return content
 
-        if 'choices' in result and len(result['choices']) > 0:
-            return result['choices'][0]['message']['content']
-        else:
-            raise ValueError("Unexpected API response format")
+    try:
+        content, shared = single_flight.do(cache_key, fetch)
+        if shared:
+            logger.debug(f"Coalesced in-flight request for task {task}")
+            if sink is not None:
+                think_filter = ThinkTagFilter()
+                sink(think_filter.feed(content) + think_filter.flush())
+        return content
 
     except requests.exceptions.RequestException as e:
         logger.error(f"API request failed: {str(e)}")
@@ -118,7 +463,7 @@ def analyze_cv_score(cv_text, job_description="", language='pl'):
     }}
     """
 
-    return send_api_request(prompt, max_tokens=2500, language=language)
+    return send_api_request(prompt, language=language, task='cv_score')
 
 def analyze_keywords_match(cv_text, job_description, language='pl'):
     """
@@ -151,7 +496,7 @@ def analyze_keywords_match(cv_text, job_description, language='pl'):
     }}
     """
 
-    return send_api_request(prompt, max_tokens=2000, language=language)
+    return send_api_request(prompt, language=language, task='keyword_analysis')
 
 def check_grammar_and_style(cv_text, language='pl'):
     """
@@ -189,7 +534,7 @@ def check_grammar_and_style(cv_text, language='pl'):
     }}
     """
 
-    return send_api_request(prompt, max_tokens=1500)
+    return send_api_request(prompt, task='grammar_check')
 
 def optimize_for_position(cv_text, job_title, job_description="", language='pl'):
     """
@@ -221,7 +566,7 @@ def optimize_for_position(cv_text, job_title, job_description="", language='pl')
     }}
     """
 
-    return send_api_request(prompt, max_tokens=2500)
+    return send_api_request(prompt, task='position_optimization')
 
 def apply_recruiter_feedback_to_cv(cv_text, recruiter_feedback, job_description="", language='pl', is_premium=False, payment_verified=False):
     """
@@ -286,7 +631,7 @@ def apply_recruiter_feedback_to_cv(cv_text, recruiter_feedback, job_description=
     }}
     """
 
-    return send_api_request(prompt, max_tokens=max_tokens, language=language)
+    return send_api_request(prompt, max_tokens=max_tokens, language=language, task='apply_recruiter_feedback')
 
 def generate_interview_tips(cv_text, job_description="", language='pl'):
     """
@@ -329,12 +674,27 @@ def generate_interview_tips(cv_text, job_description="", language='pl'):
     }}
     """
 
-    return send_api_request(prompt, max_tokens=2000)
+    return send_api_request(prompt, task='interview_tips')
+
+def estimate_job_analysis_cost(job_description):
+    """Approximate tokens (prompt + answer limit) of one analyze_polish_job_posting call"""
+    return estimate_tokens(job_description) + 600 + get_profile('job_posting_analysis')['max_tokens']
+
+
+# Wersja promptu analizy ogłoszeń - podnieś przy każdej zmianie promptu lub formatu odpowiedzi,
+# aby analizy zapisane w JobPosting przestały być używane
+JOB_ANALYSIS_VERSION = 2
+
 
 def analyze_polish_job_posting(job_description, language='pl'):
     """
     Analizuje polskie ogłoszenia o pracę i wyciąga kluczowe informacje
+
+    Tekst ogłoszenia jest normalizowany, więc to samo ogłoszenie z inaczej
+    ułożonymi spacjami trafia w ten sam wpis llm_cache.
     """
+    job_description = normalize_job_text(job_description)
+
     prompt = f"""
     Przeanalizuj poniższe polskie ogłoszenie o pracę i wyciągnij z niego najważniejsze informacje.
 
@@ -420,7 +780,7 @@ def analyze_polish_job_posting(job_description, language='pl'):
     }}
     """
 
-    return send_api_request(prompt, max_tokens=2000, language=language)
+    return send_api_request(prompt, language=language, task='job_posting_analysis')
 
 def optimize_cv_for_specific_position(cv_text, target_position, job_description, company_name="", language='pl', is_premium=False, payment_verified=False):
     """
@@ -432,7 +792,7 @@ def optimize_cv_for_specific_position(cv_text, target_position, job_description,
     if job_description and len(job_description) > 50:
         try:
             job_analysis_result = analyze_polish_job_posting(job_description, language)
-            job_analysis = parse_ai_json_response(job_analysis_result)
+            job_analysis = extract_json(job_analysis_result, 'job_posting_analysis')
         except Exception as e:
             logger.warning(f"Nie udało się przeanalizować opisu stanowiska: {e}")
 
@@ -584,7 +944,7 @@ def optimize_cv_for_specific_position(cv_text, target_position, job_description,
         - Popraw overall structure i readability
         """
 
-    return send_api_request(prompt, max_tokens=max_tokens, language=language)
+    return send_api_request(prompt, max_tokens=max_tokens, language=language, task='advanced_position_optimization')
 
 def generate_complete_cv_content(target_position, experience_level, industry, brief_background, language='pl'):
     """
@@ -676,7 +1036,7 @@ def generate_complete_cv_content(target_position, experience_level, industry, br
     }}
     """
 
-    return send_api_request(prompt, max_tokens=4000, language=language)
+    return send_api_request(prompt, language=language, task='cv_generation')
 
 def optimize_cv(cv_text, job_description, language='pl', is_premium=False, payment_verified=False):
     """
@@ -819,7 +1179,7 @@ def optimize_cv(cv_text, job_description, language='pl', is_premium=False, payme
         - Zastosuj czytelne i spójne formatowanie
         """
 
-    return send_api_request(prompt, max_tokens=max_tokens, language=language)
+    return send_api_request(prompt, max_tokens=max_tokens, language=language, task='optimize')
 
 def generate_recruiter_feedback(cv_text, job_description="", language='pl'):
     """
@@ -878,7 +1238,7 @@ def generate_recruiter_feedback(cv_text, job_description="", language='pl'):
     Bądź szczery, ale konstruktywny. Oceniaj tylko to co rzeczywiście jest w CV, nie dodawaj od siebie.
     """
 
-    return send_api_request(prompt, max_tokens=2000)
+    return send_api_request(prompt, task='feedback')
 
 def generate_cover_letter(cv_text, job_description, language='pl'):
     """
@@ -918,7 +1278,7 @@ def generate_cover_letter(cv_text, job_description, language='pl'):
     Napisz kompletny list motywacyjny w języku polskim. Użyj profesjonalnego, ale ciepłego tonu.
     """
 
-    return send_api_request(prompt, max_tokens=2000)
+    return send_api_request(prompt, task='cover_letter')
 
 def analyze_job_url(url):
     """
@@ -931,78 +1291,36 @@ def analyze_job_url(url):
         if not parsed_url.scheme or not parsed_url.netloc:
             raise ValueError("Invalid URL format")
 
-        response = requests.get(url, headers={
+        page = job_page_cache.fetch(url, headers={
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         })
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        job_text = ""
-        domain = parsed_url.netloc.lower()
-
-        if 'linkedin.com' in domain:
-            containers = soup.select('.description__text, .show-more-less-html, .jobs-description__content')
-            if containers:
-                job_text = containers[0].get_text(separator='\n', strip=True)
 
-        elif 'indeed.com' in domain:
-            container = soup.select_one('#jobDescriptionText')
-            if container:
-                job_text = container.get_text(separator='\n', strip=True)
+        # Ta sama wersja strony była już przetworzona (także nieudanie - wtedy pusty tekst)
+        job_text = job_page_cache.get_result('job_description', page)
+        if job_text is not None:
+            logger.debug(f"Job description for {page.canonical_url} served from cache ({page.status})")
+            if not job_text:
+                raise ValueError("Could not extract job description from the URL")
+            return job_text
 
-        elif 'pracuj.pl' in domain:
-            containers = soup.select('[data-test="section-benefit-expectations-text"], [data-test="section-description-text"]')
-            if containers:
-                job_text = '\n'.join([c.get_text(separator='\n', strip=True) for c in containers])
+        posting = extract_posting(page.html, url)
+        job_text = posting.text()
 
-        elif 'olx.pl' in domain or 'praca.pl' in domain:
-            containers = soup.select('.offer-description, .offer-content, .description')
-            if containers:
-                job_text = containers[0].get_text(separator='\n', strip=True)
-
-        if not job_text:
-            potential_containers = soup.select('.job-description, .description, .details, article, .job-content, [class*=job], [class*=description], [class*=offer]')
-            if potential_containers:
-                for container in potential_containers:
-                    container_text = container.get_text(separator='\n', strip=True)
-                    if len(container_text) > len(job_text):
-                        job_text = container_text
-
-            if not job_text and soup.body:
-                for tag in soup.select('nav, header, footer, script, style, iframe'):
-                    tag.decompose()
-
-                job_text = soup.body.get_text(separator='\n', strip=True)
-
-                if len(job_text) > 10000:
-                    paragraphs = job_text.split('\n')
-                    keywords = ['requirements', 'responsibilities', 'qualifications', 'skills', 'experience', 'about the job',
-                                'wymagania', 'obowiązki', 'kwalifikacje', 'umiejętności', 'doświadczenie', 'o pracy']
-
-                    relevant_paragraphs = []
-                    found_relevant = False
-
-                    for paragraph in paragraphs:
-                        if any(keyword.lower() in paragraph.lower() for keyword in keywords):
-                            found_relevant = True
-                        if found_relevant and len(paragraph.strip()) > 50:
-                            relevant_paragraphs.append(paragraph)
-
-                    if relevant_paragraphs:
-                        job_text = '\n'.join(relevant_paragraphs)
-
-        job_text = '\n'.join([' '.join(line.split()) for line in job_text.split('\n') if line.strip()])
+        job_text = normalize_job_text(job_text)
 
         if not job_text:
+            job_page_cache.set_result('job_description', page, '')
             raise ValueError("Could not extract job description from the URL")
 
         logger.debug(f"Successfully extracted job description from URL")
 
-        if len(job_text) > 4000:
-            logger.debug(f"Job description is long ({len(job_text)} chars), summarizing with AI")
+        # Czysty opis z adaptera portalu nie wymaga podsumowania przez AI
+        quality = posting.quality()
+        if len(job_text) > 4000 and quality < QUALITY_THRESHOLD:
+            logger.debug(f"Job description is long ({len(job_text)} chars, quality {quality}), summarizing")
             job_text = summarize_job_description(job_text)
 
+        job_page_cache.set_result('job_description', page, job_text)
         return job_text
 
     except requests.exceptions.RequestException as e:
@@ -1013,10 +1331,20 @@ def analyze_job_url(url):
         logger.error(f"Error analyzing job URL: {str(e)}")
         raise Exception(f"Failed to analyze job posting: {str(e)}")
 
-def summarize_job_description(job_text):
+def summarize_job_description(job_text, engine=None):
     """
-    Summarize a long job description using the AI
+    Summarize a long job description.
+
+    The default local engine (JOB_SUMMARY_ENGINE=local) is an extractive
+    TF-IDF/TextRank summarizer that runs in milliseconds; 'llm' asks the AI.
     """
+    engine = engine or JOB_SUMMARY_ENGINE
+    if engine != 'llm':
+        try:
+            return summarize_locally(job_text)
+        except Exception as e:
+            logger.warning(f"Local job summary failed, using AI: {e}")
+
     prompt = f"""
     ZADANIE: Wyciągnij i podsumuj kluczowe informacje z tego ogłoszenia o pracę w języku polskim.
 
@@ -1037,7 +1365,7 @@ def summarize_job_description(job_text):
     Odpowiedź w języku polskim.
     """
 
-    return send_api_request(prompt, max_tokens=1500)
+    return send_api_request(prompt, task='job_summary')
 
 def ats_optimization_check(cv_text, job_description="", language='pl'):
     """
@@ -1117,7 +1445,7 @@ def ats_optimization_check(cv_text, job_description="", language='pl'):
     [Krótkie podsumowanie i zachęta]
     """
 
-    return send_api_request(prompt, max_tokens=1800)
+    return send_api_request(prompt, task='ats_check')
 
 def analyze_cv_strengths(cv_text, job_title="analityk danych", language='pl'):
     """
@@ -1138,7 +1466,7 @@ def analyze_cv_strengths(cv_text, job_title="analityk danych", language='pl'):
     Pamiętaj, aby Twoja analiza była praktyczna i pomocna. Używaj konkretnych przykładów z CV i odnoś je do wymagań typowych dla stanowiska {job_title}.
     """
 
-    return send_api_request(prompt, max_tokens=2500)
+    return send_api_request(prompt, task='cv_strengths')
 
 def generate_interview_questions(cv_text, job_description="", language='pl'):
     """
@@ -1173,4 +1501,4 @@ def generate_interview_questions(cv_text, job_description="", language='pl'):
     Dodatkowo, do każdego pytania dodaj krótką wskazówkę, jak można by na nie odpowiedzieć w oparciu o informacje z CV.
     """
 
-    return send_api_request(prompt, max_tokens=2000)
\ No newline at end of file
+    return send_api_request(prompt, task='interview_questions')
@@ -0,0 +1,218 @@
+import os
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised when the circuit breaker rejects a call without contacting OpenRouter"""
+
+
+class CircuitBreaker:
+    """
+    Simple closed / open / half-open breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and every
+    call fails fast for `reset_timeout` seconds. Then a single probe request is
+    let through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Przepuść jedno zapytanie próbne
+                self.state = 'half_open'
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != 'closed':
+                logger.info("OpenRouter circuit closed again")
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning(f"OpenRouter circuit opened after {self.failures} failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def record_throttled(self):
+        """A 429 means the model answered - it ends a probe but never counts as a failure"""
+        with self.lock:
+            if self.state == 'half_open':
+                logger.info("OpenRouter circuit closed again")
+                self.state = 'closed'
+                self.failures = 0
+
+    def retry_after(self):
+        """Seconds until the breaker lets a probe through"""
+        with self.lock:
+            if self.state != 'open':
+                return 0
+            return max(0, int(self.reset_timeout - (time.monotonic() - self.opened_at)))
+
+
+class OpenRouterClient:
+    """
+    Shared HTTP client for OpenRouter.
+
+    Keeps one pooled keep-alive session per worker process, bounds every call
+    with connect/read timeouts clamped to an overall deadline, retries 429/5xx
+    with jittered exponential backoff (honouring Retry-After) and fails fast
+    through a circuit breaker while OpenRouter is degraded. Rate limiting (429)
+    does not count towards the breaker.
+    """
+
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, base_url=OPENROUTER_BASE_URL):
+        self.base_url = base_url
+        self.connect_timeout = float(os.environ.get('OPENROUTER_CONNECT_TIMEOUT', 5))
+        self.read_timeout = float(os.environ.get('OPENROUTER_READ_TIMEOUT', 90))
+        self.total_timeout = float(os.environ.get('OPENROUTER_TOTAL_TIMEOUT', 150))
+        self.max_retries = int(os.environ.get('OPENROUTER_MAX_RETRIES', 3))
+        self.backoff_base = float(os.environ.get('OPENROUTER_BACKOFF_BASE', 1.0))
+        self.backoff_max = float(os.environ.get('OPENROUTER_BACKOFF_MAX', 20.0))
+        self.pool_size = int(os.environ.get('OPENROUTER_POOL_SIZE', 10))
+        self.breaker_threshold = int(os.environ.get('OPENROUTER_BREAKER_THRESHOLD', 5))
+        self.breaker_reset = float(os.environ.get('OPENROUTER_BREAKER_RESET', 30))
+        # Osobny bezpiecznik dla każdego modelu - awaria jednego nie blokuje modeli zapasowych
+        self.breakers = {}
+        self._breakers_lock = threading.Lock()
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+
+    def _get_session(self):
+        # Gunicorn forkuje workery - każdy proces musi mieć własną pulę połączeń
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._session_lock:
+                if self._session is None or self._session_pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+                    self._session_pid = pid
+        return self._session
+
+    def breaker_for(self, model):
+        with self._breakers_lock:
+            breaker = self.breakers.get(model)
+            if breaker is None:
+                breaker = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+                self.breakers[model] = breaker
+            return breaker
+
+    def _backoff_delay(self, attempt, response=None):
+        """
+        Retry-After if the server sent one, otherwise full-jitter exponential backoff.
+
+        Retry-After is not capped by backoff_max: retrying earlier than the server
+        asked only earns another 429, so a wait past the deadline ends the call.
+        """
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return max(0.0, float(retry_after))
+                except ValueError:
+                    try:
+                        retry_at = parsedate_to_datetime(retry_after)
+                        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+                    except (TypeError, ValueError):
+                        pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def post(self, payload, headers, stream=False):
+        """
+        POST a chat completion payload and return the raw `requests.Response`.
+
+        Raises `requests.exceptions.RequestException` (including `CircuitOpenError`)
+        when the call cannot be completed within the retry budget.
+        """
+        deadline = time.monotonic() + self.total_timeout
+        session = self._get_session()
+        breaker = self.breaker_for(payload.get('model'))
+        attempt = 0
+
+        while True:
+            if not breaker.allow_request():
+                raise CircuitOpenError(
+                    f"OpenRouter model {payload.get('model')} temporarily unavailable, retry in {breaker.retry_after()}s"
+                )
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.exceptions.Timeout(f"OpenRouter call exceeded {self.total_timeout:.0f}s")
+
+            response = None
+            error = None
+            try:
+                # Ostatnia próba nie może trwać dłużej niż pozostały czas całego wywołania
+                response = session.post(
+                    self.base_url,
+                    headers=headers,
+                    json=payload,
+                    timeout=(min(self.connect_timeout, remaining), min(self.read_timeout, remaining)),
+                    stream=stream
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+
+            if error is None and response.status_code not in self.RETRY_STATUS_CODES:
+                breaker.record_success()
+                response.raise_for_status()
+                return response
+
+            if response is not None and response.status_code == 429:
+                # Limit zapytań to nie awaria modelu - nie otwieraj bezpiecznika
+                breaker.record_throttled()
+            else:
+                breaker.record_failure()
+            if response is not None:
+                response.close()
+
+            delay = self._backoff_delay(attempt, response)
+            if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                if error is not None:
+                    raise error
+                response.raise_for_status()
+
+            reason = str(error) if error is not None else f"HTTP {response.status_code}"
+            logger.warning(f"OpenRouter request failed ({reason}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+    def post_json(self, payload, headers):
+        """POST a chat completion payload and return the decoded JSON body"""
+        return self.post(payload, headers).json()
+
+
+openrouter_client = OpenRouterClient()
@@ -2,28 +2,327 @@ import logging
 import os
 import PyPDF2
 import io
+import json
+import hashlib
+import tempfile
+import threading
+import time
 
-def extract_text(pdf_path):
-    """Extract text using PyPDF2 as primary method"""
+from utils.cache_backends import create_backend
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b'%PDF-'
+# Przesłane pliki do tego rozmiaru zostają w pamięci, większe trafiają do anonimowego pliku tymczasowego
+PDF_SPOOL_THRESHOLD = int(os.environ.get('PDF_SPOOL_THRESHOLD', 4 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class HashingSpooledFile(tempfile.SpooledTemporaryFile):
+    """
+    Upload buffer that hashes (SHA-256) and measures the file while it is written.
+
+    Kept in memory up to `max_size`, then rolled over to an anonymous temporary
+    file that the OS removes on close, so crashed workers leave nothing behind.
+    The first bytes are kept in `head` for the file-type check.
+    """
+    def __init__(self, max_size=PDF_SPOOL_THRESHOLD):
+        super().__init__(max_size=max_size, mode='w+b')
+        self._sha256 = hashlib.sha256()
+        self._on_disk = False
+        self.size = 0
+        self.head = b''
+
+    def write(self, data):
+        self._sha256.update(data)
+        self.size += len(data)
+        if len(self.head) < 1024:
+            self.head += bytes(data[:1024 - len(self.head)])
+        return super().write(data)
+
+    def rollover(self):
+        # Własna flaga zamiast prywatnego SpooledTemporaryFile._rolled
+        super().rollover()
+        self._on_disk = True
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    @property
+    def spooled(self):
+        """True once the upload has been moved from memory to a temporary file"""
+        return self._on_disk
+
+
+def upload_stream_factory(total_content_length=None, content_type=None, filename=None, content_length=None):
+    """werkzeug stream factory: multipart file parts are written straight into a HashingSpooledFile"""
+    return HashingSpooledFile()
+
+
+def hashed_upload(stream):
+    """The upload as a HashingSpooledFile, rewound (copied in chunks only if it was buffered elsewhere)"""
+    if not isinstance(stream, HashingSpooledFile):
+        buffered = HashingSpooledFile()
+        for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+            buffered.write(chunk)
+        stream = buffered
+    stream.seek(0)
+    return stream
+
+
+def is_pdf(head):
+    """PDF magic bytes; readers accept the header anywhere in the first 1024 bytes"""
+    return PDF_MAGIC in bytes(head[:1024])
+
+
+def _open_source(source):
+    """Binary stream for a path, bytes/memoryview or an already open file"""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb')
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    source.seek(0)
+    return source
+
+
+EXTRACTION_FAILED_TEXT = "Nie udało się wyodrębnić tekstu z PDF. Proszę wkleić tekst CV ręcznie."
+
+
+# Szybki silnik domyślny i silnik z analizą układu, używany gdy tekst wygląda źle
+PDF_ENGINE = os.environ.get('PDF_ENGINE', 'pypdf2')
+PDF_FALLBACK_ENGINE = os.environ.get('PDF_FALLBACK_ENGINE', 'pdfminer')
+PDF_QUALITY_THRESHOLD = float(os.environ.get('PDF_QUALITY_THRESHOLD', 0.6))
+MIN_WORDS_PER_PAGE = 40
+
+
+def _pypdf2_pages(file):
+    return [page.extract_text() or '' for page in PyPDF2.PdfReader(file).pages]
+
+
+def _pdfminer_pages(file):
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LAParams, LTTextContainer
+
+    return [
+        ''.join(element.get_text() for element in page if isinstance(element, LTTextContainer))
+        for page in extract_pages(file, laparams=LAParams())
+    ]
+
+
+# Silnik -> funkcja zwracająca listę tekstów stron
+ENGINES = {
+    'pypdf2': _pypdf2_pages,
+    'pdfminer': _pdfminer_pages
+}
+
+
+def text_quality(text, pages):
+    """
+    0..1 plausibility of extracted text.
+
+    Penalizes garbled glyphs (U+FFFD, private-use and control characters,
+    pdfminer "(cid:N)" placeholders), too few words per page (image-only or
+    broken text layer) and missing spaces (words glued into long runs).
+    """
+    if not text.strip():
+        return 0.0
+    garbled = sum(
+        1 for char in text
+        if char == '\ufffd' or '\ue000' <= char <= '\uf8ff' or (ord(char) < 32 and char not in '\n\r\t')
+    ) + 5 * text.count('(cid:')
+    garbled_score = max(0.0, 1 - 10 * garbled / len(text))
+
+    words = text.split()
+    words_score = min(1.0, len(words) / (max(pages, 1) * MIN_WORDS_PER_PAGE))
+
+    glued = sum(len(word) for word in words if len(word) > 25)
+    spacing_score = max(0.0, 1 - 2 * glued / max(sum(len(word) for word in words), 1))
+
+    return round(garbled_score * words_score * spacing_score, 3)
+
+
+class EngineTimings:
+    """Per-engine run counts and durations, plus how often the fallback engine was needed"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.engines = {}
+        self.fallbacks = 0
+
+    def record(self, engine, seconds, fallback=False):
+        with self.lock:
+            entry = self.engines.setdefault(engine, {'runs': 0, 'seconds': 0.0})
+            entry['runs'] += 1
+            entry['seconds'] += seconds
+            if fallback:
+                self.fallbacks += 1
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                engine: {'runs': entry['runs'], 'avg_ms': round(1000 * entry['seconds'] / entry['runs'], 1)}
+                for engine, entry in self.engines.items()
+            }
+            stats['fallbacks'] = self.fallbacks
+        return stats
+
+
+engine_timings = EngineTimings()
+
+
+def _run_engine(engine, source):
+    file = _open_source(source)
+    started = time.perf_counter()
     try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-        return text
+        pages = ENGINES[engine](file)
+    finally:
+        if file is not source:
+            file.close()
+    text = '\n'.join(page.strip('\n') for page in pages)
+    return {'text': text, 'pages': len(pages), 'engine': engine,
+            'quality': text_quality(text, len(pages)), 'seconds': time.perf_counter() - started}
+
+
+def extract_pdf(source, engine=None):
+    """
+    Parse a PDF; returns {'text', 'pages', 'engine', 'quality', 'timings'}.
+
+    Runs the fast PDF_ENGINE first and, if it fails or its text scores
+    below PDF_QUALITY_THRESHOLD, PDF_FALLBACK_ENGINE (pdfminer with layout
+    analysis), keeping the better-scoring text. `timings` holds seconds per
+    engine that ran. Raises if no engine could parse the file.
+    """
+    chain = [engine or PDF_ENGINE]
+    if PDF_FALLBACK_ENGINE and PDF_FALLBACK_ENGINE not in chain:
+        chain.append(PDF_FALLBACK_ENGINE)
+
+    best, timings, error = None, {}, None
+    for name in chain:
+        if best is not None and best['quality'] >= PDF_QUALITY_THRESHOLD:
+            break
+        try:
+            result = _run_engine(name, source)
+        except Exception as e:
+            logger.warning(f"PDF engine {name} failed: {e}")
+            error = e
+            continue
+        timings[name] = round(result.pop('seconds'), 4)
+        engine_timings.record(name, timings[name], fallback=name != chain[0])
+        if best is None or result['quality'] > best['quality']:
+            best = result
+
+    if best is None:
+        raise error
+    if best['quality'] < PDF_QUALITY_THRESHOLD:
+        logger.warning(f"Low PDF text quality {best['quality']} ({best['engine']})")
+    best['timings'] = timings
+    return best
+
+
+def extract_text(source):
+    """Extract text with the engine chain (PyPDF2, pdfminer as fallback); source: path, bytes or binary stream"""
+    try:
+        return extract_pdf(source)['text']
     except Exception as e:
-        logging.error(f"PyPDF2 extraction failed: {e}")
-        return "Nie udało się wyodrębnić tekstu z PDF. Proszę wkleić tekst CV ręcznie."
+        logging.error(f"PDF extraction failed: {e}")
+        return EXTRACTION_FAILED_TEXT
 
-logger = logging.getLogger(__name__)
+PDF_TEXT_TTL = int(os.environ.get('PDF_CACHE_TTL', 30 * 24 * 3600))
+# Bardzo długie teksty (np. skany z warstwą OCR) nie są zapamiętywane
+PDF_CACHE_MAX_TEXT_CHARS = int(os.environ.get('PDF_CACHE_MAX_TEXT_CHARS', 200000))
+
+
+class PDFTextCache:
+    """
+    Extracted text and extraction metadata keyed by SHA-256 of the PDF bytes.
+
+    The same CV uploaded again (typically once per job offer) is served
+    without parsing. Uses the shared cache backends, so with sqlite/redis
+    all gunicorn workers see the same entries; size is bounded by the
+    backend's max_entries and PDF_CACHE_MAX_TEXT_CHARS.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'writes': 0}
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def get(self, sha256):
+        if self.backend is None or not sha256:
+            return None
+        value = self.backend.get(sha256)
+        self._count('hits' if value is not None else 'misses')
+        return json.loads(value) if value is not None else None
+
+    def set(self, sha256, result):
+        if self.backend is None or not sha256 or not result['text'].strip():
+            return
+        if len(result['text']) > PDF_CACHE_MAX_TEXT_CHARS:
+            return
+        self.backend.set(sha256, json.dumps(result, ensure_ascii=False), PDF_TEXT_TTL)
+        self._count('writes')
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['entries'] = self.backend.size() if self.backend is not None else 0
+        return stats
+
+
+pdf_text_cache = PDFTextCache(create_backend(
+    os.environ.get('PDF_CACHE_BACKEND', os.environ.get('LLM_CACHE_BACKEND', 'sqlite')),
+    'pdf_text',
+    int(os.environ.get('PDF_CACHE_MAX_ENTRIES', 1000))
+))
+
+
+def _source_sha256(source):
+    """SHA-256 of the PDF bytes (HashingSpooledFile already has it from the upload)"""
+    if isinstance(source, HashingSpooledFile):
+        return source.sha256
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+        return digest.hexdigest()
+    file = _open_source(source)
+    try:
+        for chunk in iter(lambda: file.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    finally:
+        if file is not source:
+            file.close()
+    return digest.hexdigest()
+
+
+def extract_pdf_cached(source, sha256=None):
+    """
+    extract_pdf result for the source, looked up by content hash before any parsing.
+
+    Adds 'sha256' and 'cached'; failed extractions are not stored.
+    """
+    sha256 = sha256 or _source_sha256(source)
+    cached = pdf_text_cache.get(sha256)
+    if cached is not None:
+        cached.update(sha256=sha256, cached=True)
+        return cached
+    result = extract_pdf(source)
+    result['chars'] = len(result['text'])
+    pdf_text_cache.set(sha256, result)
+    result.update(sha256=sha256, cached=False)
+    return result
 
-def extract_text_from_pdf(pdf_path):
+def extract_text_from_pdf(pdf_path, sha256=None):
     """
-    Extracts text from a PDF file using PDFMiner.
+    Extracts text from a PDF file (PyPDF2, falling back to PDFMiner layout analysis when the text looks broken).
     
     Args:
-        pdf_path (str): Path to the PDF file
+        pdf_path (str | bytes | file): Path to the PDF file, its bytes or an open binary stream
+        sha256 (str): Content hash if already known (skips hashing before the cache lookup)
         
     Returns:
         str: Extracted text from the PDF
@@ -32,17 +331,26 @@ def extract_text_from_pdf(pdf_path):
         Exception: If there's an error during extraction
     """
     try:
-        logger.debug(f"Extracting text from PDF: {pdf_path}")
+        logger.debug(f"Extracting text from PDF: {pdf_path if isinstance(pdf_path, (str, os.PathLike)) else 'upload stream'}")
         
         # Check if file exists
-        if not os.path.isfile(pdf_path):
+        if isinstance(pdf_path, (str, os.PathLike)) and not os.path.isfile(pdf_path):
             raise FileNotFoundError(f"PDF file not found at path: {pdf_path}")
         
-        # Extract text using PDFMiner
-        text = extract_text(pdf_path)
+        # Ten sam plik przetworzony wcześniej - tekst z cache, bez parsowania
+        try:
+            result = extract_pdf_cached(pdf_path, sha256)
+            text = result['text']
+            logger.info(
+                f"PDF {result['sha256'][:12]}: {result['pages']} pages via {result['engine']}, quality {result['quality']}, "
+                f"{'cached' if result['cached'] else 'timings ' + str(result['timings'])}"
+            )
+        except Exception as e:
+            logging.error(f"PDF extraction failed: {e}")
+            text = EXTRACTION_FAILED_TEXT
         
         if not text.strip():
-            logger.warning(f"No text extracted from PDF: {pdf_path}")
+            logger.warning("No text extracted from PDF")
             return "No text could be extracted from this PDF. The file might be scanned or contain only images."
         
         logger.debug(f"Successfully extracted {len(text)} characters from PDF")
@@ -1,9 +1,17 @@
 
 from functools import wraps
 from flask import request, jsonify
+import os
 import time
+import sqlite3
+import logging
+import threading
 from collections import defaultdict, deque
 
+from utils.cache_backends import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
 class RateLimiter:
     def __init__(self):
         self.requests = defaultdict(deque)
@@ -11,10 +19,12 @@ class RateLimiter:
             'cv_upload': (5, 300),  # 5 uploads per 5 minutes
             'cv_process': (10, 3600),  # 10 processes per hour
             'ai_analysis': (20, 3600),  # 20 AI calls per hour
+            'job_batch': (10, 3600),  # 10 batch job URL imports per hour
             'general': (100, 3600)  # 100 general requests per hour
         }
     
-    def is_allowed(self, identifier, limit_type='general'):
+    def is_allowed(self, identifier, limit_type='general', cost=1):
+        """Count `cost` requests (e.g. one per analysis in a batch) if all of them fit in the limit"""
         now = time.time()
         max_requests, time_window = self.limits.get(limit_type, (100, 3600))
         
@@ -24,12 +34,17 @@ class RateLimiter:
             user_requests.popleft()
         
         # Check if limit exceeded
-        if len(user_requests) >= max_requests:
+        if len(user_requests) + cost > max_requests:
             return False
         
         # Add current request
-        user_requests.append(now)
+        user_requests.extend([now] * cost)
         return True
+
+    def remaining(self, identifier, limit_type='general'):
+        now = time.time()
+        max_requests, time_window = self.limits.get(limit_type, (100, 3600))
+        return max(0, max_requests - sum(1 for t in self.requests[identifier] if t >= now - time_window))
     
     def get_reset_time(self, identifier, limit_type='general'):
         now = time.time()
@@ -42,14 +57,246 @@ class RateLimiter:
 
 rate_limiter = RateLimiter()
 
+class MemoryCostStore:
+    """Spent tokens per identifier and time bucket, in this process only"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self.spent = {}  # identifier -> {kubełek: koszt}, tylko kubełki w oknie
+        self.pruned_bucket = None
+        self.lock = threading.Lock()
+
+    def charge(self, budgets, cost, bucket, first_bucket, ttl):
+        with self.lock:
+            if bucket != self.pruned_bucket:
+                self._prune(first_bucket)
+                self.pruned_bucket = bucket
+            for key, budget in budgets:
+                buckets = self._window(key, first_bucket)
+                if sum(buckets.values()) + cost > budget:
+                    return key, sorted(buckets.items())
+            for key, _ in budgets:
+                buckets = self.spent.setdefault(key, {})
+                buckets[bucket] = buckets.get(bucket, 0) + cost
+            return None, []
+
+    def _window(self, key, first_bucket):
+        buckets = self.spent.get(key, {})
+        for old in [b for b in buckets if b < first_bucket]:
+            del buckets[old]
+        return buckets
+
+    def _prune(self, first_bucket):
+        # Wywołujący bez kosztów w oknie są usuwani - inaczej każdy jednorazowy gość zostawałby w pamięci na zawsze
+        for key in list(self.spent):
+            if not self._window(key, first_bucket):
+                del self.spent[key]
+
+    def usage(self, first_bucket):
+        with self.lock:
+            self._prune(first_bucket)
+            return {key: sum(buckets.values()) for key, buckets in self.spent.items()}
+
+
+class SQLiteCostStore:
+    """Spent tokens shared by all gunicorn workers on one host (one row per identifier and time bucket)"""
+
+    name = 'sqlite'
+
+    def __init__(self, path, table='llm_costs'):
+        self.path = path
+        self.table = table
+        self.local = threading.local()
+        self._connect().execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            'key TEXT NOT NULL, bucket INTEGER NOT NULL, cost INTEGER NOT NULL, '
+            'PRIMARY KEY (key, bucket))'
+        )
+
+    def _connect(self):
+        # Połączenia SQLite nie mogą przechodzić między procesami ani wątkami
+        pid = os.getpid()
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or getattr(self.local, 'pid', None) != pid:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+            self.local.pid = pid
+        return conn
+
+    def charge(self, budgets, cost, bucket, first_bucket, ttl):
+        conn = self._connect()
+        # Sprawdzenie i zapis w jednej transakcji z blokadą zapisu - workery nie przekroczą budżetu razem
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(f'DELETE FROM {self.table} WHERE bucket < ?', (first_bucket,))
+            for key, budget in budgets:
+                rows = conn.execute(
+                    f'SELECT bucket, cost FROM {self.table} WHERE key = ? ORDER BY bucket', (key,)
+                ).fetchall()
+                if sum(spent for _, spent in rows) + cost > budget:
+                    conn.execute('COMMIT')
+                    return key, rows
+            for key, _ in budgets:
+                conn.execute(
+                    f'INSERT INTO {self.table} (key, bucket, cost) VALUES (?, ?, ?) '
+                    'ON CONFLICT (key, bucket) DO UPDATE SET cost = cost + excluded.cost',
+                    (key, bucket, cost)
+                )
+            conn.execute('COMMIT')
+            return None, []
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def usage(self, first_bucket):
+        rows = self._connect().execute(
+            f'SELECT key, SUM(cost) FROM {self.table} WHERE bucket >= ? GROUP BY key', (first_bucket,)
+        ).fetchall()
+        return dict(rows)
+
+
+class RedisCostStore:
+    """Spent tokens shared across hosts: one hash per identifier, field = time bucket"""
+
+    name = 'redis'
+
+    def __init__(self, url, prefix='llm_costs:'):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self.prefix = prefix
+
+    def charge(self, budgets, cost, bucket, first_bucket, ttl):
+        # Najpierw rezerwacja (HINCRBY jest atomowy), przy przekroczeniu budżetu jest wycofywana
+        pipe = self.client.pipeline()
+        for key, _ in budgets:
+            pipe.hincrby(self.prefix + key, bucket, cost)
+            pipe.expire(self.prefix + key, max(1, int(ttl)))
+            pipe.hgetall(self.prefix + key)
+        replies = pipe.execute()
+        failed, failed_rows = None, []
+        for index, (key, budget) in enumerate(budgets):
+            rows = sorted((int(b), int(c)) for b, c in replies[index * 3 + 2].items() if int(b) >= first_bucket)
+            if failed is None and sum(spent for _, spent in rows) > budget:
+                failed = key
+                failed_rows = [(b, c - cost if b == bucket else c) for b, c in rows]
+        stale = []
+        for index, (key, _) in enumerate(budgets):
+            stale.extend((key, b) for b in replies[index * 3 + 2] if int(b) < first_bucket)
+        pipe = self.client.pipeline()
+        if failed is not None:
+            for key, _ in budgets:
+                pipe.hincrby(self.prefix + key, bucket, -cost)
+        for key, old in stale:
+            pipe.hdel(self.prefix + key, old)
+        pipe.execute()
+        return failed, failed_rows
+
+    def usage(self, first_bucket):
+        usage = {}
+        for name in self.client.scan_iter(match=self.prefix + '*'):
+            spent = sum(int(c) for b, c in self.client.hgetall(name).items() if int(b) >= first_bucket)
+            if spent:
+                usage[name.decode('utf-8')[len(self.prefix):]] = spent
+        return usage
+
+
+def create_cost_store(kind):
+    """Build the store of spent tokens ('memory', 'sqlite', 'redis'); falls back to this process's memory"""
+    kind = (kind or 'memory').lower()
+    try:
+        if kind == 'sqlite':
+            return SQLiteCostStore(os.path.join(DEFAULT_CACHE_DIR, 'cv_optimizer_llm_costs.db'))
+        if kind == 'redis':
+            return RedisCostStore(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+    except Exception as e:
+        logger.warning(f"Cost store '{kind}' unavailable, AI budgets are per process: {e}")
+    return MemoryCostStore()
+
+
+class CostLimiter:
+    """
+    Token budgets for AI calls: a sliding window per caller plus one
+    window shared by all callers, so that many anonymous addresses
+    together cannot burn through the API quota either.
+
+    Spending is kept in `store` in time buckets of window / buckets seconds;
+    with the SQLite or Redis store the budgets hold across all workers.
+    """
+
+    SHARED_KEY = '*'
+
+    def __init__(self, per_caller, shared, window=3600, store=None, buckets=60):
+        self.per_caller = per_caller
+        self.shared = shared
+        self.window = window
+        self.store = store if store is not None else MemoryCostStore()
+        self.bucket_size = window / buckets
+        self.buckets = buckets
+        self.rejected = 0
+
+    def _retry_after(self, rows, budget, cost, now):
+        # Czekaj, aż z okna wypadnie tyle kosztu, by zmieścić nowe wywołanie
+        used = sum(spent for _, spent in rows)
+        for bucket, spent in rows:
+            used -= spent
+            if used + cost <= budget:
+                return max(1, int((bucket + self.buckets) * self.bucket_size - now) + 1)
+        return self.window
+
+    def charge(self, identifier, cost):
+        """Record `cost` tokens for identifier; returns 0 when allowed, else seconds until it would be"""
+        now = time.time()
+        bucket = int(now // self.bucket_size)
+        budgets = [(identifier, self.per_caller), (self.SHARED_KEY, self.shared)]
+        try:
+            failed, rows = self.store.charge(budgets, cost, bucket, bucket - self.buckets + 1, self.window)
+        except Exception as e:
+            # Awaria magazynu kosztów nie blokuje analiz
+            logger.warning(f"Cost store charge failed: {e}")
+            return 0
+        if failed is None:
+            return 0
+        self.rejected += 1
+        return self._retry_after(rows, dict(budgets)[failed], cost, now)
+
+    def stats(self):
+        bucket = int(time.time() // self.bucket_size)
+        try:
+            usage = self.store.usage(bucket - self.buckets + 1)
+        except Exception as e:
+            logger.warning(f"Cost store read failed: {e}")
+            usage = {}
+        return {
+            'store': self.store.name,
+            'callers': len([key for key in usage if key != self.SHARED_KEY]),
+            'shared_used': usage.get(self.SHARED_KEY, 0),
+            'shared_budget': self.shared,
+            'per_caller_budget': self.per_caller,
+            'rejected': self.rejected
+        }
+
+# Niezalogowani użytkownicy: budżet tokenów AI na adres IP i wspólny dla wszystkich anonimowych,
+# w tym samym magazynie co llm_cache, więc obowiązuje łącznie dla wszystkich workerów
+anonymous_cost_limiter = CostLimiter(
+    int(os.environ.get('ANON_LLM_TOKENS_PER_HOUR', 20000)),
+    int(os.environ.get('ANON_LLM_SHARED_TOKENS_PER_HOUR', 200000)),
+    store=create_cost_store(os.environ.get('LLM_CACHE_BACKEND', 'sqlite'))
+)
+
+def request_identifier():
+    # Use IP address or user ID as identifier
+    identifier = request.remote_addr
+    if hasattr(request, 'current_user') and request.current_user.is_authenticated:
+        identifier = f"user_{request.current_user.id}"
+    return identifier
+
 def rate_limit(limit_type='general'):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # Use IP address or user ID as identifier
-            identifier = request.remote_addr
-            if hasattr(request, 'current_user') and request.current_user.is_authenticated:
-                identifier = f"user_{request.current_user.id}"
+            identifier = request_identifier()
             
             if not rate_limiter.is_allowed(identifier, limit_type):
                 reset_time = rate_limiter.get_reset_time(identifier, limit_type)
@@ -0,0 +1,286 @@
+import os
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+
+from utils.cache_backends import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteLockStore:
+    """
+    Lock table shared by all gunicorn workers on one host.
+
+    A row is the lease of the worker computing a fingerprint; when it
+    finishes, the result is written into the same row for a short time so
+    waiting workers can pick it up.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, table='llm_inflight'):
+        self.path = path
+        self.table = table
+        self.local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            'key TEXT PRIMARY KEY, owner TEXT NOT NULL, '
+            'result TEXT, expires_at REAL NOT NULL)'
+        )
+
+    def _connect(self):
+        # Połączenia SQLite nie mogą przechodzić między procesami ani wątkami
+        pid = os.getpid()
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or getattr(self.local, 'pid', None) != pid:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+            self.local.pid = pid
+        return conn
+
+    def acquire(self, key, owner, ttl):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(f'DELETE FROM {self.table} WHERE key = ? AND expires_at < ?', (key, now))
+        cursor = conn.execute(
+            f'INSERT OR IGNORE INTO {self.table} (key, owner, result, expires_at) VALUES (?, ?, NULL, ?)',
+            (key, owner, now + ttl)
+        )
+        return cursor.rowcount == 1
+
+    def renew(self, key, owner, ttl):
+        self._connect().execute(
+            f'UPDATE {self.table} SET expires_at = ? WHERE key = ? AND owner = ? AND result IS NULL',
+            (time.time() + ttl, key, owner)
+        )
+
+    def publish(self, key, owner, value, ttl):
+        self._connect().execute(
+            f'UPDATE {self.table} SET result = ?, expires_at = ? WHERE key = ? AND owner = ?',
+            (value, time.time() + ttl, key, owner)
+        )
+
+    def release(self, key, owner):
+        self._connect().execute(
+            f'DELETE FROM {self.table} WHERE key = ? AND owner = ? AND result IS NULL', (key, owner)
+        )
+
+    def poll(self, key):
+        """Return ('done', result), ('running', None) or ('missing', None)"""
+        row = self._connect().execute(
+            f'SELECT result, expires_at FROM {self.table} WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return 'missing', None
+        if row[0] is not None:
+            return 'done', row[0]
+        return 'running', None
+
+
+class RedisLockStore:
+    """Lock table in Redis, shared across hosts (SET NX EX lease + short-lived result key)"""
+
+    name = 'redis'
+
+    def __init__(self, url, prefix='llm_inflight:'):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self.prefix = prefix
+
+    def acquire(self, key, owner, ttl):
+        return bool(self.client.set(self.prefix + 'lock:' + key, owner, nx=True, ex=max(1, int(ttl))))
+
+    def renew(self, key, owner, ttl):
+        lock_key = self.prefix + 'lock:' + key
+        if (self.client.get(lock_key) or b'').decode('utf-8') == owner:
+            self.client.expire(lock_key, max(1, int(ttl)))
+
+    def publish(self, key, owner, value, ttl):
+        self.client.set(self.prefix + 'result:' + key, value, ex=max(1, int(ttl)))
+        self.release(key, owner)
+
+    def release(self, key, owner):
+        lock_key = self.prefix + 'lock:' + key
+        if (self.client.get(lock_key) or b'').decode('utf-8') == owner:
+            self.client.delete(lock_key)
+
+    def poll(self, key):
+        value = self.client.get(self.prefix + 'result:' + key)
+        if value is not None:
+            return 'done', value.decode('utf-8')
+        if self.client.exists(self.prefix + 'lock:' + key):
+            return 'running', None
+        return 'missing', None
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight LLM requests.
+
+    The first caller of a fingerprint (the leader) runs the upstream request;
+    threads of the same worker asking for the same fingerprint wait for the
+    leader's result, and other workers wait on the shared lock table. If a
+    remote leader fails or its lease expires, a waiting worker takes over.
+
+    The lease is short (`lock_ttl`) but the leader renews it every
+    lock_ttl / 3 while the call runs, so slow calls (failover, hedging,
+    continuations, JSON repair) keep their lease and a crashed leader loses
+    it quickly. Waiters give up and run the call themselves only after
+    `max_wait`, the worst-case duration of one call.
+    """
+
+    def __init__(self, store=None, lock_ttl=60, result_ttl=10, poll_interval=0.25, max_wait=750):
+        self.store = store
+        self.lock_ttl = lock_ttl
+        self.max_wait = max_wait
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.counters = {'leaders': 0, 'coalesced_local': 0, 'coalesced_remote': 0, 'takeovers': 0}
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def do(self, key, fn):
+        """
+        Run fn() once per in-flight key.
+
+        Returns (result, shared) where shared is True if the result was
+        produced by another caller.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.calls[key] = call
+
+        if not leader:
+            self._count('coalesced_local')
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result, shared = self._run_across_workers(key, fn)
+            return call.result, shared
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.event.set()
+
+    def _run_across_workers(self, key, fn):
+        if self.store is None:
+            self._count('leaders')
+            return fn(), False
+
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        deadline = time.monotonic() + self.max_wait
+        waited = False
+        while True:
+            try:
+                acquired = self.store.acquire(key, owner, self.lock_ttl)
+            except Exception as e:
+                # Awaria tabeli blokad nie może blokować zapytań do AI
+                logger.warning(f"Single-flight lock store unavailable: {e}")
+                self._count('leaders')
+                return fn(), False
+
+            if acquired:
+                self._count('takeovers' if waited else 'leaders')
+                return self._lead(key, owner, fn), False
+
+            waited = True
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                try:
+                    state, value = self.store.poll(key)
+                except Exception as e:
+                    logger.warning(f"Single-flight lock store poll failed: {e}")
+                    state, value = 'missing', None
+                if state == 'done':
+                    self._count('coalesced_remote')
+                    return value, True
+                if state == 'missing':
+                    break
+            else:
+                logger.warning(f"Timed out waiting for in-flight request {key[:12]}, running it locally")
+                self._count('leaders')
+                return fn(), False
+
+    def _heartbeat(self, key, owner, stop):
+        while not stop.wait(self.lock_ttl / 3):
+            self._safe(self.store.renew, key, owner, self.lock_ttl)
+
+    def _lead(self, key, owner, fn):
+        stop = threading.Event()
+        threading.Thread(
+            target=self._heartbeat, args=(key, owner, stop), daemon=True, name='single-flight-heartbeat'
+        ).start()
+        try:
+            result = fn()
+        except Exception:
+            self._safe(self.store.release, key, owner)
+            raise
+        finally:
+            stop.set()
+        if result:
+            self._safe(self.store.publish, key, owner, result, self.result_ttl)
+        else:
+            self._safe(self.store.release, key, owner)
+        return result
+
+    def _safe(self, method, *args):
+        try:
+            method(*args)
+        except Exception as e:
+            logger.warning(f"Single-flight lock store update failed: {e}")
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['in_flight'] = len(self.calls)
+        stats['store'] = self.store.name if self.store is not None else 'local'
+        return stats
+
+
+def create_lock_store(kind):
+    """Build the cross-worker lock table ('sqlite', 'redis'); None keeps coalescing in-process"""
+    kind = (kind or 'sqlite').lower()
+    try:
+        if kind == 'sqlite':
+            return SQLiteLockStore(os.path.join(DEFAULT_CACHE_DIR, 'cv_optimizer_llm_inflight.db'))
+        if kind == 'redis':
+            return RedisLockStore(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+    except Exception as e:
+        logger.warning(f"Single-flight lock store '{kind}' unavailable, coalescing in-process only: {e}")
+    return None
+
+
+# Najdłuższe wywołanie: limit czasu klienta OpenRouter na odpowiedź, każdą kontynuację i naprawę JSON
+_MAX_CALL_SECONDS = float(os.environ.get('OPENROUTER_TOTAL_TIMEOUT', 150)) * (int(os.environ.get('LLM_MAX_CONTINUATIONS', 3)) + 2)
+
+single_flight = SingleFlight(
+    create_lock_store(os.environ.get('LLM_SINGLE_FLIGHT_BACKEND', os.environ.get('LLM_CACHE_BACKEND', 'sqlite'))),
+    lock_ttl=float(os.environ.get('LLM_SINGLE_FLIGHT_LOCK_TTL', 60)),
+    result_ttl=float(os.environ.get('LLM_SINGLE_FLIGHT_RESULT_TTL', 10)),
+    max_wait=float(os.environ.get('LLM_SINGLE_FLIGHT_MAX_WAIT', _MAX_CALL_SECONDS))
+)
@@ -0,0 +1,186 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import deque
+
+from utils.cache_backends import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Granice przedziałów długości promptu (w szacowanych tokenach)
+INPUT_BUCKETS = (500, 1000, 2000, 4000, 8000)
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for Polish/English text)"""
+    return len(text or '') // 4
+
+
+def input_bucket(input_tokens):
+    for index, limit in enumerate(INPUT_BUCKETS):
+        if input_tokens <= limit:
+            return index
+    return len(INPUT_BUCKETS)
+
+
+class MemoryUsageStore:
+    """Recent completion sizes per (task, bucket), kept in this process only"""
+
+    name = 'memory'
+
+    def __init__(self, window=200):
+        self.samples = {}
+        self.window = window
+        self.lock = threading.Lock()
+
+    def add(self, task, bucket, completion_tokens, truncated):
+        with self.lock:
+            self.samples.setdefault((task, bucket), deque(maxlen=self.window)).append(completion_tokens)
+
+    def recent(self, task, bucket):
+        with self.lock:
+            return list(self.samples.get((task, bucket), ()))
+
+
+class SQLiteUsageStore:
+    """Completion sizes shared by all workers on one host, trimmed to `window` rows per key"""
+
+    name = 'sqlite'
+
+    def __init__(self, path, window=200):
+        self.path = path
+        self.window = window
+        self.local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS token_usage ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, task TEXT NOT NULL, bucket INTEGER NOT NULL, '
+            'completion_tokens INTEGER NOT NULL, truncated INTEGER NOT NULL, created_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS token_usage_key ON token_usage (task, bucket, id)')
+
+    def _connect(self):
+        # Połączenia SQLite nie mogą przechodzić między procesami ani wątkami
+        pid = os.getpid()
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or getattr(self.local, 'pid', None) != pid:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+            self.local.pid = pid
+        return conn
+
+    def add(self, task, bucket, completion_tokens, truncated):
+        conn = self._connect()
+        conn.execute(
+            'INSERT INTO token_usage (task, bucket, completion_tokens, truncated, created_at) VALUES (?, ?, ?, ?, ?)',
+            (task, bucket, completion_tokens, int(truncated), time.time())
+        )
+        conn.execute(
+            'DELETE FROM token_usage WHERE task = ? AND bucket = ? AND id NOT IN ('
+            'SELECT id FROM token_usage WHERE task = ? AND bucket = ? ORDER BY id DESC LIMIT ?)',
+            (task, bucket, task, bucket, self.window)
+        )
+
+    def recent(self, task, bucket):
+        rows = self._connect().execute(
+            'SELECT completion_tokens FROM token_usage WHERE task = ? AND bucket = ? ORDER BY id DESC LIMIT ?',
+            (task, bucket, self.window)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+
+class TokenBudget:
+    """
+    Adaptive max_tokens per task and input-size bucket.
+
+    Records usage.completion_tokens of every completion and, once a bucket
+    has `min_samples` observations, suggests the `percentile` of recent
+    sizes plus `margin`, clamped between `floor` and the profile's limit.
+    Suggestions are cached for `refresh` seconds.
+    """
+
+    def __init__(self, store, percentile=95, margin=0.2, min_samples=20, floor=256, refresh=60):
+        self.store = store
+        self.percentile = percentile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.floor = floor
+        self.refresh = refresh
+        self.suggestions = {}
+        self.counters = {'adaptive': 0, 'default': 0, 'truncated': 0, 'continued': 0}
+        self.lock = threading.Lock()
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _suggest(self, task, bucket):
+        now = time.monotonic()
+        with self.lock:
+            cached = self.suggestions.get((task, bucket))
+        if cached and cached[1] > now:
+            return cached[0]
+
+        suggestion = None
+        try:
+            samples = sorted(self.store.recent(task, bucket))
+        except Exception as e:
+            logger.warning(f"Token usage history unavailable: {e}")
+            samples = []
+        if len(samples) >= self.min_samples:
+            index = min(len(samples) - 1, int(round(self.percentile / 100.0 * (len(samples) - 1))))
+            suggestion = int(samples[index] * (1 + self.margin))
+        with self.lock:
+            self.suggestions[(task, bucket)] = (suggestion, now + self.refresh)
+        return suggestion
+
+    def max_tokens_for(self, task, prompt, ceiling):
+        """Budget for the first attempt; never above the profile's `ceiling`"""
+        suggestion = self._suggest(task or 'default', input_bucket(estimate_tokens(prompt)))
+        if suggestion is None:
+            self._count('default')
+            return ceiling
+        self._count('adaptive')
+        return max(self.floor, min(ceiling, suggestion))
+
+    def record(self, task, prompt, completion_tokens, truncated=False):
+        if truncated:
+            self._count('truncated')
+        try:
+            self.store.add(task or 'default', input_bucket(estimate_tokens(prompt)), int(completion_tokens), truncated)
+        except Exception as e:
+            logger.warning(f"Could not record token usage: {e}")
+
+    def record_continuation(self):
+        self._count('continued')
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['suggestions'] = {
+                f"{task}:{bucket}": value for (task, bucket), (value, _) in self.suggestions.items()
+                if value is not None
+            }
+        stats['store'] = self.store.name
+        return stats
+
+
+def _create_store():
+    kind = os.environ.get('TOKEN_BUDGET_BACKEND', os.environ.get('LLM_CACHE_BACKEND', 'sqlite')).lower()
+    if kind == 'sqlite':
+        try:
+            return SQLiteUsageStore(os.path.join(DEFAULT_CACHE_DIR, 'cv_optimizer_token_usage.db'))
+        except Exception as e:
+            logger.warning(f"SQLite token usage store unavailable, using in-process history: {e}")
+    return MemoryUsageStore()
+
+
+token_budget = TokenBudget(
+    _create_store(),
+    percentile=float(os.environ.get('TOKEN_BUDGET_PERCENTILE', 95)),
+    margin=float(os.environ.get('TOKEN_BUDGET_MARGIN', 0.2)),
+    min_samples=int(os.environ.get('TOKEN_BUDGET_MIN_SAMPLES', 20))
+)
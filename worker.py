@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+CV Optimizer Pro - AI job worker
+Wykonuje analizy AI z kolejki zadań (tabela analysis_jobs) poza procesami gunicorna.
+
+Uruchomienie: python worker.py
+Liczba równoległych procesów: AI_WORKER_CONCURRENCY (domyślnie 4)
+"""
+
+import os
+import time
+import signal
+import socket
+import logging
+import multiprocessing
+
+logger = logging.getLogger('worker')
+
+POLL_INTERVAL = float(os.environ.get('AI_WORKER_POLL_INTERVAL', 1.0))
+
+
+def worker_loop(index, stop_event):
+    """Pętla pojedynczego procesu: pobiera zadania z kolejki i je wykonuje"""
+    # Import w procesie potomnym - każdy proces ma własną pulę połączeń do bazy
+    from app import app
+    from utils.job_queue import job_queue
+
+    # Zamykaniem steruje proces główny (stop_event) - SIGTERM wysłany do całej grupy procesów
+    # nie może przerwać dziecka trzymającego blokadę współdzielonego Eventu
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    logger.info(f"AI worker {worker_id} started")
+
+    with app.app_context():
+        while not stop_event.is_set():
+            try:
+                job = job_queue.claim_next(worker_id)
+                if job is None:
+                    stop_event.wait(POLL_INTERVAL)
+                    continue
+                logger.info(f"Worker {worker_id} running {job.job_type} job {job.id}")
+                job_queue.run(job)
+            except Exception as e:
+                logger.error(f"Worker {worker_id} loop error: {e}")
+                stop_event.wait(POLL_INTERVAL)
+
+
+def main():
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'))
+    concurrency = int(os.environ.get('AI_WORKER_CONCURRENCY', 4))
+    context = multiprocessing.get_context('spawn')
+    stop_event = context.Event()
+
+    # Import aplikacji tworzy brakujące tabele i kolumny (init_schema)
+    from app import app
+    from utils.job_queue import job_queue
+    with app.app_context():
+        job_queue.requeue_stale()
+
+    # Handler tylko ustawia flagę - Event.set() wewnątrz handlera może zakleszczyć się z wait()
+    stopping = []
+
+    def shutdown(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    processes = {}
+    last_stale_check = time.monotonic()
+    while not stopping:
+        # Uruchom brakujące procesy (także te, które padły)
+        for index in range(concurrency):
+            process = processes.get(index)
+            if process is None or not process.is_alive():
+                if process is not None:
+                    logger.warning(f"AI worker {index} exited with code {process.exitcode}, restarting")
+                process = context.Process(target=worker_loop, args=(index, stop_event), daemon=True)
+                process.start()
+                processes[index] = process
+
+        if time.monotonic() - last_stale_check > 60:
+            with app.app_context():
+                job_queue.requeue_stale()
+            last_stale_check = time.monotonic()
+
+        time.sleep(1)
+
+    logger.info("Stopping AI workers...")
+    stop_event.set()
+    for process in processes.values():
+        process.join(timeout=30)
+        if process.is_alive():
+            process.terminate()
+
+
+if __name__ == '__main__':
+    main()